@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import Date, and_, case, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
-from datetime import date
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from backend.app.core.database import get_db
-from backend.app.models.sql_models import User, Reminder, Adherence
-from backend.app.core.security import get_password_hash, verify_password
-from backend.app.services.email_service import send_email, format_prescription_email
+from backend.app.core.database import get_db, get_async_db
+from backend.app.models.sql_models import User, Reminder, Adherence, reminder_end_date
+from backend.app.core.security import HashingBusy, password_hasher
+from backend.app.services.email_service import format_prescription_email
+from backend.app.services.adherence_service import aupsert_adherence
+from backend.app.services.dispatch_service import get_timezone
+from backend.app.core.services import get_dispatcher, get_email_worker
 
 router = APIRouter()
 
+MAX_ADHERENCE_BATCH = 5000
+VALID_STATUSES = ("taken", "full", "missed", "partial")
+
 # --- Pydantic Schemas ---
 class UserLogin(BaseModel):
     username: str
@@ -21,8 +30,11 @@ class UserRegister(BaseModel):
     password: str
     role: str # 'patient' or 'caregiver'
     fullname: Optional[str] = None
+    timezone: Optional[str] = None # IANA name; reminders fire in this zone
 
 class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     username: str
     role: str
@@ -42,33 +54,95 @@ class AdherenceCreate(BaseModel):
     date: str # YYYY-MM-DD
     status: str
 
+class PatientRosterRow(BaseModel):
+    id: int
+    username: str
+    active_reminders: int
+    expected_doses_today: int
+    taken_doses_today: int
+    missed_today: int # doses, like the two above
+    last_missed: Optional[date] = None
+
+class PatientRosterPage(BaseModel):
+    items: List[PatientRosterRow]
+    next_cursor: Optional[int] = None
+
+class AdherenceBatch(BaseModel):
+    records: List[AdherenceCreate] = Field(..., min_length=1, max_length=MAX_ADHERENCE_BATCH)
+
+class AdherenceBatchItem(BaseModel):
+    index: int
+    success: bool
+    error: Optional[str] = None
+
+class AdherenceBatchResponse(BaseModel):
+    written: int
+    failed: int
+    results: List[AdherenceBatchItem]
+
+class AdherenceRecord(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    reminder_id: int
+    date: date
+    status: str
+
+class AdherenceHistoryPage(BaseModel):
+    items: List[AdherenceRecord]
+    next_cursor: Optional[str] = None
+
+# Statuses that count as a dose taken ('full' is what the calendar writes, 'taken' the dashboard)
+TAKEN_STATUSES = ("taken", "full")
+DEFAULT_WINDOW_DAYS = 30
+
 # --- Endpoints ---
 
+def _hashing_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+# Password hashing runs in a process pool (security.password_hasher), so these
+# routes are async: neither the hash nor the DB wait holds a threadpool thread.
+
 @router.post("/auth/register")
-def register(user: UserRegister, db: Session = Depends(get_db)):
+async def register(user: UserRegister, db: AsyncSession = Depends(get_async_db)):
     # Check if exists
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = (await db.execute(select(User.id).where(User.username == user.username))).first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    if user.timezone:
+        try:
+            ZoneInfo(user.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Unknown timezone: {user.timezone}")
+
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except HashingBusy:
+        raise _hashing_busy()
     new_user = User(
         username=user.username, 
         role=user.role,
-        password_hash=hashed_password
+        password_hash=hashed_password,
+        timezone=user.timezone
         # fullname not in DB yet
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return {"id": new_user.id, "username": new_user.username, "role": new_user.role}
 
 @router.post("/auth/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User).where(User.username == user.username))).scalars().first()
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,24 +150,129 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(user.password, db_user.password_hash):
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.password_hash)
+    except HashingBusy:
+        raise _hashing_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored with old hashing parameters: upgrade while we have the plaintext
+        db_user.password_hash = new_hash
+        await db.commit()
 
     return {"id": db_user.id, "username": db_user.username, "role": db_user.role}
 
 # --- Doctor / Caregiver Features ---
 
-@router.get("/users/patients")
+@router.get("/users/patients", response_model=List[UserResponse])
 def get_all_patients(db: Session = Depends(get_db)):
     # In prod, check if current user is 'caregiver'
-    return db.query(User).filter(User.role == "patient").all()
+    # Only the public columns: never ship password hashes to the client
+    return db.query(User.id, User.username, User.role).filter(User.role == "patient").all()
+
+@router.get("/caregiver/patients", response_model=PatientRosterPage)
+def get_patient_roster(
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    day: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Paginated patient roster with each patient's reminder load and adherence for `day`
+    (default: each patient's own today, in their timezone), computed in one SQL
+    statement after a lookup of the timezones in use. Expected, taken and missed
+    figures all count doses (a twice-daily reminder missed today is 2 missed doses).
+    Keyset-paginated on user id: pass next_cursor back as after_id.
+    """
+    if day is not None:
+        user_day = literal(day, Date)
+    else:
+        now = datetime.now(ZoneInfo("UTC"))
+        zones = [tz for (tz,) in db.query(User.timezone).filter(User.role == "patient").distinct()]
+        local_dates = {tz: now.astimezone(get_timezone(tz)).date() for tz in zones if tz}
+        default_day = now.astimezone(get_timezone(None)).date()
+        user_day = (case(local_dates, value=User.timezone, else_=literal(default_day, Date))
+                    if local_dates else literal(default_day, Date))
+    days_sq = (
+        db.query(User.id.label("user_id"), user_day.label("day"))
+        .filter(User.role == "patient")
+        .subquery()
+    )
+    doses = func.coalesce(func.json_array_length(Reminder.times), 0)
+    active = and_(
+        func.date(Reminder.created_at) <= days_sq.c.day,
+        or_(Reminder.ends_on.is_(None), Reminder.ends_on >= days_sq.c.day)
+    )
+
+    reminders_sq = (
+        db.query(
+            Reminder.user_id.label("user_id"),
+            func.count(Reminder.id).label("active_reminders"),
+            func.sum(doses).label("expected_doses")
+        )
+        .join(days_sq, days_sq.c.user_id == Reminder.user_id)
+        .filter(active)
+        .group_by(Reminder.user_id)
+        .subquery()
+    )
+    today_sq = (
+        db.query(
+            Reminder.user_id.label("user_id"),
+            func.sum(case((Adherence.status.in_(TAKEN_STATUSES), doses), else_=0)).label("taken_doses"),
+            func.sum(case((Adherence.status == "missed", doses), else_=0)).label("missed_doses")
+        )
+        .join(Adherence, Adherence.reminder_id == Reminder.id)
+        .join(days_sq, days_sq.c.user_id == Reminder.user_id)
+        .filter(Adherence.date == days_sq.c.day)
+        .group_by(Reminder.user_id)
+        .subquery()
+    )
+    last_missed_sq = (
+        db.query(Reminder.user_id.label("user_id"), func.max(Adherence.date).label("last_missed"))
+        .join(Adherence, Adherence.reminder_id == Reminder.id)
+        .join(days_sq, days_sq.c.user_id == Reminder.user_id)
+        .filter(Adherence.status == "missed", Adherence.date <= days_sq.c.day)
+        .group_by(Reminder.user_id)
+        .subquery()
+    )
+
+    query = (
+        db.query(
+            User.id,
+            User.username,
+            func.coalesce(reminders_sq.c.active_reminders, 0).label("active_reminders"),
+            func.coalesce(reminders_sq.c.expected_doses, 0).label("expected_doses_today"),
+            func.coalesce(today_sq.c.taken_doses, 0).label("taken_doses_today"),
+            func.coalesce(today_sq.c.missed_doses, 0).label("missed_today"),
+            last_missed_sq.c.last_missed
+        )
+        .outerjoin(reminders_sq, reminders_sq.c.user_id == User.id)
+        .outerjoin(today_sq, today_sq.c.user_id == User.id)
+        .outerjoin(last_missed_sq, last_missed_sq.c.user_id == User.id)
+        .filter(User.role == "patient")
+    )
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    items = rows[:limit]
+    return {
+        "items": [dict(row._mapping) for row in items],
+        "next_cursor": items[-1].id if len(rows) > limit else None
+    }
 
 @router.post("/reminders/add")
-def add_reminder(reminder: ReminderCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def add_reminder(reminder: ReminderCreate, db: Session = Depends(get_db),
+                 dispatcher=Depends(get_dispatcher), email_worker=Depends(get_email_worker)):
+    target_user = db.query(User).filter(User.id == reminder.user_id).first()
+    timezone = target_user.timezone if target_user else None
+    # The course starts on the patient's today, not the server's
+    local_today = datetime.now(get_timezone(timezone)).date()
     db_reminder = Reminder(
         user_id=reminder.user_id,
         drug_name=reminder.drug_name,
@@ -101,14 +280,19 @@ def add_reminder(reminder: ReminderCreate, background_tasks: BackgroundTasks, db
         frequency=reminder.frequency,
         times=reminder.times,
         duration=reminder.duration,
-        reason=reminder.reason
+        reason=reminder.reason,
+        ends_on=reminder_end_date(local_today, reminder.duration)
     )
     db.add(db_reminder)
     db.commit()
     db.refresh(db_reminder)
 
+    # Unless this process holds the dispatch lease, the one that does picks it up on its next poll
+    if dispatcher is not None and dispatcher.is_leader:
+        dispatcher.add_reminder(db_reminder, timezone=timezone,
+                                recipient=target_user.username if target_user else None)
+
     # --- Send Notification Email ---
-    target_user = db.query(User).filter(User.id == reminder.user_id).first()
     if target_user and target_user.username and "@" in target_user.username:
         # Mock 'fullname' using username or hardcode if DB is missing it
         patient_name = target_user.username.split('@')[0]
@@ -122,37 +306,207 @@ def add_reminder(reminder: ReminderCreate, background_tasks: BackgroundTasks, db
             duration=reminder.duration,
             reason=reminder.reason
         )
-        background_tasks.add_task(send_email, target_user.username, "New Prescription Added - MedCare", email_body)
+        email_worker.enqueue(target_user.username, "New Prescription Added - MedCare", email_body)
 
     return db_reminder
 
 @router.get("/reminders/{user_id}")
-def get_reminders(user_id: int, db: Session = Depends(get_db)):
-    return db.query(Reminder).filter(Reminder.user_id == user_id).all()
+async def get_reminders(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Reminder).where(Reminder.user_id == user_id))
+    return result.scalars().all()
+
+# Adherence routes run on the async engine: no threadpool thread is held while they wait on the DB
+
+async def _known_reminders(db: AsyncSession, reminder_ids) -> set:
+    return set((await db.execute(select(Reminder.id).where(Reminder.id.in_(reminder_ids)))).scalars())
+
+def _adherence_row(record: AdherenceCreate, known: set) -> dict:
+    """The row to upsert for a record; HTTPException 400 (bad date/status) or 404 (unknown reminder)."""
+    try:
+        record_date = date.fromisoformat(record.date)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date must be YYYY-MM-DD")
+    if record.status not in VALID_STATUSES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"status must be one of {', '.join(VALID_STATUSES)}")
+    if record.reminder_id not in known:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown reminder_id")
+    return {"reminder_id": record.reminder_id, "date": record_date, "status": record.status}
 
 @router.post("/adherence")
-def record_adherence(record: AdherenceCreate, db: Session = Depends(get_db)):
-    # Check if exists
-    exists = db.query(Adherence).filter(
-        Adherence.reminder_id == record.reminder_id,
-        Adherence.date == record.date
-    ).first()
+async def record_adherence(record: AdherenceCreate, db: AsyncSession = Depends(get_async_db)):
+    row = _adherence_row(record, await _known_reminders(db, [record.reminder_id]))
 
-    if exists:
-        exists.status = record.status
-    else:
-        new_record = Adherence(
-            reminder_id=record.reminder_id,
-            date=record.date,
-            status=record.status
-        )
-        db.add(new_record)
-    
-    db.commit()
+    # Single round trip, and no race between concurrent taps
+    await aupsert_adherence(db, [row])
+    await db.commit()
     return {"success": True}
 
+@router.post("/adherence/batch", response_model=AdherenceBatchResponse)
+async def record_adherence_batch(batch: AdherenceBatch, db: AsyncSession = Depends(get_async_db)):
+    """
+    Records many doses at once (offline sync, caregiver back-fill).
+    Invalid items are reported individually; valid ones are written with one upsert.
+    If the same (reminder_id, date) appears more than once, the last occurrence wins.
+    """
+    results = [AdherenceBatchItem(index=i, success=True) for i in range(len(batch.records))]
+
+    def fail(i, error):
+        results[i].success = False
+        results[i].error = error
+
+    known = await _known_reminders(db, {r.reminder_id for r in batch.records})
+
+    rows = {}
+    for i, record in enumerate(batch.records):
+        try:
+            row = _adherence_row(record, known)
+        except HTTPException as e:
+            fail(i, e.detail)
+            continue
+        key = (row["reminder_id"], row["date"])
+        if key in rows:
+            fail(rows[key][0], "Superseded by a later record for the same reminder and date")
+        rows[key] = (i, row)
+
+    await aupsert_adherence(db, [row for _, row in rows.values()])
+    await db.commit()
+
+    failed = sum(1 for r in results if not r.success)
+    return {"written": len(rows), "failed": failed, "results": results}
+
+def _window(start: Optional[date], end: Optional[date]):
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be on or before end")
+    return start, end
+
+def _period_expr(db: AsyncSession, granularity: str):
+    """
+    SQL expression bucketing Adherence.date into its day / week (Monday) / month, as 'YYYY-MM-DD'.
+    """
+    if db.bind.dialect.name == "postgresql":
+        return func.to_char(func.date_trunc(granularity, Adherence.date), "YYYY-MM-DD")
+    # SQLite (tests / local dev)
+    if granularity == "week":
+        return func.date(Adherence.date, "weekday 0", "-6 days")
+    if granularity == "month":
+        return func.strftime("%Y-%m-01", Adherence.date)
+    return func.strftime("%Y-%m-%d", Adherence.date)
+
+def _counts():
+    taken = func.sum(case((Adherence.status.in_(TAKEN_STATUSES), 1), else_=0))
+    missed = func.sum(case((Adherence.status == "missed", 1), else_=0))
+    partial = func.sum(case((Adherence.status == "partial", 1), else_=0))
+    return taken.label("taken"), missed.label("missed"), partial.label("partial"), func.count(Adherence.id).label("total")
+
+def _rates(row) -> dict:
+    total = row.total or 0
+    taken = row.taken or 0
+    return {
+        "taken": taken,
+        "missed": row.missed or 0,
+        "partial": row.partial or 0,
+        "total": total,
+        "rate": round(taken / total, 4) if total else None
+    }
+
 @router.get("/adherence/{user_id}")
-def get_adherence(user_id: int, db: Session = Depends(get_db)):
-    # Join Reminders to get User's adherence
-    results = db.query(Adherence).join(Reminder).filter(Reminder.user_id == user_id).all()
-    return results
+async def get_adherence(user_id: int, start: Optional[date] = None, end: Optional[date] = None,
+                        db: AsyncSession = Depends(get_async_db)):
+    # Join Reminders to get User's adherence (optionally within a date window)
+    query = select(Adherence).join(Reminder).where(Reminder.user_id == user_id)
+    if start:
+        query = query.where(Adherence.date >= start)
+    if end:
+        query = query.where(Adherence.date <= end)
+    return (await db.execute(query)).scalars().all()
+
+@router.get("/adherence/{user_id}/summary")
+async def get_adherence_summary(
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Adherence rates over a date window (default: the last 30 days), aggregated in the
+    database overall, per reminder and per day / week / month.
+    """
+    start, end = _window(start, end)
+    in_window = and_(Reminder.user_id == user_id, Adherence.date >= start, Adherence.date <= end)
+
+    overall = (await db.execute(
+        select(*_counts()).select_from(Adherence).join(Reminder).where(in_window)
+    )).one()
+
+    by_reminder = (await db.execute(
+        select(Reminder.id, Reminder.drug_name, *_counts())
+        .select_from(Adherence).join(Reminder)
+        .where(in_window)
+        .group_by(Reminder.id, Reminder.drug_name)
+        .order_by(Reminder.id)
+    )).all()
+
+    period = _period_expr(db, granularity).label("period")
+    by_period = (await db.execute(
+        select(period, *_counts())
+        .select_from(Adherence).join(Reminder)
+        .where(in_window)
+        .group_by(period)
+        .order_by(period)
+    )).all()
+
+    return {
+        "user_id": user_id,
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "overall": _rates(overall),
+        "by_reminder": [{"reminder_id": r.id, "drug_name": r.drug_name, **_rates(r)} for r in by_reminder],
+        "by_period": [{"period": r.period, **_rates(r)} for r in by_period]
+    }
+
+@router.get("/adherence/{user_id}/history", response_model=AdherenceHistoryPage)
+async def get_adherence_history(
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Raw adherence records, newest first, keyset-paginated on (date, id).
+    Pass the returned next_cursor to fetch the following page.
+    """
+    start, end = _window(start, end)
+    query = (
+        select(Adherence).join(Reminder)
+        .where(Reminder.user_id == user_id, Adherence.date >= start, Adherence.date <= end)
+    )
+    if cursor:
+        try:
+            cursor_date, cursor_id = cursor.split(":")
+            cursor_date, cursor_id = date.fromisoformat(cursor_date), int(cursor_id)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.where(or_(
+            Adherence.date < cursor_date,
+            and_(Adherence.date == cursor_date, Adherence.id < cursor_id)
+        ))
+
+    rows = (await db.execute(
+        query.order_by(Adherence.date.desc(), Adherence.id.desc()).limit(limit + 1)
+    )).scalars().all()
+    items = rows[:limit]
+    next_cursor = f"{items[-1].date.isoformat()}:{items[-1].id}" if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+# --- Email delivery ---
+
+@router.get("/email/metrics")
+def get_email_metrics(email_worker=Depends(get_email_worker)):
+    return email_worker.metrics()
@@ -0,0 +1,56 @@
+import os
+import asyncio
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from backend.app.core.database import get_async_engine
+from backend.app.core.services import SERVICE_WARMUP, registry
+
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2")) # seconds
+
+router = APIRouter()
+
+@router.get("/live")
+async def live():
+    """Liveness: the process is up and the event loop is answering. Touches nothing else."""
+    return {"status": "ok"}
+
+async def _ping_db():
+    async with get_async_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+async def _check_db() -> str:
+    try:
+        await asyncio.wait_for(_ping_db(), HEALTH_DB_TIMEOUT)
+        return "ok"
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+@router.get("/ready")
+async def ready(request: Request):
+    """
+    Readiness: startup finished, the database answers and background warm-up is
+    done. 503 until then, so a load balancer only routes to warm instances.
+    Services that failed to build are reported as degraded (their routes answer
+    503 and retry on the next call) without taking the instance out of rotation.
+    """
+    startup_errors = getattr(request.app.state, "startup_errors", None)
+    checks = {
+        "startup": "ok" if startup_errors == [] else ("; ".join(startup_errors) if startup_errors else "pending"),
+        "database": await _check_db(),
+        "warm_up": "ok" if not SERVICE_WARMUP or "warm_up" in registry.phases else "pending",
+    }
+    failed = registry.failed()
+    is_ready = all(value == "ok" for value in checks.values())
+    body = {
+        "status": ("degraded" if failed else "ready") if is_ready else "not ready",
+        "checks": checks,
+        "failed_services": failed,
+    }
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
+@router.get("/startup")
+def startup_profile():
+    """How long startup took, phase by phase, and per-service build/warm-up times (ms)."""
+    return {"phases": registry.phases, "services": registry.status()}
@@ -0,0 +1,84 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from backend.app.core.database import pool_stats
+from backend.app.core.metrics import REGISTRY, callback_metric
+from backend.app.core.security import password_hasher
+from backend.app.core.services import READY, registry
+
+router = APIRouter()
+
+# State the services already track, read at scrape time. A service that
+# hasn't been built yet simply has no samples.
+
+def _pool_field(field: str, scale: float = 1.0):
+    def read():
+        return {(name,): info[field] * scale for name, info in pool_stats().items()
+                if info.get(field) is not None}
+    return read
+
+callback_metric("db_pool_checked_out", "Connections currently checked out", _pool_field("checked_out"), ["engine"])
+callback_metric("db_pool_size", "Configured pool size", _pool_field("size"), ["engine"])
+callback_metric("db_pool_overflow", "Overflow connections open", _pool_field("overflow"), ["engine"])
+callback_metric("db_pool_saturation", "Checked out / (size + max_overflow)", _pool_field("saturation"), ["engine"])
+callback_metric("db_pool_checkouts_total", "Connection checkouts", _pool_field("checkouts"), ["engine"], kind="counter")
+callback_metric("db_pool_timeouts_total", "Checkouts that timed out waiting for a connection",
+                _pool_field("timeouts"), ["engine"], kind="counter")
+callback_metric("db_pool_wait_max_seconds", "Longest checkout wait", _pool_field("max_wait_ms", 0.001), ["engine"])
+
+def _embedding_cache():
+    rag = registry.peek("rag")
+    embeddings = getattr(rag, "embedding_function", None)
+    if not hasattr(embeddings, "hits"):
+        return None
+    return {("hit",): embeddings.hits, ("miss",): embeddings.misses}
+
+def _answer_cache():
+    rag = registry.peek("rag")
+    if rag is None:
+        return None
+    cache = rag.answer_cache
+    return {("exact_hit",): cache.hits - cache.semantic_hits, ("semantic_hit",): cache.semantic_hits,
+            ("miss",): cache.misses}
+
+def _reminder_paths():
+    reminder = registry.peek("reminder")
+    if reminder is None:
+        return None
+    return {("rules",): reminder.fast_path_hits, ("memo",): reminder.memo_hits, ("llm",): reminder.llm_calls}
+
+def _email(field: str):
+    def read():
+        worker = registry.peek("email_worker")
+        return None if worker is None else worker.metrics()[field]
+    return read
+
+def _email_results():
+    worker = registry.peek("email_worker")
+    if worker is None:
+        return None
+    metrics = worker.metrics()
+    return {("sent",): metrics["sent"], ("retried",): metrics["retried"], ("dead_lettered",): metrics["dead_lettered"]}
+
+callback_metric("embedding_cache_requests_total", "Embedding cache lookups", _embedding_cache, ["result"],
+                kind="counter")
+callback_metric("answer_cache_requests_total", "Chat answer cache lookups", _answer_cache, ["result"], kind="counter")
+callback_metric("reminder_schedules_total", "Schedules by how they were produced", _reminder_paths, ["path"],
+                kind="counter")
+callback_metric("email_messages_total", "Email delivery attempts by result", _email_results, ["result"],
+                kind="counter")
+callback_metric("email_outbox_queued", "Emails waiting to be sent", _email("queued"))
+callback_metric("email_outbox_dead_letters", "Emails given up on (see EmailOutbox.dead_letters)", _email("dead_letters"))
+callback_metric("email_connections_opened_total", "SMTP connections opened", _email("connections_opened"),
+                kind="counter")
+callback_metric("password_hash_pending", "Password hashes queued or running", lambda: password_hasher.stats()["pending"])
+callback_metric("password_hash_rejected_total", "Hashes refused with 503 (backpressure)",
+                lambda: password_hasher.stats()["rejected"], kind="counter")
+callback_metric("service_ready", "1 if the service has been built", lambda: {
+    (name,): 1 if status["state"] == READY else 0 for name, status in registry.status().items()
+}, ["service"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
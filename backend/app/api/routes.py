@@ -1,20 +1,21 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from pydantic import BaseModel
+import json
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
-from backend.app.services.rag_service import RAGService
-from backend.app.services.reminder_service import ReminderService
-from backend.app.models.schemas import DrugInfo
+from backend.app.core.services import get_rag_service, get_reminder_service
 from backend.app.api.endpoints import router as db_router
 
+logger = logging.getLogger(__name__)
+
+MAX_REMINDER_BATCH = 20 # medications per batch schedule request
+
 router = APIRouter()
 router.include_router(db_router, tags=["persistence"])
 
-# Initialize Service (Singleton pattern for simplicity in this scope)
-# In production, use dependency injection
-rag_service = RAGService()
-reminder_service = ReminderService()
-
 class ChatRequest(BaseModel):
     question: str
 
@@ -26,30 +27,96 @@ class IngestResponse(BaseModel):
     success: bool
 
 @router.post("/ingest/{drug_name}", response_model=IngestResponse)
-async def ingest_drug(drug_name: str):
+async def ingest_drug(drug_name: str, rag_service=Depends(get_rag_service)):
     """
     Ingest a drug's label data into the vector database.
     """
-    success = rag_service.ingest_drug(drug_name)
+    # Fetching + embedding is blocking work; keep it off the event loop
+    success = await run_in_threadpool(rag_service.ingest_drug, drug_name)
     if success:
         return {"message": f"Successfully ingested data for {drug_name}", "success": True}
     else:
         raise HTTPException(status_code=404, detail="Drug not found or failed to ingest")
 
+class DrugName(BaseModel):
+    name: str
+    kind: str # 'brand' or 'generic'
+    generic_name: Optional[str] = None
+    distance: Optional[int] = None # edit distance, fuzzy matches only
+
+class DrugNameSearchResponse(BaseModel):
+    results: List[DrugName]
+
+@router.get("/drugs/search", response_model=DrugNameSearchResponse)
+def search_drugs(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50), fuzzy: bool = False,
+                 rag_service=Depends(get_rag_service)):
+    """
+    Autocomplete over drugs already in the library. Served from the local name index,
+    so it never calls openFDA. A plain def (run in the threadpool): the first call may
+    build the index from the vector store, and refreshes read the index file.
+    """
+    return {"results": rag_service.search_drugs(q, limit=limit, fuzzy=fuzzy)}
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, rag_service=Depends(get_rag_service)):
     """
     Ask a question about the drugs in the library.
     """
-    answer = rag_service.query(request.question)
+    answer = await rag_service.aquery(request.question)
     return {"answer": answer}
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, rag_service=Depends(get_rag_service)):
+    """
+    Same as /chat, but streams the answer as Server-Sent Events:
+    `data: {"token": "..."}` per token, then `event: done`.
+    """
+    async def event_stream():
+        try:
+            async for token in rag_service.astream(request.question):
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception:
+            logger.exception("Chat stream error")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Could not generate an answer'})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Placeholder for reminder generation
 class ReminderRequest(BaseModel):
     drug_name: str
     dosage_text: str
 
 @router.post("/reminders/generate")
-async def generate_reminder(request: ReminderRequest):
-    schedule = reminder_service.generate_schedule(request.drug_name, request.dosage_text)
+async def generate_reminder(request: ReminderRequest, reminder_service=Depends(get_reminder_service)):
+    schedule = await reminder_service.agenerate_schedule(request.drug_name, request.dosage_text)
     return schedule
+
+class ReminderBatchRequest(BaseModel):
+    items: List[ReminderRequest] = Field(..., min_length=1, max_length=MAX_REMINDER_BATCH)
+    max_concurrency: Optional[int] = Field(None, ge=1) # capped at REMINDER_MAX_CONCURRENCY
+
+@router.post("/reminders/generate/batch")
+async def generate_reminders(request: ReminderBatchRequest, reminder_service=Depends(get_reminder_service)):
+    """
+    Generates schedules for several medications at once. Streams newline-delimited
+    JSON, one line per item as it completes (not in input order):
+    {"index", "drug_name", "status": "ok" | "error", "schedule", "error"}.
+    """
+    items = [(item.drug_name, item.dosage_text) for item in request.items]
+
+    async def lines():
+        try:
+            async for result in reminder_service.agenerate_schedules(items, max_concurrency=request.max_concurrency):
+                yield json.dumps(result) + "\n"
+        except Exception:
+            logger.exception("Reminder batch error")
+            yield json.dumps({"index": None, "status": "error", "error": "Batch aborted"}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,10 +1,119 @@
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
+# Configuration
+# pbkdf2_sha256 iterations; pick a value with `python -m backend.calibrate_password_hash`
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))) # 0 = threadpool
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64")) # queued + running, then 503
+MIN_PASSWORD_HASH_ROUNDS = 29000 # passlib's pbkdf2_sha256 default; calibration never suggests less
+
+def make_context(rounds: int = PASSWORD_HASH_ROUNDS) -> CryptContext:
+    # min = default rounds, so weaker hashes are upgraded on login; stronger ones are kept
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        deprecated="auto",
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=rounds
+    )
+
 # Switch to pbkdf2_sha256 to avoid bcrypt issues on Windows without compiler
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+pwd_context = make_context()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+def verify_and_update(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """(valid, new hash if the stored one is weaker than the current setting)."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class HashingBusy(Exception):
+    """Too many password hashes queued; the caller should retry later."""
+
+class PasswordHasher:
+    """
+    Runs password hashing in a bounded process pool so CPU-bound work neither
+    holds the GIL nor occupies the request threadpool. At most max_pending
+    hashes may be queued or running; beyond that calls fail fast with HashingBusy.
+    The pool is created by start() and its processes spawned by warm().
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def start(self):
+        """
+        Creates the process pool (at startup, from the app's lifespan). Until then,
+        and with workers=0, hashes run in the default threadpool.
+        """
+        if self.workers <= 0 or self._pool is not None:
+            return
+        # spawn: never fork a process that is running server threads
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def warm(self):
+        """Spawns every worker (one hash each), so no login waits for a process to start. Blocks."""
+        if self._pool is not None:
+            list(self._pool.map(get_password_hash, ["warm up"] * self.workers))
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusy()
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_and_update, password, hashed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "max_pending": self.max_pending,
+                    "completed": self.completed, "rejected": self.rejected}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+password_hasher = PasswordHasher()
+
+def calibrate_rounds(target_ms: float, samples: int = 5) -> int:
+    """pbkdf2_sha256 rounds that take about target_ms per hash on this machine."""
+    probe = 20000
+    context = make_context(probe)
+    context.hash("calibration") # warm up
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration")
+        timings.append(time.perf_counter() - start)
+    per_round = sorted(timings)[len(timings) // 2] / probe
+    # Round to a thousand; never below the security floor, however fast the machine or low the target
+    return max(MIN_PASSWORD_HASH_ROUNDS, int(target_ms / 1000 / per_round) // 1000 * 1000)
@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SERVICE_WARMUP = os.getenv("SERVICE_WARMUP", "1") == "1" # build + warm services in the background at startup
+# Reminder dispatch. Every instance with it enabled competes for the dispatch lease and
+# only the holder fires reminders, so it is safe to leave on for all of them
+DISPATCH_ENABLED = os.getenv("DISPATCH_ENABLED", "1") == "1"
+
+PENDING, STARTING, READY, FAILED = "pending", "starting", "ready", "failed"
+
+class ServiceUnavailable(Exception):
+    """A service failed to initialize (e.g. Ollama or Chroma is down)."""
+
+class _Entry:
+    def __init__(self, name: str, factory: Callable[[], Any], warm: Optional[Callable[[Any], None]],
+                 close: Optional[Callable[[Any], None]]):
+        self.name = name
+        self.factory = factory
+        self.warm = warm
+        self.close = close
+        self.instance = None
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.init_ms: Optional[float] = None
+        self.warm_ms: Optional[float] = None
+        self.lock = threading.Lock()
+
+class ServiceRegistry:
+    """
+    Lazily constructed application services. Nothing is built at import time:
+    a service is created on first get() (or by warm_up() in the background at
+    startup) and kept for the life of the process. A failed construction is
+    retried on the next get(), so a dependency that was down at boot doesn't
+    need a restart once it comes back.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self.phases: Dict[str, float] = {} # startup phase -> ms
+
+    def register(self, name: str, factory: Callable[[], Any], warm: Optional[Callable[[Any], None]] = None,
+                 close: Optional[Callable[[Any], None]] = None):
+        self._entries[name] = _Entry(name, factory, warm, close)
+
+    def get(self, name: str) -> Any:
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.instance
+        with entry.lock:
+            if entry.state != READY:
+                entry.state = STARTING
+                start = time.perf_counter()
+                try:
+                    entry.instance = entry.factory()
+                except Exception as e:
+                    entry.state = FAILED
+                    entry.error = f"{type(e).__name__}: {e}"
+                    logger.error("Service '%s' failed to start: %s", name, entry.error)
+                    raise ServiceUnavailable(name) from e
+                entry.init_ms = round((time.perf_counter() - start) * 1000, 1)
+                entry.error = None
+                entry.state = READY
+        return entry.instance
+
+    def peek(self, name: str) -> Any:
+        """The instance if it has already been built, without building it."""
+        entry = self._entries[name]
+        return entry.instance if entry.state == READY else None
+
+    def _warm(self, name: str):
+        entry = self._entries[name]
+        instance = self.get(name)
+        if entry.warm is not None and entry.warm_ms is None:
+            start = time.perf_counter()
+            try:
+                entry.warm(instance)
+            except Exception as e:
+                # A cold cache is not fatal: the first request pays for it instead
+                logger.warning("Warm-up of '%s' failed: %s: %s", name, type(e).__name__, e)
+                return
+            entry.warm_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    async def warm_up(self, names: Optional[List[str]] = None):
+        """Builds and warms services off the event loop, concurrently."""
+        async def one(name):
+            try:
+                await asyncio.to_thread(self._warm, name)
+            except ServiceUnavailable:
+                pass
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(name) for name in (names or list(self._entries))))
+        self.phases["warm_up"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("Services warmed up in %.0f ms", self.phases["warm_up"], extra={"services": self.status()})
+
+    def record_phase(self, name: str, started: float):
+        self.phases[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {"state": e.state, "init_ms": e.init_ms, "warm_ms": e.warm_ms, "error": e.error}
+            for name, e in self._entries.items()
+        }
+
+    def failed(self) -> List[str]:
+        return [name for name, e in self._entries.items() if e.state == FAILED]
+
+    def close_all(self):
+        for entry in self._entries.values():
+            if entry.state == READY and entry.close is not None:
+                try:
+                    entry.close(entry.instance)
+                except Exception as e:
+                    logger.warning("Error closing '%s': %s", entry.name, e)
+
+registry = ServiceRegistry()
+
+# --- Application services (imports deferred so importing the API stays cheap) ---
+
+def _rag_service():
+    from backend.app.services.rag_service import RAGService
+    return RAGService()
+
+def _reminder_service():
+    from backend.app.services.reminder_service import ReminderService
+    return ReminderService()
+
+def _dispatcher():
+    from backend.app.core.database import SessionLocal
+    from backend.app.services.dispatch_service import DoseDispatcher, email_due_dose
+    # Due doses are emailed to the patient through the outbox
+    return DoseDispatcher(SessionLocal, on_due=email_due_dose(registry.get("email_worker")))
+
+def _email_worker():
+    from backend.app.services.email_delivery import EmailDeliveryWorker, EmailOutbox
+    return EmailDeliveryWorker(EmailOutbox())
+
+registry.register("rag", _rag_service, warm=lambda rag: rag.warm_up(), close=lambda rag: rag.close())
+registry.register("reminder", _reminder_service)
+# Started and stopped by the app lifespan (backend/main.py)
+registry.register("dispatcher", _dispatcher)
+registry.register("email_worker", _email_worker)
+
+def get_rag_service():
+    return registry.get("rag")
+
+def get_reminder_service():
+    return registry.get("reminder")
+
+def get_dispatcher():
+    """The dispatcher if this process runs one, else None."""
+    return registry.get("dispatcher") if DISPATCH_ENABLED else None
+
+def get_email_worker():
+    return registry.get("email_worker")
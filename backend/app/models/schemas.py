@@ -8,6 +8,8 @@ class DrugInfo(BaseModel):
     warnings: Optional[str] = None
     dosage_instructions: Optional[str] = None # dosage_and_administration
     adverse_reactions: Optional[str] = None
+    set_id: Optional[str] = None # stable across label versions
+    version: Optional[str] = None
     
 class DrugSearchResult(BaseModel):
     results: List[DrugInfo]
@@ -1,7 +1,21 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, JSON, DateTime, Date
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, JSON, DateTime, Date, UniqueConstraint
 from sqlalchemy.orm import relationship
 from backend.app.core.database import Base
 import datetime
+import re
+
+DURATION_UNITS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+def reminder_end_date(start: datetime.date, duration):
+    """
+    Last day a reminder is active, from free-text durations like "7 days" or "2 weeks".
+    Returns None for open-ended ("Unlimited") or unrecognized durations.
+    """
+    match = re.search(r"(\d+)\s*(day|week|month|year)", (duration or "").lower())
+    if not match:
+        return None
+    days = int(match.group(1)) * DURATION_UNITS[match.group(2)]
+    return start + datetime.timedelta(days=max(days - 1, 0))
 
 class User(Base):
     __tablename__ = "users"
@@ -12,6 +26,7 @@ class User(Base):
     # For hackathon simplicity, we might store plain text or basic hash. 
     # Production MUST use bcrypt. We'll add password_hash field.
     password_hash = Column(String) 
+    timezone = Column(String, nullable=True) # IANA name, e.g. "Asia/Kolkata"; NULL = server default
 
     reminders = relationship("Reminder", back_populates="owner")
 
@@ -19,7 +34,7 @@ class Reminder(Base):
     __tablename__ = "reminders"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     drug_name = Column(String)
     dosage = Column(String)
     instruction = Column(String)
@@ -28,12 +43,18 @@ class Reminder(Base):
     duration = Column(String) # e.g. "7 days"
     reason = Column(String) # e.g. "For infection"
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    ends_on = Column(Date, nullable=True) # derived from duration; NULL = open-ended
 
     owner = relationship("User", back_populates="reminders")
     adherence_records = relationship("Adherence", back_populates="reminder")
 
 class Adherence(Base):
     __tablename__ = "adherence"
+    # One record per reminder per day. The (reminder_id, date) index also serves
+    # the per-user range scans used by the adherence aggregation endpoints.
+    __table_args__ = (
+        UniqueConstraint("reminder_id", "date", name="uq_adherence_reminder_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     reminder_id = Column(Integer, ForeignKey("reminders.id"))
@@ -41,3 +62,11 @@ class Adherence(Base):
     status = Column(String) # 'full', 'missed', 'partial'
     
     reminder = relationship("Reminder", back_populates="adherence_records")
+
+class DispatchLease(Base):
+    __tablename__ = "dispatch_leases"
+    # One row per lease name; the holder renews it, others take it over once it expires
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    lease_until = Column(DateTime, nullable=False) # naive UTC
@@ -0,0 +1,66 @@
+from typing import Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+
+from backend.app.models.sql_models import Adherence
+
+# Rows per INSERT statement. SQLite builds before 3.32 cap bound parameters at 999.
+BATCH_ROWS = {"postgresql": 5000, "sqlite": 300}
+INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def _upsert_statements(dialect: str, rows: List[Dict], overwrite: bool):
+    insert = INSERTS[dialect]
+    size = BATCH_ROWS[dialect]
+    for i in range(0, len(rows), size):
+        stmt = insert(Adherence).values(rows[i:i + size])
+        if overwrite:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["reminder_id", "date"],
+                set_={"status": stmt.excluded.status}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["reminder_id", "date"])
+        yield stmt
+
+def upsert_adherence(db: Session, rows: List[Dict], overwrite: bool = True) -> None:
+    """
+    Writes adherence rows ({reminder_id, date, status}) with a native
+    INSERT ... ON CONFLICT (reminder_id, date), in as few statements as possible.
+    overwrite=False keeps existing records (DO NOTHING) instead of updating their status.
+    Rows must be unique on (reminder_id, date). Does not commit.
+    """
+    if not rows:
+        return
+
+    dialect = db.bind.dialect.name
+    if dialect not in INSERTS:
+        # Other backends: portable (slower) read-then-write
+        for row in rows:
+            existing = db.query(Adherence).filter(
+                Adherence.reminder_id == row["reminder_id"],
+                Adherence.date == row["date"]
+            ).first()
+            if existing is None:
+                db.add(Adherence(**row))
+            elif overwrite:
+                existing.status = row["status"]
+        db.flush()
+        return
+
+    for stmt in _upsert_statements(dialect, rows, overwrite):
+        db.execute(stmt)
+
+async def aupsert_adherence(db: AsyncSession, rows: List[Dict], overwrite: bool = True) -> None:
+    """Async variant of upsert_adherence(). Does not commit."""
+    if not rows:
+        return
+
+    dialect = db.bind.dialect.name
+    if dialect not in INSERTS:
+        await db.run_sync(lambda session: upsert_adherence(session, rows, overwrite))
+        return
+
+    for stmt in _upsert_statements(dialect, rows, overwrite):
+        await db.execute(stmt)
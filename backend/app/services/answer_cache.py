@@ -0,0 +1,184 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, List, Optional, Set
+
+import numpy as np
+
+from backend.app.services.retrieval import INDEX_REFRESH_SECONDS
+
+# Configuration
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600")) # seconds
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")) # cosine
+
+def normalize_question(question: str) -> str:
+    q = re.sub(r"\s+", " ", question.lower()).strip()
+    return q.rstrip("?!. ")
+
+class _Entry:
+    __slots__ = ("question", "answer", "vector", "drugs", "question_drugs", "created")
+
+    def __init__(self, question, answer, vector, drugs, question_drugs):
+        self.question = question
+        self.answer = answer
+        self.vector = vector
+        self.drugs = drugs
+        self.question_drugs = question_drugs
+        self.created = time.monotonic()
+
+class AnswerCache:
+    """
+    Two-tier cache for RAG answers.
+    - Exact tier: normalized question text.
+    - Semantic tier: cosine similarity between question embeddings above a threshold.
+    Entries expire after ttl seconds and the least recently used ones are dropped past max_size.
+    Each entry remembers which drugs its context came from so re-ingesting a drug evicts it.
+    Labels ingested by other processes change version_source() (checked at most every
+    INDEX_REFRESH_SECONDS), which clears the cache: which drugs they touched isn't known here.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity: float = ANSWER_CACHE_SIMILARITY, version_source: Optional[Callable[[], Any]] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Stacked unit vectors for the semantic tier, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self.version_source = version_source
+        self._version = version_source() if version_source is not None else None
+        self._checked = time.monotonic()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self.ttl > 0 and time.monotonic() - entry.created > self.ttl
+
+    def _drop(self, key: str):
+        del self._entries[key]
+        self._matrix = None
+
+    def _refresh(self):
+        if self.version_source is None or time.monotonic() - self._checked < INDEX_REFRESH_SECONDS:
+            return
+        version = self.version_source()
+        with self._lock:
+            self._checked = time.monotonic()
+            if version != self._version:
+                self._entries.clear()
+                self._matrix = None
+            self._version = version
+
+    @staticmethod
+    def _same_drugs(entry: _Entry, question: str, question_drugs: Set[str]) -> bool:
+        # Guard against "warnings for Advil" matching "warnings for Tylenol": both questions
+        # must be about the same drugs, and every drug the cached answer's context came
+        # from must be named by both questions or by neither.
+        return (entry.question_drugs == question_drugs
+                and all((d in entry.question) == (d in question) for d in entry.drugs))
+
+    def _exact(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.answer
+
+    def get_exact(self, question: str) -> Optional[str]:
+        """
+        The exact tier alone, for checking before the question is embedded. A miss
+        isn't counted: get() follows with the question's vector.
+        """
+        self._refresh()
+        with self._lock:
+            return self._exact(normalize_question(question))
+
+    def get(self, question: str, vector=None, question_drugs: Iterable[str] = ()) -> Optional[str]:
+        """
+        question_drugs: the drug names the question itself mentions (see
+        LexicalIndex.question_drugs); semantic matches must mention the same ones.
+        """
+        key = normalize_question(question)
+        question_drugs = {d.lower() for d in question_drugs if d}
+        self._refresh()
+        with self._lock:
+            answer = self._exact(key)
+            if answer is not None:
+                return answer
+
+            if vector is not None:
+                if self._matrix is None:
+                    self._matrix_keys = [k for k, e in self._entries.items() if e.vector is not None]
+                    self._matrix = np.stack([self._entries[k].vector for k in self._matrix_keys]) if self._matrix_keys else None
+                if self._matrix is None:
+                    self.misses += 1
+                    return None
+                scores = self._matrix @ self._unit(vector)
+                for idx in np.argsort(-scores):
+                    if scores[idx] < self.similarity:
+                        break
+                    cand_key = self._matrix_keys[idx]
+                    cand = self._entries.get(cand_key)
+                    if cand is None or self._expired(cand) or not self._same_drugs(cand, key, question_drugs):
+                        continue
+                    self._entries.move_to_end(cand_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return cand.answer
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, answer: str, vector=None, drugs: Iterable[str] = (),
+            question_drugs: Iterable[str] = ()):
+        key = normalize_question(question)
+        drug_set = {d.lower() for d in drugs if d}
+        question_drug_set = {d.lower() for d in question_drugs if d}
+        unit = self._unit(vector) if vector is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            # Entries without a vector only take part in the exact tier
+            self._entries[key] = _Entry(key, answer, unit, drug_set, question_drug_set)
+            self._matrix = None
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._matrix = None
+
+    def invalidate_drugs(self, drugs: Iterable[str]) -> int:
+        """
+        Drops every entry whose context came from, or whose question mentions, one of the drugs.
+        """
+        names: Set[str] = {d.lower() for d in drugs if d}
+        if not names:
+            return 0
+        with self._lock:
+            stale = [k for k, e in self._entries.items()
+                     if e.drugs & names or any(n in k for n in names)]
+            for k in stale:
+                self._drop(k)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,114 @@
+import time
+import threading
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from backend.app.core.metrics import STAGE_SECONDS, counter
+
+LLM_TOKENS = counter("llm_tokens_total", "Tokens processed by the LLM", ["component", "kind"])
+
+# LCEL steps worth a span of their own, by runnable name
+CHAIN_STAGES = {
+    "build_context": "context",
+    "ChatPromptTemplate": "prompt",
+    "StrOutputParser": "parse",
+    "JsonOutputParser": "parse",
+}
+
+def _ns_to_s(value) -> Optional[float]:
+    return value / 1e9 if isinstance(value, (int, float)) and value > 0 else None
+
+class ChainStageCallback(BaseCallbackHandler):
+    """
+    Times the steps of an LCEL run into stage_duration_seconds{component, stage}:
+    retrieve, context, prompt, llm (wall clock), llm_first_token (streaming only), parse.
+    Ollama reports its own prompt-eval and eval durations with each response;
+    those become llm_prefill and llm_generation.
+    """
+
+    run_inline = True # cheap bookkeeping; no executor hop per event in async runs
+
+    def __init__(self, component: str):
+        self.component = component
+        self._starts: Dict[UUID, Tuple[str, float]] = {}
+        self._first_token_seen = set()
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, stage: str):
+        with self._lock:
+            self._starts[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id: UUID) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+            self._first_token_seen.discard(run_id)
+        if started is None:
+            return None
+        stage, start = started
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, component=self.component, stage=stage)
+        return stage, elapsed
+
+    def _observe(self, stage: str, seconds: Optional[float]):
+        if seconds is not None:
+            STAGE_SECONDS.observe(seconds, component=self.component, stage=stage)
+
+    # --- Chain steps ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, **kwargs: Any):
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        stage = CHAIN_STAGES.get(name)
+        if stage:
+            self._start(run_id, stage)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    # --- Retrieval ---
+
+    def on_retriever_start(self, serialized, query, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "retrieve")
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    # --- LLM ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "llm")
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "llm")
+
+    def on_llm_new_token(self, token, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            started = self._starts.get(run_id)
+            if started is None or run_id in self._first_token_seen:
+                return
+            self._first_token_seen.add(run_id)
+        self._observe("llm_first_token", time.perf_counter() - started[1])
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+        for generations in response.generations:
+            for generation in generations:
+                info = dict(generation.generation_info or {})
+                message = getattr(generation, "message", None)
+                info.update(getattr(message, "response_metadata", None) or {})
+                self._observe("llm_prefill", _ns_to_s(info.get("prompt_eval_duration")))
+                self._observe("llm_generation", _ns_to_s(info.get("eval_duration")))
+                if info.get("prompt_eval_count"):
+                    LLM_TOKENS.inc(info["prompt_eval_count"], component=self.component, kind="prompt")
+                if info.get("eval_count"):
+                    LLM_TOKENS.inc(info["eval_count"], component=self.component, kind="completion")
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
@@ -0,0 +1,247 @@
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Configuration. The store describes one vector store's chunks, so by default it lives in that
+# store's directory; CHUNK_STORE_PATH overrides the location ("" keeps the store in memory)
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH")
+CHUNK_STORE_FILE = "chunk_store.sqlite3"
+LEGACY_CHUNK_STORE_PATH = "./chunk_store.sqlite3" # the default before the store moved next to the vectors
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9")) # estimated Jaccard
+
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32 # 32 bands x 4 rows: pairs above ~0.5 Jaccard become candidates
+SHINGLE_WORDS = 3
+_PRIME = 4294967291 # largest prime below 2**32; (p - 1)**2 + p still fits in uint64
+_rng = np.random.RandomState(20240101)
+_A = _rng.randint(1, _PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.randint(0, _PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+_WORDS = re.compile(r"[a-z0-9]+")
+# A number with the unit or word after it ("200 mg", "4 hours", "12 years")
+_QUANTITIES = re.compile(r"(\d+(?:[.,]\d+)?)\s*(%|[a-zµ]+)?")
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (uint32[MINHASH_PERMUTATIONS]) over word shingles of text."""
+    words = _WORDS.findall(text.lower())
+    n = min(SHINGLE_WORDS, max(1, len(words)))
+    shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") % _PRIME
+         for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+def quantities(text: str) -> str:
+    """
+    Every number in text with its unit, in order ("200mg 4hours"). Near-duplicates
+    must match on this exactly: chunks that differ only in a dose differ in meaning.
+    """
+    return " ".join(number + (unit or "") for number, unit in _QUANTITIES.findall(text.lower()))
+
+def dedup_scope(metadata: dict) -> str:
+    """
+    Labels whose chunks may be shared: the same generic (every store-brand
+    ibuprofen), or the same brand for labels without a generic name. Keeping
+    dedup within a scope means a shared chunk's generic_name is right for every
+    label that references it, so drug filters still find it.
+    """
+    return (metadata.get("generic_name") or metadata["drug_name"]).lower()
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.mean(a == b))
+
+def _band_keys(scope: str, section: str, signature: np.ndarray, numbers: str) -> List[str]:
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    # Only chunks with the same quantities share buckets, so they are the only candidates
+    numbers_key = hashlib.blake2b(numbers.encode("utf-8"), digest_size=8).hexdigest()
+    return [
+        f"{scope}|{section}|{numbers_key}|{i}|" + hashlib.blake2b(signature[i * rows:(i + 1) * rows].tobytes(), digest_size=8).hexdigest()
+        for i in range(LSH_BANDS)
+    ]
+
+def chunk_store_path(vector_store_path: str) -> str:
+    """
+    CHUNK_STORE_PATH if set, else chunk_store.sqlite3 in the vector store's directory.
+    A store left at the old default next to that directory is moved into it.
+    """
+    if CHUNK_STORE_PATH is not None:
+        return CHUNK_STORE_PATH
+    os.makedirs(vector_store_path, exist_ok=True)
+    path = os.path.join(vector_store_path, CHUNK_STORE_FILE)
+    legacy = os.path.abspath(LEGACY_CHUNK_STORE_PATH)
+    if (not os.path.exists(path) and os.path.exists(legacy)
+            and os.path.dirname(legacy) == os.path.dirname(os.path.abspath(vector_store_path))):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(legacy + suffix):
+                os.replace(legacy + suffix, path + suffix)
+        logger.info("Moved the chunk store into the vector store directory", extra={"path": path})
+    return path
+
+class ChunkStore:
+    """
+    Which labels reference which stored chunk, for cross-label deduplication.
+    A chunk is stored in the vector store once; every (label, section) that
+    contains it (exactly, or as a near-duplicate found via MinHash LSH with the
+    same numbers and units) gets a row in `refs`. A chunk is deleted from the
+    vector store when its last reference goes away.
+    """
+
+    def __init__(self, path: str = "", threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS refs (
+                chunk_id TEXT NOT NULL,
+                set_id TEXT NOT NULL,
+                section TEXT NOT NULL,
+                section_hash TEXT NOT NULL,
+                drug_name TEXT,
+                generic_name TEXT,
+                PRIMARY KEY (set_id, section, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS refs_chunk ON refs (chunk_id);
+            CREATE TABLE IF NOT EXISTS signatures (
+                chunk_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lsh (
+                band TEXT NOT NULL,
+                chunk_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS lsh_band ON lsh (band);
+            CREATE INDEX IF NOT EXISTS lsh_chunk ON lsh (chunk_id);"""
+        )
+        self._conn.commit()
+
+    # --- Lookups ---
+
+    def sections(self, set_ids: List[str]) -> Dict[Tuple[str, str], Tuple[str, List[str]]]:
+        """(set_id, section) -> (section_hash, referenced chunk ids) for the given labels."""
+        out: Dict[Tuple[str, str], Tuple[str, List[str]]] = {}
+        with self._lock:
+            for i in range(0, len(set_ids), 500):
+                batch = set_ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT set_id, section, section_hash, chunk_id FROM refs WHERE set_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for set_id, section, section_hash, chunk_id in rows:
+                    out.setdefault((set_id, section), (section_hash, []))[1].append(chunk_id)
+        return out
+
+    def known(self, chunk_ids: Iterable[str]) -> Set[str]:
+        """The chunk ids that are referenced by at least one label."""
+        ids = list(set(chunk_ids))
+        found = set()
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT DISTINCT chunk_id FROM refs WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(r[0] for r in rows)
+        return found
+
+    def find_near_duplicate(self, scope: str, section: str, signature: np.ndarray, numbers: str) -> Optional[str]:
+        """
+        The most similar stored chunk of the same drug and section at or above the
+        threshold, among those with exactly the same quantities (see quantities()).
+        """
+        keys = _band_keys(scope, section, signature, numbers)
+        with self._lock:
+            candidates = {r[0] for r in self._conn.execute(
+                f"SELECT DISTINCT chunk_id FROM lsh WHERE band IN ({','.join('?' * len(keys))})", keys
+            )}
+            best, best_score = None, self.threshold
+            for chunk_id in candidates:
+                row = self._conn.execute("SELECT signature FROM signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                if row is None:
+                    continue
+                score = similarity(signature, np.frombuffer(row[0], dtype=np.uint32))
+                if score >= best_score:
+                    best, best_score = chunk_id, score
+        return best
+
+    def names(self) -> List[dict]:
+        """Distinct (drug_name, generic_name) pairs across all references."""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT drug_name, generic_name FROM refs").fetchall()
+        return [{"drug_name": d, "generic_name": g} for d, g in rows]
+
+    def data_version(self) -> int:
+        """Changes whenever another connection (process) commits; this one's own commits leave it as is."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def drugs(self, keys: Iterable[Tuple[str, str]]) -> Set[str]:
+        """Drug and generic names referenced by the given (set_id, section) pairs."""
+        names: Set[str] = set()
+        with self._lock:
+            for set_id, section in keys:
+                for row in self._conn.execute(
+                    "SELECT DISTINCT drug_name, generic_name FROM refs WHERE set_id = ? AND section = ?", (set_id, section)
+                ):
+                    names.update(name for name in row if name)
+        return names
+
+    def counts(self) -> dict:
+        with self._lock:
+            chunks, refs = self._conn.execute("SELECT COUNT(DISTINCT chunk_id), COUNT(*) FROM refs").fetchone()
+        return {"chunks": chunks, "references": refs}
+
+    # --- Updates ---
+
+    def replace_sections(self, removed: List[Tuple[str, str]], rows: List[tuple],
+                         signatures: List[tuple] = ()) -> List[str]:
+        """
+        Drops the references of the (set_id, section) pairs in removed and inserts rows
+        (chunk_id, set_id, section, section_hash, drug_name, generic_name) and the new
+        chunks' signatures (chunk_id, scope, section, signature, numbers), uncommitted
+        until commit() so the caller can update the vector store first. Call it after
+        embedding: the write lock is held from here to commit(), across processes.
+        Returns the chunk ids that no label references any more.
+        """
+        with self._lock:
+            for chunk_id, scope, section, signature, numbers in signatures:
+                self._conn.execute("INSERT OR REPLACE INTO signatures (chunk_id, signature) VALUES (?, ?)",
+                                   (chunk_id, signature.tobytes()))
+                self._conn.executemany("INSERT INTO lsh (band, chunk_id) VALUES (?, ?)",
+                                       [(key, chunk_id) for key in _band_keys(scope, section, signature, numbers)])
+            candidates = set()
+            for set_id, section in removed:
+                candidates.update(r[0] for r in self._conn.execute(
+                    "SELECT chunk_id FROM refs WHERE set_id = ? AND section = ?", (set_id, section)
+                ))
+                self._conn.execute("DELETE FROM refs WHERE set_id = ? AND section = ?", (set_id, section))
+            self._conn.executemany("INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?, ?)", rows)
+            orphans = [c for c in candidates
+                       if self._conn.execute("SELECT 1 FROM refs WHERE chunk_id = ? LIMIT 1", (c,)).fetchone() is None]
+            for chunk_id in orphans:
+                self._conn.execute("DELETE FROM signatures WHERE chunk_id = ?", (chunk_id,))
+                self._conn.execute("DELETE FROM lsh WHERE chunk_id = ?", (chunk_id,))
+        return orphans
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._conn.rollback()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
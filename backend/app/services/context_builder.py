@@ -0,0 +1,202 @@
+import os
+import re
+import math
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.app.core.metrics import histogram
+from backend.app.services.chunk_store import dedup_scope
+from backend.app.services.label_chunking import SENTENCE_END
+from backend.app.services.retrieval import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CONTEXT_BUILDER = os.getenv("CONTEXT_BUILDER", "1") == "1" # "0" = top CONTEXT_TOP_K chunks verbatim
+CONTEXT_TOP_K = 3 # chunks in the prompt without the builder
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800")) # label text tokens per prompt
+CONTEXT_FETCH_K = int(os.getenv("CONTEXT_FETCH_K", "8")) # chunks retrieved before selection
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7")) # 1 = relevance only, 0 = diversity only
+CONTEXT_REDUNDANCY = float(os.getenv("CONTEXT_REDUNDANCY", "0.92")) # similarity at which a chunk adds nothing
+# The chat model's (llama3) tokenizer: a tokenizer.json path, or a Hugging Face repo id
+# (e.g. NousResearch/Meta-Llama-3-8B-Instruct, downloaded on first start); "" = estimate
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")
+
+CHARS_PER_TOKEN = 4.0 # without a tokenizer: llama3's 128k vocabulary averages about 4 characters per token on label text
+MAX_OVERLAP = 400 # characters; longest seam looked for when merging neighbouring chunks
+MIN_OVERLAP = 20
+
+CONTEXT_TOKENS = histogram("rag_context_tokens", "Label text tokens put into a prompt", ["component"],
+                           buckets=(100, 200, 300, 400, 500, 600, 800, 1000, 1500, 2000, 3000))
+
+# "Drug: ...\nSection: ...\nContent: " (chunks written before deduplication) or "Section: ...\n"
+_HEADER = re.compile(r"^(?:Drug: [^\n]*\n)?(?:Section: [^\n]*\n)?(?:Content: )?")
+_WORDS = re.compile(r"[a-z0-9]+")
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def load_token_counter(name: str = CONTEXT_TOKENIZER) -> Callable[[str], int]:
+    """
+    Token counter for the chat model: the Hugging Face `tokenizers` tokenizer
+    CONTEXT_TOKENIZER names (a local tokenizer.json, or a repo id downloaded once
+    into the Hugging Face cache), or a length estimate if it is unset or can't be
+    loaded.
+    """
+    if not name:
+        return estimate_tokens
+    try:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(name) if os.path.exists(name) else Tokenizer.from_pretrained(name)
+    except Exception as e:
+        logger.warning("Tokenizer %s unavailable (%s); estimating tokens from text length", name, e)
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def chunk_body(doc: Document) -> str:
+    return _HEADER.sub("", doc.page_content, count=1).strip()
+
+def _join(a: str, b: str) -> Optional[str]:
+    """a + b with the text they share (splitter overlap) written once; None if they don't overlap."""
+    for k in range(min(len(a), len(b), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return a + b[k:]
+    return None
+
+class ContextBuilder:
+    """
+    Turns over-retrieved chunks (best first) into the prompt context:
+    1. Maximal marginal relevance over the retrieval order, dropping chunks that
+       repeat one already chosen (similarity >= redundancy).
+    2. Adds chunks while they fit the token budget; a chunk that doesn't fit
+       contributes only its sentences that share words with the question.
+    3. Chunks of the same section that share chunks (dedup_scope: one generic
+       across its labels) are merged into one block, in label order, with the
+       overlap between neighbours written once.
+    vectors(docs) returns the chunks' stored embeddings (or None); without
+    them, similarity is word-set Jaccard.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int] = estimate_tokens, budget: int = CONTEXT_TOKEN_BUDGET,
+                 mmr_lambda: float = CONTEXT_MMR_LAMBDA, redundancy: float = CONTEXT_REDUNDANCY,
+                 vectors: Optional[Callable[[List[Document]], Optional[np.ndarray]]] = None,
+                 component: str = "rag"):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.mmr_lambda = mmr_lambda
+        self.redundancy = redundancy
+        self.vectors = vectors
+        self.component = component
+
+    def _similarities(self, docs: List[Document], bodies: List[str]) -> np.ndarray:
+        vectors = self.vectors(docs) if self.vectors is not None else None
+        if vectors is not None:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            unit = vectors / np.where(norms == 0, 1, norms)
+            return unit @ unit.T
+        sets = [set(_WORDS.findall(body.lower())) for body in bodies]
+        sims = np.zeros((len(docs), len(docs)))
+        for i in range(len(docs)):
+            for j in range(i + 1, len(docs)):
+                union = len(sets[i] | sets[j])
+                sims[i, j] = sims[j, i] = len(sets[i] & sets[j]) / union if union else 0.0
+        return sims
+
+    def _fit(self, text: str, budget: int, question: str) -> str:
+        """
+        The sentences of text that mention the most question terms, kept in label
+        order and within budget tokens; "" if none mention any.
+        """
+        terms = set(tokenize(question))
+        sentences = SENTENCE_END.split(text)
+        scored = sorted(((len(terms & set(tokenize(sentence))), i) for i, sentence in enumerate(sentences)),
+                        key=lambda x: (-x[0], x[1]))
+        keep, used = [], 0
+        for score, i in scored:
+            if score == 0:
+                break
+            cost = self.count_tokens(sentences[i]) + 1
+            if used + cost <= budget:
+                keep.append(i)
+                used += cost
+        keep.sort()
+        parts = []
+        for n, i in enumerate(keep):
+            if n and i != keep[n - 1] + 1:
+                parts.append("[...]")
+            parts.append(sentences[i])
+        return " ".join(parts)
+
+    def select(self, docs: Sequence[Document], question: str = "") -> List[Tuple[Document, str]]:
+        """(doc, text) pairs chosen by MMR within the token budget, in selection order."""
+        docs = list(docs)
+        if not docs:
+            return []
+        bodies = [chunk_body(doc) for doc in docs]
+        sims = self._similarities(docs, bodies)
+        n = len(docs)
+        relevance = [1.0 - i / n for i in range(n)] # retrieval already ranked them
+
+        chosen: List[int] = []
+        texts: Dict[int, str] = {}
+        used = 0
+        remaining = list(range(n))
+        while remaining and used < self.budget:
+            best, best_score, best_redundancy = None, -math.inf, 0.0
+            for i in remaining:
+                redundancy = max((sims[i, j] for j in chosen), default=0.0)
+                score = self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy
+                if score > best_score:
+                    best, best_score, best_redundancy = i, score, redundancy
+            remaining.remove(best)
+            if best_redundancy >= self.redundancy:
+                continue
+            cost = self.count_tokens(bodies[best])
+            if used + cost > self.budget:
+                texts[best] = self._fit(bodies[best], self.budget - used, question)
+                if not texts[best]:
+                    continue # a smaller chunk further down may still fit
+                cost = self.count_tokens(texts[best])
+            chosen.append(best)
+            texts.setdefault(best, bodies[best])
+            used += cost
+        return [(docs[i], texts[i]) for i in chosen]
+
+    def render(self, selected: List[Tuple[Document, str]]) -> str:
+        # Group by shared-chunk scope and section, in order of each group's best chunk
+        groups: Dict[Tuple[str, str], List[Tuple[int, Document, str]]] = {}
+        for rank, (doc, text) in enumerate(selected):
+            meta = doc.metadata
+            scope = dedup_scope(meta) if meta.get("generic_name") or meta.get("drug_name") else meta.get("set_id") or ""
+            key = (scope, meta.get("section") or "")
+            groups.setdefault(key, []).append((rank, doc, text))
+
+        blocks = []
+        for (_scope, section), items in groups.items():
+            # Label order where the chunk position is known, else retrieval order
+            items.sort(key=lambda item: (item[1].metadata.get("chunk", item[0]), item[0]))
+            text, prev = "", None
+            for _rank, doc, part in items:
+                position = (doc.metadata.get("set_id"), doc.metadata.get("chunk"))
+                if not text:
+                    text = part
+                elif prev is not None and prev[1] is not None and position == (prev[0], prev[1] + 1):
+                    text = _join(text, part) or f"{text} {part}"
+                else:
+                    text = _join(text, part) or f"{text} [...] {part}"
+                prev = position
+            meta = items[0][1].metadata
+            drug = meta.get("generic_name") or meta.get("drug_name")
+            header = f"Drug: {drug}\nSection: {section}" if drug else f"Section: {section}"
+            blocks.append(f"{header}\n{text}")
+        return "\n\n".join(blocks)
+
+    def build(self, docs: Sequence[Document], question: str = "") -> Tuple[str, List[Document]]:
+        """(context, the documents it was built from)."""
+        selected = self.select(docs, question)
+        context = self.render(selected)
+        CONTEXT_TOKENS.observe(self.count_tokens(context), component=self.component)
+        return context, [doc for doc, _text in selected]
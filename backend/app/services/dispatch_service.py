@@ -0,0 +1,479 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import heapq
+import asyncio
+import datetime
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.app.models.sql_models import DispatchLease, Reminder, User
+from backend.app.services.adherence_service import upsert_adherence
+from backend.app.services.email_service import format_dose_reminder_email
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC") # users without a timezone
+DISPATCH_GRACE_MINUTES = int(os.getenv("DISPATCH_GRACE_MINUTES", "60")) # after the day's last dose
+DISPATCH_POLL_SECONDS = float(os.getenv("DISPATCH_POLL_SECONDS", "30")) # look for reminders added by other processes
+DISPATCH_LEASE_SECONDS = float(os.getenv("DISPATCH_LEASE_SECONDS", "60")) # a dead leader's doses resume after this
+DISPATCH_MAX_SLEEP = 60.0 # seconds; re-check the clock at least this often
+DISPATCH_LEASE_NAME = "dose_dispatcher"
+
+UTC = datetime.timezone.utc
+
+# Heap event kinds
+DOSE_DUE = 0
+MISSED_CHECK = 1
+
+@dataclass
+class DueDose:
+    reminder_id: int
+    user_id: int
+    drug_name: str
+    dosage: str
+    local_date: datetime.date
+    local_time: datetime.time
+    due_at: datetime.datetime # UTC
+    recipient: Optional[str] = None # the patient's username (an email address, when it has an @)
+
+@dataclass
+class ScheduledReminder:
+    reminder_id: int
+    user_id: int
+    drug_name: str
+    dosage: str
+    times: Tuple[datetime.time, ...] # sorted local times of day
+    tz: ZoneInfo
+    starts_at: datetime.datetime # UTC; no doses are due (or missed) before this
+    ends_on: Optional[datetime.date] # last local day, inclusive; None = open-ended
+    version: int
+    recipient: Optional[str] = None
+
+class SystemClock:
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now(UTC)
+
+class SimulatedClock:
+    """Manually advanced clock for deterministic runs (see scripts/simulate_dispatch.py)."""
+
+    def __init__(self, start: datetime.datetime):
+        self._now = start.astimezone(UTC)
+
+    def now(self) -> datetime.datetime:
+        return self._now
+
+    def advance(self, delta: datetime.timedelta) -> datetime.datetime:
+        self._now += delta
+        return self._now
+
+def get_timezone(name: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+def parse_times(times) -> Tuple[datetime.time, ...]:
+    """Valid "HH:MM" entries of Reminder.times, sorted and de-duplicated."""
+    parsed = set()
+    for value in times or []:
+        try:
+            hour, minute = str(value).strip().split(":")[:2]
+            parsed.add(datetime.time(int(hour), int(minute)))
+        except ValueError:
+            continue
+    return tuple(sorted(parsed))
+
+def log_due_dose(dose: DueDose):
+    logger.info("Reminder due: user %s - %s %s at %s (%s)", dose.user_id, dose.drug_name, dose.dosage,
+                dose.local_time.strftime("%H:%M"), dose.local_date)
+
+def email_due_dose(email_worker) -> Callable[[DueDose], None]:
+    """on_due handler that queues a reminder email to the patient (see EmailDeliveryWorker)."""
+    def on_due(dose: DueDose):
+        log_due_dose(dose)
+        if dose.recipient and "@" in dose.recipient:
+            body = format_dose_reminder_email(dose.recipient.split("@")[0], dose.drug_name, dose.dosage,
+                                              f"{dose.local_time:%H:%M} ({dose.local_date})")
+            email_worker.enqueue(dose.recipient, f"Medication Reminder: {dose.drug_name} - MedCare", body)
+    return on_due
+
+def acquire_lease(db: Session, owner: str, now: datetime.datetime, duration: float,
+                  name: str = DISPATCH_LEASE_NAME) -> bool:
+    """
+    Takes or renews the named lease for `owner`. A single conditional UPDATE decides
+    it (held by us, or expired), so two processes never both get it. Returns whether
+    `owner` holds the lease until now + duration.
+    """
+    now = now.astimezone(UTC).replace(tzinfo=None) # DB timestamps are naive UTC
+    until = now + datetime.timedelta(seconds=duration)
+    try:
+        taken = (
+            db.query(DispatchLease)
+            .filter(DispatchLease.name == name)
+            .filter(or_(DispatchLease.owner == owner, DispatchLease.lease_until < now))
+            .update({DispatchLease.owner: owner, DispatchLease.lease_until: until}, synchronize_session=False)
+        )
+        if not taken:
+            if db.get(DispatchLease, name) is not None:
+                db.rollback()
+                return False
+            db.add(DispatchLease(name=name, owner=owner, lease_until=until))
+        db.commit()
+        return True
+    except IntegrityError:
+        # Another process created the row first
+        db.rollback()
+        return False
+
+class DoseDispatcher:
+    """
+    Fires reminders at their Reminder.times and marks days with no adherence
+    record as "missed" once the grace window after the day's last dose passes.
+
+    Each active reminder has at most two entries in a min-heap keyed by the next
+    instant something happens to it (next dose, next missed check), so every event
+    and every add / remove costs O(log n) and nothing ever scans the reminders
+    table. Updates bump the reminder's version; heap entries with an old version
+    are dropped when popped (lazy deletion). State is rebuilt from the DB on
+    startup with load(); reminders created later by other processes are picked
+    up by poll().
+
+    Every API process may run a dispatcher, but run() only fires reminders while
+    it holds the dispatch lease (a row in dispatch_leases, renewed well before it
+    expires). The others stand by and take over, with a fresh load(), when the
+    leader stops renewing, so each due dose is delivered once.
+
+    The engine is clock-driven: run_until(instant) processes everything due up to
+    that instant, so it can be driven by the async run() loop or by a simulated clock.
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None, clock=None,
+                 on_due: Optional[Callable[[DueDose], None]] = log_due_dose,
+                 grace: datetime.timedelta = datetime.timedelta(minutes=DISPATCH_GRACE_MINUTES),
+                 lease: float = DISPATCH_LEASE_SECONDS):
+        self.session_factory = session_factory
+        self.clock = clock or SystemClock()
+        self.on_due = on_due
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._heap: List[tuple] = [] # (instant, seq, kind, reminder_id, version, local_date)
+        self._seq = itertools.count()
+        self._reminders: Dict[int, ScheduledReminder] = {}
+        self._versions = itertools.count(1)
+        self._pending_missed: Dict[Tuple[int, datetime.date], dict] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped = False
+        self._last_seen_id = 0 # highest reminder id read from the DB
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.doses_dispatched = 0
+        self.missed_marked = 0
+
+    def __len__(self):
+        return len(self._reminders)
+
+    # --- Time arithmetic ---
+
+    @staticmethod
+    def _instant(reminder: ScheduledReminder, day: datetime.date, at: datetime.time) -> datetime.datetime:
+        return datetime.datetime.combine(day, at, tzinfo=reminder.tz).astimezone(UTC)
+
+    def _active_on(self, reminder: ScheduledReminder, day: datetime.date) -> bool:
+        return reminder.ends_on is None or day <= reminder.ends_on
+
+    def _next_dose(self, reminder: ScheduledReminder,
+                   after: datetime.datetime) -> Optional[Tuple[datetime.datetime, datetime.date]]:
+        """First dose strictly after `after` (and not before the reminder started)."""
+        after = max(after, reminder.starts_at - datetime.timedelta(microseconds=1))
+        day = after.astimezone(reminder.tz).date() - datetime.timedelta(days=1) # DST / offset slack
+        for _ in range(3):
+            if not self._active_on(reminder, day):
+                return None
+            for at in reminder.times:
+                instant = self._instant(reminder, day, at)
+                if instant > after:
+                    return instant, day
+            day += datetime.timedelta(days=1)
+        return None
+
+    def _missed_check(self, reminder: ScheduledReminder,
+                      day: datetime.date) -> Optional[Tuple[datetime.datetime, datetime.date]]:
+        """When to check `day` for a missing adherence record (or None once the reminder ended)."""
+        first_day = reminder.starts_at.astimezone(reminder.tz).date()
+        # A reminder created after the day's first dose can't have been missed that day
+        if self._instant(reminder, first_day, reminder.times[0]) < reminder.starts_at:
+            first_day += datetime.timedelta(days=1)
+        day = max(day, first_day)
+        if not self._active_on(reminder, day):
+            return None
+        return self._instant(reminder, day, reminder.times[-1]) + self.grace, day
+
+    def _push(self, instant: datetime.datetime, kind: int, reminder: ScheduledReminder, day: datetime.date):
+        heapq.heappush(self._heap, (instant, next(self._seq), kind, reminder.reminder_id, reminder.version, day))
+
+    # --- Incremental updates ---
+
+    def add(self, reminder_id: int, user_id: int, drug_name: str, dosage: str, times,
+            timezone: Optional[str] = None, starts_at: Optional[datetime.datetime] = None,
+            ends_on: Optional[datetime.date] = None, now: Optional[datetime.datetime] = None,
+            recipient: Optional[str] = None) -> bool:
+        """Schedules (or reschedules) a reminder. Returns False if it has nothing left to fire."""
+        parsed = parse_times(times)
+        now = now or self.clock.now()
+        if starts_at is None:
+            starts_at = now
+        elif starts_at.tzinfo is None:
+            starts_at = starts_at.replace(tzinfo=UTC) # DB timestamps are naive UTC
+        with self._lock:
+            self._reminders.pop(reminder_id, None)
+            if not parsed:
+                return False
+            reminder = ScheduledReminder(
+                reminder_id=reminder_id, user_id=user_id, drug_name=drug_name or "", dosage=dosage or "",
+                times=parsed, tz=get_timezone(timezone), starts_at=starts_at, ends_on=ends_on,
+                version=next(self._versions), recipient=recipient
+            )
+            dose = self._next_dose(reminder, now)
+            # Catch up on yesterday too, so days that ended while the server was down get checked
+            check = self._missed_check(reminder, now.astimezone(reminder.tz).date() - datetime.timedelta(days=1))
+            if dose is None and check is None:
+                return False
+            self._reminders[reminder_id] = reminder
+            if dose:
+                self._push(dose[0], DOSE_DUE, reminder, dose[1])
+            if check:
+                self._push(check[0], MISSED_CHECK, reminder, check[1])
+        self._notify()
+        return True
+
+    def add_reminder(self, reminder: Reminder, timezone: Optional[str] = None,
+                     now: Optional[datetime.datetime] = None, recipient: Optional[str] = None) -> bool:
+        return self.add(reminder.id, reminder.user_id, reminder.drug_name, reminder.dosage, reminder.times,
+                        timezone=timezone, starts_at=reminder.created_at, ends_on=reminder.ends_on, now=now,
+                        recipient=recipient)
+
+    def remove(self, reminder_id: int) -> bool:
+        # Its heap entries become stale and are skipped when popped
+        with self._lock:
+            return self._reminders.pop(reminder_id, None) is not None
+
+    def load(self, db: Session, page_size: int = 5000, after_id: int = 0) -> int:
+        """Rebuilds the schedule from the DB (active reminders with id > after_id only)."""
+        now = self.clock.now()
+        # Earliest ends_on that can still be active anywhere (UTC-12)
+        oldest_active = (now - datetime.timedelta(days=2)).date()
+        rows = (
+            db.query(Reminder.id, Reminder.user_id, Reminder.drug_name, Reminder.dosage, Reminder.times,
+                     Reminder.created_at, Reminder.ends_on, User.timezone, User.username)
+            .join(User, User.id == Reminder.user_id)
+            .filter(Reminder.id > after_id)
+            .filter(or_(Reminder.ends_on.is_(None), Reminder.ends_on >= oldest_active))
+            .order_by(Reminder.id)
+            .execution_options(yield_per=page_size)
+        )
+        loaded = 0
+        for row in rows:
+            self._last_seen_id = max(self._last_seen_id, row.id)
+            if after_id and row.id in self._reminders:
+                continue # added in this process already
+            loaded += self.add(row.id, row.user_id, row.drug_name, row.dosage, row.times, timezone=row.timezone,
+                               starts_at=row.created_at, ends_on=row.ends_on, now=now, recipient=row.username)
+        if not after_id:
+            logger.info("Dispatcher loaded %d active reminders.", loaded)
+        elif loaded:
+            logger.info("Dispatcher picked up %d new reminders.", loaded)
+        return loaded
+
+    def poll(self) -> int:
+        """Schedules reminders created since the last load() / poll(), by any process."""
+        if self.session_factory is None:
+            return 0
+        db = self.session_factory()
+        try:
+            return self.load(db, after_id=self._last_seen_id)
+        except Exception:
+            logger.exception("Polling for new reminders failed")
+            return 0
+        finally:
+            db.close()
+
+    # --- Event processing ---
+
+    def next_due(self) -> Optional[datetime.datetime]:
+        with self._lock:
+            while self._heap:
+                _instant, _seq, _kind, reminder_id, version, _day = self._heap[0]
+                reminder = self._reminders.get(reminder_id)
+                if reminder is not None and reminder.version == version:
+                    return self._heap[0][0]
+                heapq.heappop(self._heap)
+        return None
+
+    def run_until(self, now: datetime.datetime) -> int:
+        """Processes every event due at or before `now`. Returns the number processed."""
+        processed = 0
+        due: List[DueDose] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                instant, _seq, kind, reminder_id, version, day = heapq.heappop(self._heap)
+                reminder = self._reminders.get(reminder_id)
+                if reminder is None or reminder.version != version:
+                    continue
+                processed += 1
+                if kind == DOSE_DUE:
+                    local = instant.astimezone(reminder.tz)
+                    due.append(DueDose(reminder.reminder_id, reminder.user_id, reminder.drug_name,
+                                       reminder.dosage, day, local.time(), instant, reminder.recipient))
+                    nxt = self._next_dose(reminder, instant)
+                    if nxt:
+                        self._push(nxt[0], DOSE_DUE, reminder, nxt[1])
+                else:
+                    self._pending_missed[(reminder_id, day)] = {
+                        "reminder_id": reminder_id, "date": day, "status": "missed"
+                    }
+                    nxt = self._missed_check(reminder, day + datetime.timedelta(days=1))
+                    if nxt:
+                        self._push(nxt[0], MISSED_CHECK, reminder, nxt[1])
+                    else:
+                        # The last day has been checked: the reminder has expired
+                        del self._reminders[reminder_id]
+
+        self.doses_dispatched += len(due)
+        if self.on_due:
+            for dose in due:
+                try:
+                    self.on_due(dose)
+                except Exception:
+                    logger.exception("Reminder dispatch failed for %s", dose.reminder_id)
+        return processed
+
+    def flush(self) -> int:
+        """Writes pending "missed" records. Existing records (taken / partial) are left alone."""
+        with self._lock:
+            rows = list(self._pending_missed.values())
+            self._pending_missed.clear()
+        if not rows or self.session_factory is None:
+            return 0
+        db = self.session_factory()
+        try:
+            upsert_adherence(db, rows, overwrite=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to mark missed doses")
+            with self._lock:
+                for row in rows:
+                    self._pending_missed.setdefault((row["reminder_id"], row["date"]), row)
+            return 0
+        finally:
+            db.close()
+        self.missed_marked += len(rows)
+        return len(rows)
+
+    # --- Async driver ---
+
+    def _notify(self):
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def reset(self):
+        """Forgets every scheduled reminder (before a fresh load())."""
+        with self._lock:
+            self._heap.clear()
+            self._reminders.clear()
+            self._pending_missed.clear()
+            self._last_seen_id = 0
+
+    def renew_lease(self) -> bool:
+        """
+        Takes or renews the dispatch lease. On taking it over, the schedule is rebuilt
+        from the DB; on losing it, dropped. Without a session factory there is
+        nothing to share, so the dispatcher always leads.
+        """
+        if self.session_factory is None:
+            self.is_leader = True
+            return True
+        db = self.session_factory()
+        try:
+            leader = acquire_lease(db, self.owner, self.clock.now(), self.lease)
+        except Exception:
+            logger.exception("Renewing the dispatch lease failed")
+            leader = False
+        finally:
+            db.close()
+        if leader and not self.is_leader:
+            logger.info("Dispatcher took the dispatch lease", extra={"owner": self.owner})
+            self.reset()
+            db = self.session_factory()
+            try:
+                self.load(db)
+            except Exception:
+                logger.exception("Dispatcher load failed")
+                leader = False
+            finally:
+                db.close()
+        elif self.is_leader and not leader:
+            logger.warning("Dispatcher lost the dispatch lease", extra={"owner": self.owner})
+            self.reset()
+        self.is_leader = leader
+        return leader
+
+    async def run(self):
+        """
+        Dispatch loop: while holding the lease, sleeps until the next event (or an
+        add()), then processes what's due; otherwise waits to take the lease over.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopped = False
+        renew_every = self.lease / 3
+        last_renew = last_poll = float("-inf")
+        while not self._stopped:
+            if time.monotonic() - last_renew >= renew_every:
+                was_leader = self.is_leader
+                await asyncio.to_thread(self.renew_lease)
+                last_renew = time.monotonic()
+                if self.is_leader and not was_leader:
+                    last_poll = last_renew # just loaded
+            if not self.is_leader:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=renew_every)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if time.monotonic() - last_poll >= DISPATCH_POLL_SECONDS:
+                await asyncio.to_thread(self.poll)
+                last_poll = time.monotonic()
+            # on_due may queue emails: off the event loop
+            await asyncio.to_thread(self.run_until, self.clock.now())
+            if self._pending_missed:
+                await asyncio.to_thread(self.flush)
+            self._wake.clear()
+            nxt = self.next_due()
+            delay = min(DISPATCH_MAX_SLEEP, renew_every - (time.monotonic() - last_renew),
+                        max(0.0, DISPATCH_POLL_SECONDS - (time.monotonic() - last_poll)))
+            delay = max(0.0, delay)
+            if nxt is not None:
+                delay = min(delay, max(0.0, (nxt - self.clock.now()).total_seconds()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stopped = True
+        self._notify()
@@ -0,0 +1,206 @@
+import os
+import re
+from typing import List, Optional, Tuple
+
+# Rule-based extraction of the common dosage phrasings found in label text
+# ("twice daily", "every 8 hours", "500 mg three times daily", ...).
+# Returns the same shape as ReminderSchedule plus a confidence score, so
+# ReminderService only needs the LLM for the phrasings this doesn't cover.
+
+# Parses at or above this confidence skip the LLM
+DOSAGE_PARSER_MIN_CONFIDENCE = float(os.getenv("DOSAGE_PARSER_MIN_CONFIDENCE", "0.75"))
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "once": 1, "twice": 2, "thrice": 3, "a": 1, "an": 1, "single": 1,
+}
+_NUM = r"(\d+|one|two|three|four|five|six)"
+
+# Default clock times for N doses a day (twice daily -> 8am / 8pm)
+DAILY_TIMES = {
+    1: ["08:00"],
+    2: ["08:00", "20:00"],
+    3: ["08:00", "14:00", "20:00"],
+    4: ["08:00", "12:00", "16:00", "20:00"],
+}
+FIRST_DOSE_HOUR = 8
+
+# "3 times daily", "twice a day", "4x per day", "3 or 4 times daily": the count is read from the
+# text, a range ("N to/or M times") is kept so the parse can stay below the threshold
+COUNT_FREQUENCY_PATTERN = re.compile(
+    r"\b(?:(?P<word>once|twice|thrice)|(?P<low>" + _NUM[1:-1] + r")"
+    r"(?:\s*(?:to|or|-)\s*(?P<high>" + _NUM[1:-1] + r"))?\s*(?:x|times?)\b)"
+    r"[\s-]*(?:a|per|each|every)?\s*(?:day|daily)\b"
+)
+# (regex, doses per day) for abbreviations and fixed phrasings that carry no count
+FREQUENCY_PATTERNS = [
+    (re.compile(r"\bq\.?i\.?d\b"), 4),
+    (re.compile(r"\bt\.?i\.?d\b"), 3),
+    (re.compile(r"\bb\.?i\.?d\b|\bevery 12 hours\b"), 2),
+    (re.compile(r"\bevery 24 hours\b|\bq\.?d\b"), 1),
+]
+# Bare "daily" only means once a day when no count came before it
+BARE_DAILY_PATTERN = re.compile(r"\bdaily\b|\bevery day\b")
+INTERVAL_PATTERN = re.compile(r"\bevery\s+" + _NUM + r"(?:\s*(?:to|-|or)\s*" + _NUM + r")?\s*hours?\b")
+BEDTIME_PATTERN = re.compile(r"\b(at bedtime|before bed|nightly|every night|at night)\b")
+MORNING_PATTERN = re.compile(r"\b(every morning|in the morning)\b")
+WEEKLY_PATTERN = re.compile(r"\b(once (a|per|every) week|once weekly|weekly)\b")
+AS_NEEDED_PATTERN = re.compile(r"\b(as needed|when needed|if needed|while symptoms persist|prn)\b")
+
+DOSE_PATTERN = re.compile(
+    r"\b(\d+(?:\.\d+)?|one|two|three|four|five|six|a|an|single)\s*"
+    r"(mg|mcg|µg|g|ml|units?|tablets?|caplets?|capsules?|softgels?|teaspoons?|tablespoons?|tsp|drops?|puffs?|sprays?|patch(?:es)?|suppositor(?:y|ies))\b"
+)
+
+INSTRUCTION_PATTERNS = [
+    (re.compile(r"\b(with food|with meals?|after meals?|after eating|with a meal)\b"), "Take with food"),
+    (re.compile(r"\b(empty stomach|before meals?|before eating)\b"), "Take on an empty stomach"),
+    (re.compile(r"\b(full glass of water|with water)\b"), "Take with a full glass of water"),
+    (re.compile(r"\bdo not crush or chew\b|\bswallow whole\b"), "Swallow whole; do not crush or chew"),
+]
+MAX_DAILY_PATTERN = re.compile(r"\bdo not (?:take|use|exceed) more than ([^.;]+?)(?: in| per| within) (24 hours|a day|one day|1 day)")
+
+# Signals that the text has several regimens (age groups, titration) and needs a human-like read
+AMBIGUITY_PATTERN = re.compile(r"\b(children|pediatric|under \d+ years|titrat|loading dose|initial dose|increase|maintenance)\b")
+# Limits ("do not exceed 4 doses daily") state a ceiling, not a schedule: removed before frequencies are read
+LIMIT_PATTERN = re.compile(
+    r"\b(?:do not exceed|not to exceed|(?:do )?not (?:take|use|give) more than|not more than|no more than|"
+    r"(?:a )?maximum of|maximum (?:daily )?dose)\b[^.;]*"
+)
+# Schedules that change over time ("daily for 3 days then twice daily") or have no fixed times
+# (as needed) can't be a single list of clock times: such parses stay below the threshold
+CHANGING_SCHEDULE_PATTERN = re.compile(r"\b(then|followed by|thereafter|for \d+ (?:days?|weeks?))\b")
+NEEDS_LLM_CONFIDENCE = 0.5
+
+def normalize_dosage_text(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").lower()).strip()
+
+def _to_int(token: str) -> int:
+    return int(token) if token.isdigit() else NUMBER_WORDS[token]
+
+def _daily_times(per_day: int) -> List[str]:
+    """Clock times for N doses a day, spread evenly over the waking day past the table above."""
+    if per_day in DAILY_TIMES:
+        return DAILY_TIMES[per_day]
+    step = 12 * 60 // (per_day - 1)
+    return [f"{(FIRST_DOSE_HOUR * 60 + i * step) // 60:02d}:{(i * step) % 60:02d}" for i in range(per_day)]
+
+def _interval_times(hours: int) -> List[str]:
+    return [f"{(FIRST_DOSE_HOUR + i * hours) % 24:02d}:00" for i in range(24 // hours)]
+
+SINGULAR_UNITS = {"patches": "patch", "suppositories": "suppository", "suppository": "suppository"}
+MEASURE_UNITS = ("mg", "mcg", "µg", "g", "ml", "tsp")
+
+def _find_dose(text: str) -> Optional[str]:
+    match = DOSE_PATTERN.search(text)
+    if not match:
+        return None
+    amount, unit = match.group(1), match.group(2)
+    if not amount[0].isdigit():
+        amount = str(NUMBER_WORDS[amount])
+    if unit in MEASURE_UNITS:
+        return f"{amount} {unit}"
+    # Count units read "1 tablet" / "2 tablets"
+    singular = SINGULAR_UNITS.get(unit, unit.rstrip("s"))
+    if amount == "1":
+        return f"{amount} {singular}"
+    plural = {"patch": "patches", "suppository": "suppositories"}.get(singular, singular + "s")
+    return f"{amount} {plural}"
+
+def parse_dosage(drug_name: str, dosage_text: str) -> Tuple[dict, float]:
+    """
+    Extracts (schedule, confidence) from dosage text without calling a model.
+    The schedule has the ReminderSchedule keys: drug, dosage, times, instructions.
+    Confidence is 0 when no frequency was recognized.
+    """
+    text = normalize_dosage_text(dosage_text)
+
+    # Every distinct dosing frequency mentioned in the text
+    frequencies = set()
+    times: List[str] = []
+    remaining = LIMIT_PATTERN.sub(" ", text)
+    ranged = False
+    for match in COUNT_FREQUENCY_PATTERN.finditer(remaining):
+        if match.group("word"):
+            per_day = NUMBER_WORDS[match.group("word")]
+        else:
+            low = _to_int(match.group("low"))
+            high = _to_int(match.group("high")) if match.group("high") else low
+            # "3 or 4 times daily": schedule the higher count, but let the LLM confirm it
+            ranged = ranged or high != low
+            per_day = max(low, high)
+        if per_day < 1:
+            continue
+        frequencies.add(per_day)
+        if not times:
+            times = _daily_times(per_day)
+    # So "twice daily" doesn't also count as a bare "daily"
+    remaining = COUNT_FREQUENCY_PATTERN.sub(" ", remaining)
+    for pattern, per_day in FREQUENCY_PATTERNS:
+        if pattern.search(remaining):
+            frequencies.add(per_day)
+            if not times:
+                times = DAILY_TIMES[per_day]
+            remaining = pattern.sub(" ", remaining)
+    if not frequencies and BARE_DAILY_PATTERN.search(remaining):
+        frequencies.add(1)
+        times = DAILY_TIMES[1]
+    remaining = BARE_DAILY_PATTERN.sub(" ", remaining)
+    for match in INTERVAL_PATTERN.finditer(remaining):
+        low = _to_int(match.group(1))
+        high = _to_int(match.group(2)) if match.group(2) else low
+        # "every 4 to 6 hours": schedule at the longer interval
+        hours = max(low, high)
+        if 1 <= hours <= 24 and 24 % hours == 0:
+            frequencies.add(24 // hours)
+            if not times or len(frequencies) == 1:
+                times = _interval_times(hours)
+
+    bedtime = BEDTIME_PATTERN.search(remaining)
+    morning = MORNING_PATTERN.search(remaining)
+    weekly = WEEKLY_PATTERN.search(remaining)
+    if not frequencies and (bedtime or morning or weekly):
+        frequencies.add(1)
+    if frequencies == {1} or not times:
+        if bedtime:
+            times = ["21:00"]
+        elif frequencies:
+            times = DAILY_TIMES[1]
+
+    dose = _find_dose(text)
+
+    instructions = [label for pattern, label in INSTRUCTION_PATTERNS if pattern.search(text)]
+    if weekly:
+        instructions.insert(0, "Once a week")
+    as_needed = AS_NEEDED_PATTERN.search(text)
+    if as_needed:
+        instructions.append("As needed")
+    max_daily = MAX_DAILY_PATTERN.search(text)
+    if max_daily:
+        instructions.append(f"Do not exceed {max_daily.group(1).strip()} in 24 hours")
+
+    schedule = {
+        "drug": drug_name,
+        "dosage": dose or "As directed",
+        "times": times,
+        "instructions": ". ".join(instructions) if instructions else "Take as directed"
+    }
+
+    if not frequencies:
+        return schedule, 0.0
+
+    confidence = 0.6
+    if dose:
+        confidence += 0.2
+    if len(frequencies) == 1:
+        confidence += 0.2
+    else:
+        # Conflicting regimens in one text (e.g. adults vs children)
+        confidence -= 0.2
+    if AMBIGUITY_PATTERN.search(text):
+        confidence -= 0.3
+    if len(text) > 400:
+        confidence -= 0.1
+    if ranged or as_needed or CHANGING_SCHEDULE_PATTERN.search(text):
+        confidence = min(confidence, NEEDS_LLM_CONFIDENCE)
+    return schedule, round(max(0.0, min(1.0, confidence)), 2)
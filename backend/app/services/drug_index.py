@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import time
+import heapq
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from backend.app.services.retrieval import INDEX_REFRESH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DRUG_INDEX_PATH = os.getenv("DRUG_INDEX_PATH", "./drug_index.json")
+
+MAX_EDIT_DISTANCE = 2
+SHORT_WORD = 4 # words up to this long only match within edit distance 1
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def _normalize(text: str) -> str:
+    return " ".join(_words(text))
+
+def _max_distance(word: str) -> int:
+    return 1 if len(word) <= SHORT_WORD else MAX_EDIT_DISTANCE
+
+def _deletes(word: str, depth: int = 1) -> Set[str]:
+    """
+    Deletions of up to `depth` characters of a word (SymSpell-style neighborhood).
+    Two words within edit distance d share a variant when both sides go to depth d.
+    """
+    variants = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - variants
+        variants |= frontier
+    variants.discard(word)
+    return variants
+
+def edit_distance(a: str, b: str, max_dist: int = MAX_EDIT_DISTANCE) -> int:
+    """Optimal string alignment distance (Levenshtein + transpositions), capped at max_dist + 1."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_dist:
+            return max_dist + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+class DrugNameIndex:
+    """
+    Local index of brand and generic names already in the library.
+    - Prefix search: a sorted array of keys (full names plus each word-tail, so
+      "codeine" finds "acetaminophen and codeine") searched with bisect.
+    - Fuzzy search: a deletion neighborhood over the word vocabulary, verified
+      with a bounded edit distance.
+    Lives in memory and persists to a JSON file; after a one-off build from the
+    vector store's metadata it never touches the network or the vector store.
+    Every process that ingests saves its names to the file, and names are only
+    ever added, so when the file changes (checked at most every
+    INDEX_REFRESH_SECONDS) its names are merged in; saving merges the file too,
+    so workers don't drop each other's names.
+    """
+
+    def __init__(self, path: Optional[str] = DRUG_INDEX_PATH, name_source: Optional[Callable[[], Iterable[dict]]] = None):
+        self.path = path
+        self.name_source = name_source # extra metadata for a rebuild (labels whose chunks are shared)
+        self._lock = threading.RLock()
+        self._names: Dict[str, dict] = {} # normalized name -> {"name", "kind", "generic_name"}
+        self._keys: List[Tuple[str, str]] = [] # (search key, normalized name), sorted lazily
+        self._sorted = True
+        self._word_names: Dict[str, Set[str]] = defaultdict(set) # word -> normalized names
+        self._word_deletes: Dict[str, Set[str]] = defaultdict(set) # deletion variant -> words
+        self._dirty = False
+        self._built = False
+        self._version = None
+        self._checked = 0.0
+
+    def __len__(self):
+        return len(self._names)
+
+    # --- Building ---
+
+    def add(self, name: Optional[str], kind: str, generic_name: Optional[str] = None) -> bool:
+        if not name:
+            return False
+        key = _normalize(name)
+        if not key:
+            return False
+        with self._lock:
+            if key in self._names:
+                return False
+            self._names[key] = {"name": name, "kind": kind, "generic_name": generic_name}
+            words = key.split()
+            for i in range(len(words)):
+                self._keys.append((" ".join(words[i:]), key))
+            for word in set(words):
+                if word not in self._word_names:
+                    self._word_deletes[word].add(word)
+                    for variant in _deletes(word, _max_distance(word)):
+                        self._word_deletes[variant].add(word)
+                self._word_names[word].add(key)
+            self._sorted = False
+            self._dirty = True
+            return True
+
+    def add_metadata(self, metadatas) -> int:
+        """Adds the names found in vector store metadata (as written by RAGService)."""
+        added = 0
+        for meta in metadatas:
+            if not meta:
+                continue
+            generic = meta.get("generic_name")
+            drug = meta.get("drug_name")
+            if drug and (not generic or _normalize(drug) != _normalize(generic)):
+                added += self.add(drug, "brand", generic)
+            added += self.add(generic, "generic", generic)
+        return added
+
+    def _file_version(self) -> Optional[Tuple[int, int]]:
+        """Changes whenever a process saves the index file."""
+        if not self.path:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _current(self) -> bool:
+        return self._built and (not self.path or time.monotonic() - self._checked < INDEX_REFRESH_SECONDS)
+
+    def ensure_built(self, vectorstore, page_size: int = 5000):
+        """
+        Loads the index from disk, or builds it from the collection's metadata once.
+        Afterwards merges in the names other processes saved when the file changes.
+        """
+        if self._current():
+            return
+        with self._lock:
+            if self._current():
+                return
+            version = self._file_version()
+            self._checked = time.monotonic()
+            if self._built:
+                if version != self._version:
+                    logger.info("Drug index file changed in another process; merging new drug names")
+                    self._merge(self._read())
+                    self._version = version
+                return
+            self._built = True
+            self._version = version
+            rows = self._read()
+            if rows:
+                self._merge(rows)
+                self._dirty = False
+                return
+            offset = 0
+            while True:
+                page = vectorstore.get(include=["metadatas"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                self.add_metadata(page["metadatas"])
+                offset += len(page["ids"])
+            if self.name_source is not None:
+                self.add_metadata(self.name_source())
+            self.save()
+
+    def _ensure_sorted(self):
+        if not self._sorted:
+            self._keys.sort()
+            self._sorted = True
+
+    # --- Persistence ---
+
+    def _read(self) -> List[dict]:
+        """The rows in the index file; [] if there is none (or it is being replaced)."""
+        if not self.path:
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _merge(self, rows: List[dict]) -> int:
+        return sum(self.add(row["name"], row["kind"], row.get("generic_name")) for row in rows)
+
+    def save(self):
+        if not self.path:
+            return
+        # Names other processes saved since this one loaded the file
+        stored = self._read()
+        with self._lock:
+            self._merge(stored)
+            rows = list(self._names.values())
+            self._dirty = False
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp, self.path)
+        with self._lock:
+            # Everything in the file has just been merged
+            self._version = self._file_version()
+
+    def save_if_dirty(self):
+        if self._dirty:
+            self.save()
+
+    # --- Search ---
+
+    def prefix(self, query: str, limit: int = 10) -> List[dict]:
+        q = _normalize(query)
+        if not q:
+            return []
+        with self._lock:
+            self._ensure_sorted()
+            matches = set()
+            i = bisect.bisect_left(self._keys, (q, ""))
+            while i < len(self._keys):
+                search_key, name_key = self._keys[i]
+                if not search_key.startswith(q):
+                    break
+                matches.add(name_key)
+                i += 1
+            # Names that start with the query beat mid-name word matches, then shorter names first
+            ranked = heapq.nsmallest(limit, matches, key=lambda k: (not k.startswith(q), len(k), k))
+            return [self._names[k] for k in ranked]
+
+    def _similar_words(self, word: str) -> Dict[str, int]:
+        max_dist = _max_distance(word)
+        candidates = set(self._word_deletes.get(word, ()))
+        for variant in _deletes(word, max_dist):
+            candidates |= self._word_deletes.get(variant, set())
+        out = {}
+        for cand in candidates:
+            dist = edit_distance(word, cand, max_dist)
+            if dist <= max_dist:
+                out[cand] = dist
+        return out
+
+    def fuzzy(self, query: str, limit: int = 10) -> List[dict]:
+        """Typo-tolerant search: every query word must match a name word within a small edit distance
+        (the last word may also be an unfinished prefix)."""
+        words = _words(query)
+        if not words:
+            return []
+        with self._lock:
+            scores: Optional[Dict[str, int]] = None
+            for idx, word in enumerate(words):
+                matches: Dict[str, int] = {}
+                for cand, dist in self._similar_words(word).items():
+                    for name_key in self._word_names[cand]:
+                        matches[name_key] = min(matches.get(name_key, dist), dist)
+                if idx == len(words) - 1:
+                    # Still typing: accept exact prefixes of the last word too
+                    for r in self.prefix(word, limit * 5):
+                        matches.setdefault(_normalize(r["name"]), 0)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {k: scores[k] + d for k, d in matches.items() if k in scores}
+            ranked = sorted(scores.items(), key=lambda kv: (kv[1], len(kv[0])))[:limit]
+            return [{**self._names[k], "distance": d} for k, d in ranked]
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = False) -> List[dict]:
+        results = self.prefix(query, limit)
+        if fuzzy and len(results) < limit:
+            seen = {_normalize(r["name"]) for r in results}
+            for r in self.fuzzy(query, limit):
+                if _normalize(r["name"]) not in seen:
+                    results.append(r)
+                if len(results) >= limit:
+                    break
+        return results
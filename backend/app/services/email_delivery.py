@@ -0,0 +1,387 @@
+import os
+import uuid
+import socket
+import logging
+import time
+import random
+import smtplib
+import sqlite3
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Dict, List, Optional
+
+from backend.app.services.email_service import SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD
+
+logger = logging.getLogger(__name__)
+
+# Configuration (set EMAIL_OUTBOX_PATH="" to keep the queue in memory only)
+EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", "./email_outbox.sqlite3")
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2")) # = pooled SMTP connections
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50")) # messages claimed per worker pass
+EMAIL_MAX_PER_CONNECTION = int(os.getenv("EMAIL_MAX_PER_CONNECTION", "500")) # then reconnect
+EMAIL_IDLE_TIMEOUT = float(os.getenv("EMAIL_IDLE_TIMEOUT", "60")) # seconds before an idle connection is closed
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_BACKOFF = float(os.getenv("EMAIL_BACKOFF", "30")) # seconds, doubled per attempt
+EMAIL_MAX_BACKOFF = float(os.getenv("EMAIL_MAX_BACKOFF", "3600"))
+EMAIL_LEASE = float(os.getenv("EMAIL_LEASE", "600")) # seconds a claimed batch is held before others may reclaim it
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+PENDING, SENDING, SENT, DEAD = "pending", "sending", "sent", "dead"
+
+class EmailOutbox:
+    """
+    Durable SQLite queue of outgoing emails, shared by every process that opens
+    the same file. Messages are claimed in batches under a lease (owner + expiry,
+    taken in one write transaction so two processes never claim the same row),
+    then marked sent, rescheduled with backoff, or dead-lettered. Messages whose
+    lease expired (their process crashed mid-batch) are claimed again.
+    """
+
+    def __init__(self, path: str = EMAIL_OUTBOX_PATH, lease: float = EMAIL_LEASE):
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                to_addr TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                claimed_by TEXT,
+                lease_until REAL
+            )"""
+        )
+        # Outboxes created before leases existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        for column, kind in (("claimed_by", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE outbox ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_outbox_due ON outbox (status, next_attempt_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_outbox_lease ON outbox (status, lease_until)")
+        self._conn.commit()
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO outbox (to_addr, subject, body, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (to_email, subject, body, PENDING, now, now)
+            )
+            self._conn.commit()
+            return cur.lastrowid
+
+    def enqueue_many(self, messages: List[Dict[str, str]]) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO outbox (to_addr, subject, body, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(m["to"], m["subject"], m["body"], PENDING, now, now) for m in messages]
+            )
+            self._conn.commit()
+        return len(messages)
+
+    def claim(self, limit: int) -> List[dict]:
+        """
+        Leases up to `limit` due messages (oldest first) to this outbox: pending
+        ones whose retry time has come, and sending ones whose lease expired.
+        """
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock before reading, so concurrent
+            # claims from other processes queue up instead of picking the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "UPDATE outbox SET status = ?, claimed_by = ?, lease_until = ? WHERE id IN ("
+                    "SELECT id FROM outbox WHERE (status = ? AND next_attempt_at <= ?) "
+                    "OR (status = ? AND COALESCE(lease_until, 0) < ?) " # no lease: claimed before leases existed
+                    "ORDER BY next_attempt_at, id LIMIT ?) "
+                    "RETURNING id, to_addr, subject, body, attempts, next_attempt_at",
+                    (SENDING, self.owner, now + self.lease, PENDING, now, SENDING, now, limit)
+                ).fetchall()
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        rows.sort(key=lambda r: (r[5], r[0]))
+        return [dict(zip(("id", "to", "subject", "body", "attempts"), r)) for r in rows]
+
+    def mark_sent(self, ids: List[int]):
+        if not ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("UPDATE outbox SET status = ?, sent_at = ?, attempts = attempts + 1, "
+                                   "lease_until = NULL WHERE id = ? AND claimed_by = ?",
+                                   [(SENT, now, i, self.owner) for i in ids])
+            self._conn.commit()
+
+    def mark_failed(self, message: dict, error: str, retry_at: Optional[float]):
+        """Reschedules the message, or dead-letters it when retry_at is None."""
+        with self._lock:
+            if retry_at is None:
+                self._conn.execute("UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, "
+                                   "lease_until = NULL WHERE id = ? AND claimed_by = ?",
+                                   (DEAD, error, message["id"], self.owner))
+            else:
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, next_attempt_at = ?, "
+                    "lease_until = NULL WHERE id = ? AND claimed_by = ?",
+                    (PENDING, error, retry_at, message["id"], self.owner)
+                )
+            self._conn.commit()
+
+    def release(self, messages: List[dict], not_before: Optional[float] = None):
+        """Puts claimed messages back without counting an attempt (e.g. the connection
+        dropped before they were tried), optionally not to be retried before `not_before`."""
+        if not messages:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, next_attempt_at = MAX(next_attempt_at, ?), lease_until = NULL "
+                "WHERE id = ? AND claimed_by = ?",
+                [(PENDING, not_before or 0, m["id"], self.owner) for m in messages]
+            )
+            self._conn.commit()
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(CASE WHEN status = ? THEN next_attempt_at ELSE COALESCE(lease_until, 0) END) FROM outbox "
+                "WHERE status IN (?, ?)", (PENDING, PENDING, SENDING)
+            ).fetchone()
+        return row[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {PENDING: 0, SENDING: 0, SENT: 0, DEAD: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def dead_letters(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, to_addr, subject, attempts, last_error FROM outbox WHERE status = ? ORDER BY id DESC LIMIT ?",
+                (DEAD, limit)
+            ).fetchall()
+        return [dict(zip(("id", "to", "subject", "attempts", "last_error"), r)) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class SMTPConnection:
+    """One long-lived SMTP session (STARTTLS + login once, then many messages)."""
+
+    def __init__(self, host: str, port: int, user: Optional[str], password: Optional[str],
+                 starttls: bool, timeout: float):
+        self.host, self.port = host, port
+        self.user, self.password = user, password
+        self.starttls, self.timeout = starttls, timeout
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.sent_on_connection = 0
+        self.last_used = 0.0
+        self.connects = 0
+
+    def ensure_open(self):
+        if self.smtp is not None and (self.sent_on_connection >= EMAIL_MAX_PER_CONNECTION
+                                      or time.time() - self.last_used > EMAIL_IDLE_TIMEOUT):
+            self.close()
+        if self.smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.password:
+                smtp.login(self.user, self.password)
+            self.smtp = smtp
+            self.sent_on_connection = 0
+            self.connects += 1
+        self.last_used = time.time()
+
+    def send(self, from_addr: str, message: dict):
+        msg = MIMEMultipart()
+        msg['From'] = from_addr
+        msg['To'] = message["to"]
+        msg['Subject'] = message["subject"]
+        msg.attach(MIMEText(message["body"], 'plain'))
+        self.smtp.sendmail(from_addr, message["to"], msg.as_string())
+        self.sent_on_connection += 1
+        self.last_used = time.time()
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies and refused recipients won't succeed on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _msg in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+def _is_connection_error(error: Exception) -> bool:
+    # SMTPException subclasses OSError, so socket errors are the non-SMTP OSErrors
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+class EmailDeliveryWorker:
+    """
+    Drains an EmailOutbox over a small pool of long-lived SMTP connections
+    (one per worker thread), sending whole batches per session. Temporary
+    failures are retried with exponential backoff; permanent failures and
+    messages past max_attempts are dead-lettered. Without SMTP credentials
+    (mock mode) messages are logged to the console instead of sent.
+    """
+
+    def __init__(self, outbox: EmailOutbox, host: str = SMTP_SERVER, port: int = SMTP_PORT,
+                 user: Optional[str] = SMTP_USER, password: Optional[str] = SMTP_PASSWORD,
+                 starttls: bool = SMTP_STARTTLS, workers: int = EMAIL_WORKERS, batch_size: int = EMAIL_BATCH_SIZE,
+                 max_attempts: int = EMAIL_MAX_ATTEMPTS, backoff: float = EMAIL_BACKOFF,
+                 mock: Optional[bool] = None, timeout: float = SMTP_TIMEOUT):
+        self.outbox = outbox
+        self.from_addr = user or "medcare@localhost"
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.mock = (not password) if mock is None else mock
+        self._connections = [SMTPConnection(host, port, user, password, starttls, timeout) for _ in range(self.workers)]
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.send_seconds = 0.0
+
+    # --- Producer side ---
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> Optional[int]:
+        if not to_email or "@" not in to_email:
+            logger.warning("Skipping email with invalid recipient", extra={"to": to_email})
+            return None
+        message_id = self.outbox.enqueue(to_email, subject, body)
+        self._wake.set()
+        return message_id
+
+    def enqueue_many(self, messages: List[Dict[str, str]]) -> int:
+        queued = self.outbox.enqueue_many([m for m in messages if m.get("to") and "@" in m["to"]])
+        self._wake.set()
+        return queued
+
+    # --- Worker threads ---
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopped.clear()
+        for i, connection in enumerate(self._connections):
+            thread = threading.Thread(target=self._run, args=(connection,), name=f"email-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        self._stopped.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        for connection in self._connections:
+            connection.close()
+
+    def _run(self, connection: SMTPConnection):
+        while not self._stopped.is_set():
+            batch = self.outbox.claim(self.batch_size)
+            if batch:
+                self._send_batch(connection, batch)
+                continue
+            if connection.smtp is not None and time.time() - connection.last_used > EMAIL_IDLE_TIMEOUT:
+                connection.close()
+            # Sleep until the next retry is due or something new is queued
+            next_due = self.outbox.next_due()
+            delay = EMAIL_IDLE_TIMEOUT if next_due is None else min(EMAIL_IDLE_TIMEOUT, max(0.0, next_due - time.time()))
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _retry_at(self, attempts: int) -> Optional[float]:
+        if attempts + 1 >= self.max_attempts:
+            return None
+        delay = min(EMAIL_MAX_BACKOFF, self.backoff * (2 ** attempts)) * (0.5 + random.random() / 2)
+        return time.time() + delay
+
+    def _fail(self, message: dict, error: Exception, permanent: bool = False):
+        retry_at = None if permanent else self._retry_at(message["attempts"])
+        self.outbox.mark_failed(message, f"{type(error).__name__}: {error}", retry_at)
+        with self._metrics_lock:
+            if retry_at is None:
+                self.dead_lettered += 1
+            else:
+                self.retried += 1
+
+    def _send_batch(self, connection: SMTPConnection, batch: List[dict]):
+        if self.mock:
+            for message in batch:
+                # Recipient and subject only: bodies carry prescription details
+                logger.info("Bypassing Email Send (Mock Mode)", extra={"to": message["to"], "subject": message["subject"]})
+            self.outbox.mark_sent([m["id"] for m in batch])
+            with self._metrics_lock:
+                self.sent += len(batch)
+            return
+
+        sent_ids = []
+        start = time.perf_counter()
+        for i, message in enumerate(batch):
+            try:
+                connection.ensure_open()
+                connection.send(self.from_addr, message)
+                sent_ids.append(message["id"])
+            except Exception as e:
+                if _is_connection_error(e) or isinstance(e, smtplib.SMTPAuthenticationError):
+                    # The session is gone: retry this one later, hand the untried rest back
+                    connection.close()
+                    self._fail(message, e)
+                    self.outbox.release(batch[i + 1:], not_before=self._retry_at(0))
+                    logger.warning("SMTP connection failed: %s", e)
+                    break
+                self._fail(message, e, permanent=_is_permanent(e))
+        self.outbox.mark_sent(sent_ids)
+        with self._metrics_lock:
+            self.sent += len(sent_ids)
+            self.send_seconds += time.perf_counter() - start
+
+    # --- Metrics ---
+
+    def metrics(self) -> dict:
+        counts = self.outbox.counts()
+        with self._metrics_lock:
+            return {
+                "queued": counts[PENDING] + counts[SENDING],
+                "sent_total": counts[SENT],
+                "dead_letters": counts[DEAD],
+                "sent": self.sent,
+                "retried": self.retried,
+                "dead_lettered": self.dead_lettered,
+                "connections_opened": sum(c.connects for c in self._connections),
+                "avg_send_ms": round(1000 * self.send_seconds / self.sent, 2) if self.sent else None,
+                "mock": self.mock,
+            }
@@ -1,4 +1,5 @@
 import smtplib
+import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
@@ -9,13 +10,15 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "apikey") # or your email
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "") # app password
 
+logger = logging.getLogger(__name__)
+
 def send_email(to_email: str, subject: str, body: str):
     """
     Sends an email. If credentials aren't set, it just logs to console.
     """
     if not SMTP_PASSWORD or not to_email or "@" not in to_email:
-        print(f"Bypassing Email Send (Mock Mode).")
-        print(f"To: {to_email}\nSubject: {subject}\nBody:\n{body}\n")
+        # Recipient and subject only: bodies carry prescription details
+        logger.info("Bypassing Email Send (Mock Mode)", extra={"to": to_email, "subject": subject})
         return True
 
     try:
@@ -32,10 +35,10 @@ def send_email(to_email: str, subject: str, body: str):
         text = msg.as_string()
         server.sendmail(SMTP_USER, to_email, text)
         server.quit()
-        print(f"Email sent to {to_email}")
+        logger.info("Email sent", extra={"to": to_email})
         return True
     except Exception as e:
-        print(f"Failed to send email: {e}")
+        logger.warning("Failed to send email: %s", e, extra={"to": to_email})
         return False
 
 def format_prescription_email(patient_name, drug_name, dosage, frequency, times, duration="Unlimited", reason="Not specified"):
@@ -56,3 +59,19 @@ Please log in to your MedCare portal to view your full schedule and track your a
 Stay Healthy,
 MedCare Team
 """
+
+def format_dose_reminder_email(patient_name, drug_name, dosage, time):
+    return f"""
+Hello {patient_name},
+
+It's time for your medication:
+
+Drug: {drug_name}
+Dosage: {dosage}
+Scheduled: {time}
+
+Please mark it as taken in your MedCare portal.
+
+Stay Healthy,
+MedCare Team
+"""
@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Configuration (set EMBEDDING_CACHE_PATH="" to disable the cache)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Disk-backed vector cache keyed by (model, text hash).
+    Vectors are stored as float32 blobs; the least recently used entries are evicted
+    once the table grows past max_entries.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        if not hashes:
+            return found
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part]
+                ).fetchall()
+                for h, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[h] = vec.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            cur = self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, array("f", vec).tobytes(), now) for h, vec in items.items()]
+            )
+            self._size += max(cur.rowcount, 0)
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Trim to 90% so we don't evict on every single insert
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._size - int(self.max_entries * 0.9)
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE (model, text_hash) IN "
+                "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self._size -= excess
+
+    def __len__(self):
+        return self._size
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so every vector is computed at most once.
+    Misses are de-duplicated and sent to the underlying model in batches;
+    hits never touch the model at all.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache: Optional[EmbeddingCache] = None,
+                 batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, namespace: str, texts: List[str], embed_fn) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(namespace, list(set(hashes))) if self.cache is not None else {}
+
+        # Unique misses only, in first-seen order
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+
+        computed = {}
+        miss_hashes = list(missing)
+        for i in range(0, len(miss_hashes), self.batch_size):
+            batch = miss_hashes[i:i + self.batch_size]
+            vectors = embed_fn([missing[h] for h in batch])
+            computed.update(zip(batch, vectors))
+
+        if self.cache is not None:
+            self.cache.put_many(namespace, computed)
+
+        found.update(computed)
+        return [found[h] for h in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(self.model_name, texts, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Some models (e.g. OllamaEmbeddings) prefix queries differently from documents,
+        # so queries live in their own namespace.
+        embed_fn = lambda texts: [self.underlying.embed_query(t) for t in texts]
+        return self._embed(f"{self.model_name}:query", [text], embed_fn)[0]
+
+def cached_embeddings(underlying: Embeddings, model_name: str) -> Embeddings:
+    """
+    Returns the model wrapped in the shared disk cache, or unchanged if caching is disabled.
+    """
+    if not EMBEDDING_CACHE_PATH:
+        return underlying
+    return CachedEmbeddings(underlying, model_name, cache=EmbeddingCache(EMBEDDING_CACHE_PATH))
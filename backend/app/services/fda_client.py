@@ -1,55 +1,305 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, Any, List, Tuple
 from backend.app.models.schemas import DrugInfo, DrugSearchResult
+from backend.app.core.metrics import counter, span
+from backend.app.services.label_store import LABEL_STORE_PATH, LabelStore
+
+logger = logging.getLogger(__name__)
+
+FDA_REQUESTS = counter("fda_requests_total",
+                       "openFDA lookups by result (local, cache = served without a request)", ["result"])
+
+BASE_URL = os.getenv("FDA_API_URL", "https://api.fda.gov/drug/label.json")
+
+# Configuration
+FDA_TIMEOUT = float(os.getenv("FDA_TIMEOUT", "10")) # seconds
+FDA_MAX_RETRIES = int(os.getenv("FDA_MAX_RETRIES", "3"))
+FDA_BACKOFF = float(os.getenv("FDA_BACKOFF", "0.5")) # seconds, doubled per retry
+FDA_POOL_SIZE = int(os.getenv("FDA_POOL_SIZE", "16"))
+FDA_MAX_CONCURRENCY = int(os.getenv("FDA_MAX_CONCURRENCY", "8"))
+FDA_CACHE_PATH = os.getenv("FDA_CACHE_PATH", "./fda_cache.sqlite3") # "" disables the cache
+FDA_CACHE_TTL = float(os.getenv("FDA_CACHE_TTL", str(24 * 3600)))
+FDA_NEGATIVE_CACHE_TTL = float(os.getenv("FDA_NEGATIVE_CACHE_TTL", "3600")) # "no such drug" answers
+FDA_OFFLINE = os.getenv("FDA_OFFLINE", "0") == "1" # never call the API; the local label store only
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Not JSON (ValueError), or JSON of another shape
+UNREADABLE = (ValueError, TypeError, AttributeError, IndexError, KeyError)
+
+def label_to_drug_info(item: Dict[str, Any]) -> DrugInfo:
+    """
+    Converts a raw openFDA label record (API or bulk download) into a DrugInfo.
+    """
+    # Helper to safely get list or string and join if list
+    def get_text(key):
+        val = item.get(key)
+        if isinstance(val, list):
+            return "\n".join(val)
+        return val
+
+    openfda = item.get("openfda", {})
 
-BASE_URL = "https://api.fda.gov/drug/label.json"
+    return DrugInfo(
+        brand_name=openfda.get("brand_name", [None])[0],
+        generic_name=openfda.get("generic_name", [None])[0],
+        purpose=get_text("indications_and_usage"),
+        warnings=get_text("warnings"),
+        dosage_instructions=get_text("dosage_and_administration"),
+        adverse_reactions=get_text("adverse_reactions"),
+        set_id=item.get("set_id"),
+        version=item.get("version")
+    )
+
+class ResponseCache:
+    """
+    On-disk cache of openFDA responses keyed by request URL + params.
+    Stores validators (ETag / Last-Modified) so stale entries can be revalidated
+    with a conditional request instead of a full download.
+    """
+
+    def __init__(self, path: str = FDA_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                body TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("status", "body", "etag", "last_modified", "fetched_at"), row))
+
+    def put(self, key: str, status: int, body: Optional[str], etag: Optional[str] = None,
+            last_modified: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, status, body, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, status, body, etag, last_modified, time.time())
+            )
+            self._conn.commit()
+
+    def touch(self, key: str):
+        with self._lock:
+            self._conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
 
 class FDAClient:
-    def __init__(self):
-        self.base_url = BASE_URL
+    """
+    openFDA label client with pooled keep-alive connections, timeouts,
+    retry/backoff on 429/5xx and an on-disk response cache.
+    Lookups are answered from the local label store first when one has been
+    built; the API is the fallback (or never used, with offline=True).
+    """
 
-    def search_drug(self, query: str, limit: int = 1) -> Optional[DrugSearchResult]:
-        """
-        Search for a drug by brand name or generic name.
-        """
+    def __init__(self, base_url: str = BASE_URL, cache: Optional[ResponseCache] = None,
+                 timeout: float = FDA_TIMEOUT, max_retries: int = FDA_MAX_RETRIES,
+                 backoff: float = FDA_BACKOFF, max_concurrency: int = FDA_MAX_CONCURRENCY,
+                 label_store: Optional[LabelStore] = None, offline: bool = FDA_OFFLINE):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        if cache is None and FDA_CACHE_PATH:
+            cache = ResponseCache(FDA_CACHE_PATH)
+        self.cache = cache
+        # Only open a store that exists: an empty one would answer nothing
+        if label_store is None and LABEL_STORE_PATH and os.path.exists(LABEL_STORE_PATH):
+            label_store = LabelStore(LABEL_STORE_PATH)
+        self.label_store = label_store
+        self.offline = offline
+
+        # One session = one keep-alive pool, so repeated lookups skip the TLS handshake
+        self.session = requests.Session()
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=FDA_POOL_SIZE, pool_maxsize=FDA_POOL_SIZE, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # --- Request helpers ---
+
+    @staticmethod
+    def _params(query: str, limit: int) -> Dict[str, Any]:
         # Search in both brand_name and generic_name
         search_query = f'openfda.brand_name:"{query}"+OR+openfda.generic_name:"{query}"'
-        params = {
+        return {
             "search": search_query,
             "limit": limit
         }
-        
+
+    def _cache_key(self, params: Dict[str, Any]) -> str:
+        raw = self.base_url + "?" + json.dumps(params, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Returns (cache entry, is_fresh)."""
+        if self.cache is None:
+            return None, False
+        entry = self.cache.get(key)
+        if entry is None:
+            return None, False
+        ttl = FDA_CACHE_TTL if entry["status"] == 200 else FDA_NEGATIVE_CACHE_TTL
+        return entry, time.time() - entry["fetched_at"] < ttl
+
+    @staticmethod
+    def _conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry["status"] == 200:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _store(self, key: str, status: int, body: Optional[str], headers) -> None:
+        if self.cache is not None:
+            self.cache.put(key, status, body, headers.get("ETag"), headers.get("Last-Modified"))
+
+    @staticmethod
+    def _decode(body: str) -> Optional[DrugSearchResult]:
+        """Raises ValueError (or TypeError etc.) for a body that isn't an openFDA label response."""
+        data = json.loads(body)
+        if "results" not in data:
+            return None
+        drug_infos = [label_to_drug_info(item) for item in data["results"]]
+        return DrugSearchResult(results=drug_infos)
+
+    @classmethod
+    def _parse(cls, body: Optional[str]) -> Optional[DrugSearchResult]:
+        """A cached body's results; None for a 404 entry or a body that can't be read."""
+        if body is None:
+            return None
         try:
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if "results" not in data:
-                return None
-                
-            drug_infos = []
-            for item in data["results"]:
-                # Helper to safely get list or string and join if list
-                def get_text(key):
-                    val = item.get(key)
-                    if isinstance(val, list):
-                        return "\n".join(val)
-                    return val
-
-                openfda = item.get("openfda", {})
-                
-                info = DrugInfo(
-                    brand_name=openfda.get("brand_name", [None])[0],
-                    generic_name=openfda.get("generic_name", [None])[0],
-                    purpose=get_text("indications_and_usage"),
-                    warnings=get_text("warnings"),
-                    dosage_instructions=get_text("dosage_and_administration"),
-                    adverse_reactions=get_text("adverse_reactions")
-                )
-                drug_infos.append(info)
-                
+            return cls._decode(body)
+        except UNREADABLE as e:
+            logger.warning("Unreadable cached openFDA response: %s", e)
+            return None
+
+    def _from_cache(self, key: str) -> Tuple[Optional[Dict[str, Any]], bool, Optional[DrugSearchResult]]:
+        """
+        (entry, hit, result): hit when a fresh entry answers the lookup. A fresh 200
+        entry that can't be read is dropped, so it is fetched again.
+        """
+        entry, fresh = self._cached(key)
+        if not fresh:
+            return entry, False, None
+        result = self._parse(entry["body"])
+        if result is None and entry["status"] == 200:
+            return None, False, None
+        FDA_REQUESTS.inc(result="cache")
+        return entry, True, result
+
+    def _accept(self, key: str, body: str, headers, entry: Optional[Dict[str, Any]]) -> Optional[DrugSearchResult]:
+        """
+        Parses and caches a 200 response. A body that isn't a label response (an
+        HTML error page behind a proxy, a truncated download) is not cached; the
+        stale entry, if any, is served instead.
+        """
+        try:
+            result = self._decode(body)
+        except UNREADABLE as e:
+            FDA_REQUESTS.inc(result="error")
+            logger.warning("Unreadable openFDA response: %s", e)
+            return self._parse(entry["body"]) if entry else None
+        FDA_REQUESTS.inc(result="ok")
+        self._store(key, 200, body, headers)
+        return result
+
+    def _search_local(self, query: str, limit: int) -> Optional[DrugSearchResult]:
+        if self.label_store is None:
+            return None
+        with span("fda", "local"):
+            drug_infos = self.label_store.find(query, limit)
+        if drug_infos:
+            FDA_REQUESTS.inc(result="local")
             return DrugSearchResult(results=drug_infos)
-            
+        if self.offline:
+            FDA_REQUESTS.inc(result="not_found")
+        return None
+
+    # --- Sync API ---
+
+    def search_drug(self, query: str, limit: int = 1) -> Optional[DrugSearchResult]:
+        """
+        Search for a drug by brand name or generic name.
+        """
+        local = self._search_local(query, limit)
+        if local is not None or self.offline:
+            return local
+
+        params = self._params(query, limit)
+        key = self._cache_key(params)
+        entry, hit, result = self._from_cache(key)
+        if hit:
+            return result
+
+        try:
+            # Retries with backoff on 429/5xx are handled by the session's adapter
+            with span("fda", "request"):
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout,
+                                            headers=self._conditional_headers(entry))
+            if response.status_code == 304 and entry:
+                FDA_REQUESTS.inc(result="not_modified")
+                self.cache.touch(key)
+                return self._parse(entry["body"])
+            if response.status_code == 404:
+                # openFDA answers "no matches" with a 404
+                FDA_REQUESTS.inc(result="not_found")
+                self._store(key, 404, None, response.headers)
+                return None
+            response.raise_for_status()
+            return self._accept(key, response.text, response.headers, entry)
+
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching data from FDA API: {e}")
-            return None
+            FDA_REQUESTS.inc(result="error")
+            logger.warning("Error fetching data from FDA API: %s", e, extra={"query": query})
+            # Serve stale data rather than nothing if the API is unreachable
+            return self._parse(entry["body"]) if entry else None
+
+    def search_drugs(self, queries: List[str], limit: int = 1,
+                     max_concurrency: Optional[int] = None) -> Dict[str, Optional[DrugSearchResult]]:
+        """
+        Resolves many drug names at once, at most max_concurrency requests in flight.
+        """
+        unique = list(dict.fromkeys(queries))
+        workers = max(1, min(max_concurrency or self.max_concurrency, len(unique) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda q: self.search_drug(q, limit), unique)
+            return dict(zip(unique, results))
+
+    def close(self):
+        self.session.close()
+        if self.label_store is not None:
+            self.label_store.close()
@@ -0,0 +1,76 @@
+import re
+from typing import List
+
+CHUNK_SIZE = 1000 # characters
+MIN_CHUNK_SIZE = 250 # subsections shorter than this are merged with the next one
+
+# "2.1 Recommended Dosage", "5.3.1 Hepatotoxicity" (inline in openFDA text, so not anchored to a line start)
+SUBSECTION_START = re.compile(r"(?<![\w.])(?=\d{1,2}\.\d{1,2}(?:\.\d{1,2})?\s+[A-Z])")
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+BULLET_START = re.compile(r"(?=[•●▪■◦])|^(?=\s*[-*]\s+)", re.MULTILINE)
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+(?=[A-Z(\"'•])")
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_chunk(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip()
+
+class LabelSplitter:
+    """
+    Splits label section text along its own structure: numbered subsections
+    first, then paragraphs and bullet items, then sentences for anything still
+    longer than chunk_size. Pieces are packed up to chunk_size without overlap,
+    and a chunk never spans two subsections unless the first is shorter than
+    min_chunk_size. The same subsection text therefore yields the same chunk
+    in every label that carries it, which is what cross-label deduplication keys on.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, min_chunk_size: int = MIN_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+
+    def _units(self, block: str) -> List[str]:
+        """Bullet items / sentences / word runs of block, each at most chunk_size."""
+        units = []
+        for item in BULLET_START.split(block):
+            item = normalize_chunk(item)
+            if not item:
+                continue
+            if len(item) <= self.chunk_size:
+                units.append(item)
+                continue
+            for sentence in SENTENCE_END.split(item):
+                if len(sentence) <= self.chunk_size:
+                    units.append(sentence)
+                    continue
+                # A run-on "sentence" (tables flattened to text): cut between words
+                words, current = sentence.split(" "), ""
+                for word in words:
+                    if current and len(current) + 1 + len(word) > self.chunk_size:
+                        units.append(current)
+                        current = word
+                    else:
+                        current = f"{current} {word}" if current else word
+                if current:
+                    units.append(current)
+        return units
+
+    def split_text(self, text: str) -> List[str]:
+        blocks = []
+        for paragraph in PARAGRAPH_BREAK.split(text or ""):
+            blocks.extend(b for b in SUBSECTION_START.split(paragraph) if b.strip())
+
+        chunks, current = [], ""
+        for block in blocks:
+            # A new subsection starts a new chunk once the current one is big enough to stand alone
+            if len(current) >= self.min_chunk_size:
+                chunks.append(current)
+                current = ""
+            for unit in self._units(block):
+                if current and len(current) + 1 + len(unit) > self.chunk_size:
+                    chunks.append(current)
+                    current = unit
+                else:
+                    current = f"{current} {unit}" if current else unit
+        if current:
+            chunks.append(current)
+        return chunks
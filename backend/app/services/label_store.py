@@ -0,0 +1,193 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.app.models.schemas import DrugInfo
+
+logger = logging.getLogger(__name__)
+
+# Configuration ("" disables the store; built by scripts/build_label_store.py or ingest_offline.py)
+LABEL_STORE_PATH = os.getenv("LABEL_STORE_PATH", "./label_store.sqlite3")
+
+# openFDA field -> column; also the DrugInfo fields they fill
+SECTION_FIELDS = {
+    "indications_and_usage": "purpose",
+    "warnings": "warnings",
+    "dosage_and_administration": "dosage_instructions",
+    "adverse_reactions": "adverse_reactions",
+}
+_COLUMNS = ("set_id", "version", "brand_name", "generic_name") + tuple(SECTION_FIELDS.values())
+
+_WORDS = re.compile(r"[a-z0-9]+")
+
+def normalize_name(name: str) -> str:
+    return " ".join(_WORDS.findall(name.lower()))
+
+def _text(value) -> Optional[str]:
+    return "\n".join(value) if isinstance(value, list) else value
+
+def _version(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+class LabelStore:
+    """
+    Local snapshot of openFDA labels from the bulk download, one row per label
+    version, so name lookups don't need the API.
+    - labels: the structured fields of every version; `latest` marks the
+      newest version of each set_id.
+    - names: normalized brand and generic names of the latest versions, for
+      exact lookups.
+    - labels_fts: FTS5 over names and section text (external content on
+      labels), for phrase lookups like openFDA's and full-text search.
+    Label versions are immutable, so a version already stored is skipped.
+    """
+
+    def __init__(self, path: str = LABEL_STORE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS labels (
+                id INTEGER PRIMARY KEY,
+                set_id TEXT NOT NULL,
+                version TEXT,
+                version_num INTEGER NOT NULL,
+                effective_time TEXT,
+                brand_name TEXT,
+                generic_name TEXT,
+                purpose TEXT,
+                warnings TEXT,
+                dosage_instructions TEXT,
+                adverse_reactions TEXT,
+                latest INTEGER NOT NULL DEFAULT 1,
+                UNIQUE (set_id, version_num)
+            );
+            CREATE INDEX IF NOT EXISTS labels_latest ON labels (set_id, latest);
+            CREATE TABLE IF NOT EXISTS names (
+                name TEXT NOT NULL,
+                set_id TEXT NOT NULL,
+                PRIMARY KEY (name, set_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS names_set_id ON names (set_id);"""
+        )
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS labels_fts USING fts5("
+                "brand_name, generic_name, purpose, warnings, dosage_instructions, adverse_reactions, "
+                "content='labels', content_rowid='id')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite has no FTS5 (%s); label store limited to exact name lookups", e)
+            self.fts = False
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM labels WHERE latest = 1").fetchone()[0]
+
+    def versions(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+    # --- Writes ---
+
+    def add(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        Stores raw openFDA label records (API or bulk download) not yet present.
+        Uncommitted until commit(), so a batch of labels lands in one transaction.
+        Returns the number of new label versions.
+        """
+        added = 0
+        with self._lock:
+            for item in items:
+                set_id = item.get("set_id") or item.get("id")
+                if not set_id:
+                    continue
+                openfda = item.get("openfda", {})
+                brands = openfda.get("brand_name") or []
+                generics = openfda.get("generic_name") or []
+                version_num = _version(item.get("version"))
+                row = (set_id, item.get("version"), version_num, item.get("effective_time"),
+                       brands[0] if brands else None, generics[0] if generics else None,
+                       *(_text(item.get(field)) for field in SECTION_FIELDS))
+
+                newest = self._conn.execute("SELECT MAX(version_num) FROM labels WHERE set_id = ?", (set_id,)).fetchone()[0]
+                latest = newest is None or version_num > newest
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO labels (set_id, version, version_num, effective_time, brand_name, "
+                    "generic_name, purpose, warnings, dosage_instructions, adverse_reactions, latest) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row + (int(latest),)
+                )
+                if not cursor.rowcount:
+                    continue
+                added += 1
+                if self.fts:
+                    self._conn.execute(
+                        "INSERT INTO labels_fts (rowid, brand_name, generic_name, purpose, warnings, "
+                        "dosage_instructions, adverse_reactions) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (cursor.lastrowid,) + row[4:]
+                    )
+                if latest:
+                    self._conn.execute("UPDATE labels SET latest = 0 WHERE set_id = ? AND id != ?",
+                                       (set_id, cursor.lastrowid))
+                    self._conn.execute("DELETE FROM names WHERE set_id = ?", (set_id,))
+                    names = {normalize_name(name) for name in brands + generics} - {""}
+                    self._conn.executemany("INSERT OR IGNORE INTO names (name, set_id) VALUES (?, ?)",
+                                           [(name, set_id) for name in names])
+        return added
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    # --- Reads ---
+
+    def _rows(self, sql: str, params) -> List[DrugInfo]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [DrugInfo(**dict(zip(_COLUMNS, row))) for row in rows]
+
+    def find(self, name: str, limit: int = 1) -> List[DrugInfo]:
+        """
+        Latest label versions whose brand or generic name is `name` (case and
+        punctuation ignored); failing that, whose name contains it as a phrase,
+        like the API's openfda.brand_name:"..." search.
+        """
+        key = normalize_name(name)
+        if not key:
+            return []
+        columns = ", ".join(f"l.{column}" for column in _COLUMNS)
+        found = self._rows(
+            f"SELECT {columns} FROM names n JOIN labels l ON l.set_id = n.set_id AND l.latest = 1 "
+            "WHERE n.name = ? ORDER BY l.effective_time DESC LIMIT ?", (key, limit)
+        )
+        if found or not self.fts:
+            return found
+        return self._rows(
+            f"SELECT {columns} FROM labels_fts f JOIN labels l ON l.id = f.rowid "
+            "WHERE labels_fts MATCH ? AND l.latest = 1 ORDER BY f.rank LIMIT ?",
+            ('{brand_name generic_name} : "' + key + '"', limit)
+        )
+
+    def search_text(self, query: str, limit: int = 10) -> List[DrugInfo]:
+        """Latest label versions whose names or section text contain every word of query, best match first."""
+        words = _WORDS.findall(query.lower())
+        if not words or not self.fts:
+            return []
+        columns = ", ".join(f"l.{column}" for column in _COLUMNS)
+        return self._rows(
+            f"SELECT {columns} FROM labels_fts f JOIN labels l ON l.id = f.rowid "
+            "WHERE labels_fts MATCH ? AND l.latest = 1 ORDER BY f.rank LIMIT ?",
+            (" ".join(f'"{word}"' for word in words), limit)
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
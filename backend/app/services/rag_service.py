@@ -1,98 +1,439 @@
-import os
-from langchain_chroma import Chroma
+import asyncio
+import logging
+import hashlib
+from typing import Optional
+import numpy as np
 from langchain_community.chat_models import ChatOllama
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 # For embeddings, we can use OllamaEmbeddings or a lightweight HuggingFace one.
 # Using OllamaEmbeddings requires the model to support bindings, typically 'llama3' or 'nomic-embed-text'
 from langchain_community.embeddings import OllamaEmbeddings
 
 from backend.app.services.fda_client import FDAClient
+from backend.app.services.embedding_cache import cached_embeddings
+from backend.app.services.answer_cache import AnswerCache
+from backend.app.services.retrieval import HybridRetriever, LexicalIndex
+from backend.app.services.drug_index import DrugNameIndex
+from backend.app.services.label_chunking import LabelSplitter, normalize_chunk
+from backend.app.services.chunk_store import ChunkStore, chunk_store_path, dedup_scope, minhash, quantities, similarity
+from backend.app.services.vector_store import collection_size, make_vectorstore, vector_store_path
+from backend.app.services.chain_metrics import ChainStageCallback
+from backend.app.services.context_builder import (CONTEXT_BUILDER, CONTEXT_FETCH_K, CONTEXT_TOP_K, ContextBuilder,
+                                                   load_token_counter)
 from backend.app.models.schemas import DrugInfo
+from backend.app.core.metrics import counter, span
+
+logger = logging.getLogger(__name__)
+
+RAG_QUERIES = counter("rag_queries_total", "Chat questions by answer cache outcome", ["cache"])
+INGEST_CHUNKS = counter("ingest_chunks_total", "Label chunks written (embedded) or skipped as unchanged", ["result"])
+
+RAG_TEMPLATE = """Answer the question based ONLY on the following context from the FDA drug label:
+        
+        {context}
+        
+        Question: {question}
+        
+        If the information is not in the context, say "Not found in label".
+        """
+
+def make_text_splitter() -> LabelSplitter:
+    return LabelSplitter()
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def label_key(drug_info: DrugInfo, drug_name: str) -> str:
+    """
+    Stable identity of a label. openFDA's set_id survives new label versions;
+    labels without one fall back to the drug name.
+    """
+    return drug_info.set_id or f"name:{drug_name.lower()}"
+
+def _pending_near_duplicate(pending: list, scope: str, section: str, signature, numbers: str,
+                            threshold: float) -> Optional[str]:
+    """The most similar chunk added earlier in the same batch (not in the chunk store yet), if any."""
+    best, best_score = None, threshold
+    for chunk_id, other_scope, other_section, other_signature, other_numbers in pending:
+        if (other_scope, other_section, other_numbers) != (scope, section, numbers):
+            continue
+        score = similarity(signature, other_signature)
+        if score >= best_score:
+            best, best_score = chunk_id, score
+    return best
+
+def chunk_id(scope: str, section: str, content: str) -> str:
+    """Content-addressed: identical text in the same scope and section gets the same id."""
+    return _hash(f"{scope}|{section}|{_hash(normalize_chunk(content).lower())}")[:32]
+
+def build_label_documents(drug_info: DrugInfo, drug_name: str, text_splitter) -> list:
+    """
+    Splits a label into per-section documents ready for the vector store.
+    Shared by the API ingestion path and the offline bulk ingestion script.
+
+    Each document carries a content-addressed "id" plus the hash of its whole
+    section, so re-ingesting the same label is an upsert rather than an append
+    and identical text across labels of the same drug maps to one chunk. The
+    drug name is not part of the text (format_docs adds it from metadata).
+    """
+    # We'll create separate documents for different sections to improve retrieval accuracy
+    documents = []
+
+    sections = {
+        "Indications & Usage": drug_info.purpose,
+        "Warnings": drug_info.warnings,
+        "Dosage & Administration": drug_info.dosage_instructions,
+        "Adverse Reactions": drug_info.adverse_reactions
+    }
+
+    set_id = label_key(drug_info, drug_name)
+    base_metadata = {
+        "drug_name": drug_name,
+        "generic_name": drug_info.generic_name,
+        "set_id": set_id,
+        "version": drug_info.version
+    }
+    # Chroma rejects None metadata values
+    base_metadata = {k: v for k, v in base_metadata.items() if v is not None}
+    scope = dedup_scope(base_metadata)
+
+    for section_name, content in sections.items():
+        if content:
+            metadata = {**base_metadata, "section": section_name,
+                        "section_hash": _hash(f"{section_name}|{normalize_chunk(content)}")}
+            seen = set()
+            for position, text in enumerate(text_splitter.split_text(content)):
+                # "chunk" is the position in the section, so the context builder can merge neighbours
+                doc = Document(page_content=f"Section: {section_name}\n{text}", metadata={**metadata, "chunk": position})
+                doc.id = chunk_id(scope, section_name, text)
+                # Identical chunks within a section would collide on upsert
+                if doc.id not in seen:
+                    seen.add(doc.id)
+                    documents.append(doc)
+
+    return documents
+
+def format_docs(docs):
+    """Every chunk verbatim, with no token budget (the prompt before ContextBuilder)."""
+    parts = []
+    for d in docs:
+        # Chunks are shared across labels of one drug, so the generic name identifies them best
+        drug = d.metadata.get("generic_name") or d.metadata.get("drug_name")
+        parts.append(f"Drug: {drug}\n{d.page_content}" if drug and not d.page_content.startswith("Drug:") else d.page_content)
+    return "\n\n".join(parts)
+
+def _doc_drugs(documents) -> set:
+    names = set()
+    for doc in documents:
+        names.add(doc.metadata.get("drug_name"))
+        names.add(doc.metadata.get("generic_name"))
+    names.discard(None)
+    return names
 
 class RAGService:
-    def __init__(self, persist_directory="./chroma_db", model_name="llama3"):
-        self.embedding_function = OllamaEmbeddings(model=model_name)
-        self.vectorstore = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=self.embedding_function,
-            collection_name="drug_labels"
-        )
-        self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 3})
-        self.llm = ChatOllama(model=model_name)
+    def __init__(self, persist_directory=None, model_name="llama3", embeddings=None, llm=None):
+        # embeddings/llm default to Ollama; the offline benchmarks pass deterministic fakes
+        # Every vector goes through the disk cache, so re-ingests and repeated questions are free
+        self.embedding_function = cached_embeddings(embeddings or OllamaEmbeddings(model=model_name), model_name)
+        # Chroma, or the shared memory-mapped index (VECTOR_BACKEND=mmap)
+        self.vectorstore = make_vectorstore(self.embedding_function, persist_directory)
+        # Which labels reference each stored chunk (chunks are shared across labels of a drug)
+        self.chunk_store = ChunkStore(chunk_store_path(vector_store_path(persist_directory)))
+        self.ingest_stats = {"chunks": 0, "embedded": 0, "duplicates": 0, "near_duplicates": 0}
+        # Drug/section-filtered vector search fused with BM25 over the same chunks
+        self.lexical_index = LexicalIndex(name_source=self.chunk_store.names, version_source=self._store_version)
+        # With the context builder, over-retrieve; it picks what fits the prompt's token budget
+        self.retriever = HybridRetriever(vectorstore=self.vectorstore, index=self.lexical_index,
+                                         k=CONTEXT_FETCH_K if CONTEXT_BUILDER else CONTEXT_TOP_K)
+        self.llm = llm or ChatOllama(model=model_name)
+        self.context_builder = ContextBuilder(count_tokens=load_token_counter(), vectors=self._doc_vectors)
         self.fda_client = FDAClient()
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        self.text_splitter = make_text_splitter()
+        # Cleared when another process commits chunk references (an ingest elsewhere)
+        self.answer_cache = AnswerCache(version_source=self.chunk_store.data_version)
+        # Brand/generic names already ingested, for Library search and autocomplete
+        self.drug_index = DrugNameIndex(name_source=self.chunk_store.names)
+        # Per-stage timings (retrieve, prompt, llm, ...) for every chain run
+        self.run_config = {"callbacks": [ChainStageCallback("rag")]}
+        self._build_chain()
+
+    def _build_chain(self):
+        """
+        Builds the LCEL pipeline once. The chain returns the docs the context was built
+        from alongside the answer so the cache knows which drugs an answer depends on.
+        """
+        self.prompt = ChatPromptTemplate.from_template(RAG_TEMPLATE)
+
+        # Chain
+        self.answer_chain = self.prompt | self.llm | StrOutputParser()
+        self.rag_chain = (
+            RunnableParallel(candidates=self.retriever, question=RunnablePassthrough())
+            | RunnableLambda(self._build_context, name="build_context")
+        ).assign(answer=self.answer_chain)
+
+    def _context(self, candidates: list, question: str):
+        """(prompt context, the documents it was built from)."""
+        if not CONTEXT_BUILDER:
+            return format_docs(candidates), candidates
+        return self.context_builder.build(candidates, question)
+
+    def _build_context(self, inputs: dict) -> dict:
+        context, docs = self._context(inputs["candidates"], inputs["question"])
+        return {"context": context, "docs": docs, "question": inputs["question"]}
+
+    def _store_version(self) -> tuple:
+        """Changes when another process writes chunks: the collection size and the chunk store's data_version."""
+        return collection_size(self.vectorstore), self.chunk_store.data_version()
+
+    def _doc_vectors(self, docs: list):
+        """Stored embeddings of docs (row per doc), for redundancy checks; None if any is missing."""
+        ids = [doc.id for doc in docs]
+        page = self.vectorstore.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(page["ids"], page["embeddings"]))
+        if any(i not in by_id for i in ids):
+            return None
+        return np.array([by_id[i] for i in ids], dtype=np.float32)
 
     def ingest_drug(self, drug_name: str) -> bool:
         """
         Fetches drug label from FDA, chunks it, and adds to Vector DB.
         """
-        print(f"Fetching data for {drug_name}...")
+        logger.info("Fetching label", extra={"drug": drug_name})
         result = self.fda_client.search_drug(drug_name)
         
         if not result or not result.results:
-            print("No data found.")
+            logger.info("No label found", extra={"drug": drug_name})
             return False
 
         drug_info = result.results[0]
         
         # Construct content for embedding
-        # We'll create separate documents for different sections to improve retrieval accuracy
-        documents = []
-        
-        sections = {
-            "Indications & Usage": drug_info.purpose,
-            "Warnings": drug_info.warnings,
-            "Dosage & Administration": drug_info.dosage_instructions,
-            "Adverse Reactions": drug_info.adverse_reactions
-        }
-        
-        base_metadata = {
-            "drug_name": drug_info.brand_name or drug_name,
-            "generic_name": drug_info.generic_name
-        }
-
-        for section_name, content in sections.items():
-            if content:
-                # Add context to the content itself
-                full_content = f"Drug: {base_metadata['drug_name']}\nSection: {section_name}\nContent: {content}"
-                docs = self.text_splitter.create_documents([full_content], metadatas=[{**base_metadata, "section": section_name}])
-                documents.extend(docs)
+        documents = build_label_documents(drug_info, drug_info.brand_name or drug_name, self.text_splitter)
 
         if documents:
-            self.vectorstore.add_documents(documents)
-            print(f"Ingested {len(documents)} text chunks for {drug_name}.")
+            embedded = self.upsert_documents(documents)
+            self.drug_index.save_if_dirty()
+            if embedded:
+                logger.info("Ingested label", extra={"drug": drug_name, "chunks": embedded})
+            else:
+                logger.info("Label unchanged, nothing to embed", extra={"drug": drug_name})
             return True
         
         return False
 
+    def upsert_documents(self, documents: list) -> int:
+        """
+        Writes label documents idempotently. Sections whose content hash matches what is
+        already stored are skipped entirely (no embedding); changed sections replace their
+        old references. A chunk whose text is already stored for the same drug, exactly
+        or as a near-duplicate (MinHash), is only referenced, not embedded again. Chunks
+        no label references any more are deleted. Returns the number of chunks embedded.
+        """
+        # Per (label, section); the last version wins if a batch holds the same label twice
+        incoming = {}
+        for doc in documents:
+            key = (doc.metadata["set_id"], doc.metadata["section"])
+            docs = incoming.get(key)
+            if docs is None or next(iter(docs.values())).metadata["section_hash"] != doc.metadata["section_hash"]:
+                docs = incoming[key] = {}
+            docs[doc.id] = doc
+
+        set_ids = sorted({set_id for set_id, _section in incoming})
+        stored = self.chunk_store.sections(set_ids)
+        changed = {key: list(docs.values()) for key, docs in incoming.items()
+                   if stored.get(key, (None, []))[0] != next(iter(docs.values())).metadata["section_hash"]}
+        # Sections that disappeared from a newer label version
+        removed = list(changed) + [key for key in stored if key not in incoming]
+
+        # Chunks written by the pre-dedup layout (per-label ids, not tracked in the chunk store)
+        existing = self.vectorstore.get(where={"set_id": {"$in": set_ids}}, include=["metadatas"])
+        legacy_ids = set(existing["ids"]) - self.chunk_store.known(existing["ids"])
+        # Drugs whose stored text changes: the new sections', the replaced or removed sections' and legacy chunks'
+        stale_drugs = self.chunk_store.drugs(removed)
+        for doc_id, meta in zip(existing["ids"], existing["metadatas"]):
+            if doc_id in legacy_ids and meta:
+                stale_drugs.update(name for name in (meta.get("drug_name"), meta.get("generic_name")) if name)
+
+        changed_docs = [doc for docs in changed.values() for doc in docs]
+        known = self.chunk_store.known(doc.id for doc in changed_docs)
+        to_add = {}
+        rows = []
+        # Signatures of the chunks added by this batch, written with the references after embedding
+        signatures = []
+        duplicates = near_duplicates = 0
+        for doc in changed_docs:
+            meta = doc.metadata
+            target = doc.id
+            if doc.id in known or doc.id in to_add:
+                duplicates += 1
+            else:
+                scope = dedup_scope(meta)
+                body = doc.page_content.split("\n", 1)[-1] # without the "Section:" line
+                signature, numbers = minhash(body), quantities(body)
+                match = self.chunk_store.find_near_duplicate(scope, meta["section"], signature, numbers)
+                if match is None:
+                    match = _pending_near_duplicate(signatures, scope, meta["section"], signature, numbers,
+                                                    self.chunk_store.threshold)
+                if match is not None:
+                    target = match
+                    near_duplicates += 1
+                else:
+                    to_add[doc.id] = doc
+                    signatures.append((doc.id, scope, meta["section"], signature, numbers))
+            rows.append((target, meta["set_id"], meta["section"], meta["section_hash"],
+                         meta["drug_name"], meta.get("generic_name")))
+
+        # Load (or build) the name index before adding, so saving it never drops older names
+        self.drug_index.ensure_built(self.vectorstore)
+        self.drug_index.add_metadata(doc.metadata for doc in documents)
+
+        before = self._store_version()
+        # Embed before opening the chunk store's write transaction, so other processes
+        # writing to it (/ingest while ingest_offline runs) aren't locked out meanwhile
+        if to_add:
+            new_docs = list(to_add.values())
+            self.vectorstore.add_documents(new_docs, ids=[doc.id for doc in new_docs])
+            self.lexical_index.add_documents(new_docs)
+        try:
+            orphans = self.chunk_store.replace_sections(removed, rows, signatures)
+            stale_ids = sorted((legacy_ids | set(orphans)) - set(to_add))
+            if stale_ids:
+                self.vectorstore.delete(ids=stale_ids)
+                self.lexical_index.remove(stale_ids)
+            self.chunk_store.commit()
+        except Exception:
+            self.chunk_store.rollback()
+            raise
+        self.lexical_index.add_names(doc.metadata for doc in documents)
+        after = self._store_version()
+        self.lexical_index.sync(before, after)
+        stale_drugs |= _doc_drugs(changed_docs)
+        if stale_drugs:
+            # Cached answers built on the old label text are no longer trustworthy
+            self.answer_cache.invalidate_drugs(stale_drugs)
+
+        unchanged = sum(len(docs) for key, docs in incoming.items() if key not in changed)
+        INGEST_CHUNKS.inc(len(to_add), result="embedded")
+        INGEST_CHUNKS.inc(duplicates, result="duplicate")
+        INGEST_CHUNKS.inc(near_duplicates, result="near_duplicate")
+        INGEST_CHUNKS.inc(unchanged, result="unchanged")
+        for name, value in (("chunks", len(changed_docs)), ("embedded", len(to_add)),
+                            ("duplicates", duplicates), ("near_duplicates", near_duplicates)):
+            self.ingest_stats[name] += value
+        return len(to_add)
+
+    def warm_up(self):
+        """
+        Pays the cold-start costs before the first user does: loads the embedding
+        model into Ollama, opens the vector store (Chroma's HNSW index, or maps the
+        mmap index) with a first query, and builds the lexical and drug-name indexes.
+        """
+        probe = self.embedding_function.embed_query("warm up")
+        self.vectorstore.similarity_search_by_vector(probe, k=1)
+        self.lexical_index.ensure_built(self.vectorstore)
+        self.drug_index.ensure_built(self.vectorstore)
+
+    def close(self):
+        self.fda_client.close()
+        self.chunk_store.close()
+        if hasattr(self.vectorstore, "close"):
+            self.vectorstore.close()
+
+    def search_drugs(self, query: str, limit: int = 10, fuzzy: bool = False) -> list:
+        """
+        Prefix (and optionally typo-tolerant) search over the names already in the library.
+        """
+        self.drug_index.ensure_built(self.vectorstore)
+        return self.drug_index.search(query, limit=limit, fuzzy=fuzzy)
+
+    def _exact_answer(self, question: str) -> Optional[str]:
+        """A cached answer to the same question, found without embedding it."""
+        with span("rag", "cache_lookup"):
+            cached = self.answer_cache.get_exact(question)
+        if cached is not None:
+            RAG_QUERIES.inc(cache="hit")
+        return cached
+
+    def _question_drugs(self, question: str) -> set:
+        """The drugs the question itself names, which a semantic cache hit must match."""
+        self.lexical_index.ensure_built(self.vectorstore)
+        return self.lexical_index.question_drugs(question)
+
+    def _cached_answer(self, question: str, question_vector, question_drugs: set) -> Optional[str]:
+        with span("rag", "cache_lookup"):
+            cached = self.answer_cache.get(question, question_vector, question_drugs)
+        RAG_QUERIES.inc(cache="hit" if cached is not None else "miss")
+        return cached
+
     def query(self, question: str) -> str:
         """
-        RAG Query pipeline.
+        RAG Query pipeline, answered from the cache when the same (or a near-identical)
+        question was asked before.
         """
-        # Define prompt
-        template = """Answer the question based ONLY on the following context from the FDA drug label:
-        
-        {context}
-        
-        Question: {question}
-        
-        If the information is not in the context, say "Not found in label".
+        cached = self._exact_answer(question)
+        if cached is not None:
+            return cached
+        # Query embeddings are cached too, so this is cheap on repeat questions
+        with span("rag", "embed_query"):
+            question_vector = self.embedding_function.embed_query(question)
+        question_drugs = self._question_drugs(question)
+        cached = self._cached_answer(question, question_vector, question_drugs)
+        if cached is not None:
+            return cached
+
+        result = self.rag_chain.invoke(question, config=self.run_config)
+        self.answer_cache.put(question, result["answer"], question_vector, _doc_drugs(result["docs"]),
+                              question_drugs)
+        return result["answer"]
+
+    async def aquery(self, question: str) -> str:
         """
-        prompt = ChatPromptTemplate.from_template(template)
-        
-        def format_docs(docs):
-            return "\n\n".join([d.page_content for d in docs])
+        Async variant of query(). Embedding and Chroma lookups are offloaded to the
+        executor and generation uses the model's async client, so the event loop stays free.
+        """
+        cached = self._exact_answer(question)
+        if cached is not None:
+            return cached
+        with span("rag", "embed_query"):
+            question_vector = await self.embedding_function.aembed_query(question)
+        # May load the lexical index from the vector store: off the event loop
+        question_drugs = await asyncio.to_thread(self._question_drugs, question)
+        cached = self._cached_answer(question, question_vector, question_drugs)
+        if cached is not None:
+            return cached
 
-        # Chain
-        rag_chain = (
-            {"context": self.retriever | format_docs, "question": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
-        
-        return rag_chain.invoke(question)
+        result = await self.rag_chain.ainvoke(question, config=self.run_config)
+        self.answer_cache.put(question, result["answer"], question_vector, _doc_drugs(result["docs"]),
+                              question_drugs)
+        return result["answer"]
+
+    async def astream(self, question: str):
+        """
+        Yields the answer token by token as the LLM generates it.
+        A cache hit is yielded as a single chunk.
+        """
+        cached = self._exact_answer(question)
+        if cached is None:
+            with span("rag", "embed_query"):
+                question_vector = await self.embedding_function.aembed_query(question)
+            question_drugs = await asyncio.to_thread(self._question_drugs, question)
+            cached = self._cached_answer(question, question_vector, question_drugs)
+        if cached is not None:
+            yield cached
+            return
+
+        candidates = await self.retriever.ainvoke(question, config=self.run_config)
+        # Token counting and the stored-embedding lookup for redundancy checks are blocking
+        with span("rag", "context"):
+            context, docs = await asyncio.to_thread(self._context, candidates, question)
+        parts = []
+        async for token in self.answer_chain.astream({"context": context, "question": question},
+                                                     config=self.run_config):
+            parts.append(token)
+            yield token
+
+        # Only complete answers are cached; an aborted stream never reaches this point
+        self.answer_cache.put(question, "".join(parts), question_vector, _doc_drugs(docs), question_drugs)
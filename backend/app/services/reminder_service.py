@@ -1,8 +1,31 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+
 from langchain_community.chat_models import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
-from typing import List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from backend.app.services.dosage_parser import DOSAGE_PARSER_MIN_CONFIDENCE, normalize_dosage_text, parse_dosage
+from backend.app.services.chain_metrics import ChainStageCallback
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SCHEDULE_MEMO_SIZE = int(os.getenv("SCHEDULE_MEMO_SIZE", "2048"))
+REMINDER_MAX_CONCURRENCY = int(os.getenv("REMINDER_MAX_CONCURRENCY", "4")) # LLM calls in flight per batch
+
+REMINDER_TEMPLATE = """Processing the dosage information for the drug "{drug_name}".
+        Dosage Text: "{dosage_text}"
+
+        Extract the medication schedule into a structured JSON format.
+        Infer specific times (HH:MM) if only frequency is given (e.g., "twice a day" -> 09:00, 21:00).
+
+        {format_instructions}
+        """
 
 class ReminderSchedule(BaseModel):
     drug: str = Field(description="Name of the drug")
@@ -11,40 +34,155 @@ class ReminderSchedule(BaseModel):
     instructions: str = Field(description="Instructions like 'Take with food'")
 
 class ReminderService:
-    def __init__(self, model_name="llama3"):
-        self.llm = ChatOllama(model=model_name, format="json")
+    def __init__(self, model_name="llama3", min_confidence: float = DOSAGE_PARSER_MIN_CONFIDENCE,
+                 memo_size: int = SCHEDULE_MEMO_SIZE, llm=None):
+        self.llm = llm or ChatOllama(model=model_name, format="json")
         self.parser = JsonOutputParser(pydantic_object=ReminderSchedule)
+        self.min_confidence = min_confidence
+
+        # Built once; the format instructions never change
+        self.prompt = ChatPromptTemplate.from_template(REMINDER_TEMPLATE).partial(
+            format_instructions=self.parser.get_format_instructions()
+        )
+        self.chain = self.prompt | self.llm | self.parser
+        self.run_config = {"callbacks": [ChainStageCallback("reminder")]}
+
+        # LLM results keyed by normalized dosage text (LRU)
+        self._memo: "OrderedDict[str, dict]" = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+        self.fast_path_hits = 0
+        self.memo_hits = 0
+        self.llm_calls = 0
+
+    def _memo_get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            result = self._memo.get(key)
+            if result is not None:
+                self._memo.move_to_end(key)
+            return result
+
+    def _memo_put(self, key: str, result: dict):
+        with self._lock:
+            self._memo[key] = result
+            self._memo.move_to_end(key)
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+
+    def _without_llm(self, drug_name: str, dosage_text: str) -> Tuple[Optional[dict], dict, str]:
+        """
+        Returns (schedule or None, rule-based parse, memo key). The schedule is set
+        when the rules or the memo can answer without calling the model.
+        """
+        schedule, confidence = parse_dosage(drug_name, dosage_text)
+        if confidence >= self.min_confidence:
+            self.fast_path_hits += 1
+            return schedule, schedule, ""
+
+        key = normalize_dosage_text(dosage_text)
+        memo = self._memo_get(key)
+        if memo is not None:
+            self.memo_hits += 1
+            return {**memo, "drug": drug_name}, schedule, key
+        return None, schedule, key
+
+    @staticmethod
+    def _fallback(drug_name: str, parsed: dict) -> dict:
+        # A low-confidence parse still beats no schedule
+        if parsed["times"]:
+            return parsed
+        return {
+            "drug": drug_name,
+            "dosage": "Unknown",
+            "times": [],
+            "instructions": "Could not parse instructions."
+        }
 
     def generate_schedule(self, drug_name: str, dosage_text: str) -> ReminderSchedule:
         """
         Generates a structured reminder schedule from dosage text.
+        Common phrasings are parsed by rules; the LLM only sees low-confidence text.
         """
-        template = """Processing the dosage information for the drug "{drug_name}".
-        Dosage Text: "{dosage_text}"
-        
-        Extract the medication schedule into a structured JSON format. 
-        Infer specific times (HH:MM) if only frequency is given (e.g., "twice a day" -> 09:00, 21:00).
-        
-        {format_instructions}
+        schedule, parsed, key = self._without_llm(drug_name, dosage_text)
+        if schedule is not None:
+            return schedule
+
+        try:
+            self.llm_calls += 1
+            result = self.chain.invoke({
+                "drug_name": drug_name,
+                "dosage_text": dosage_text
+            }, config=self.run_config)
+            self._memo_put(key, result)
+            return result
+        except Exception as e:
+            logger.warning("Error generating reminder: %s", e, extra={"drug": drug_name})
+            return self._fallback(drug_name, parsed)
+
+    async def agenerate_schedule(self, drug_name: str, dosage_text: str) -> ReminderSchedule:
+        """
+        Async variant of generate_schedule(); the LLM call doesn't block the event loop.
         """
-        
-        prompt = ChatPromptTemplate.from_template(template)
-        
-        chain = prompt | self.llm | self.parser
-        
+        schedule, parsed, key = self._without_llm(drug_name, dosage_text)
+        if schedule is not None:
+            return schedule
+
         try:
-            result = chain.invoke({
-                "drug_name": drug_name, 
-                "dosage_text": dosage_text,
-                "format_instructions": self.parser.get_format_instructions()
-            })
+            self.llm_calls += 1
+            result = await self.chain.ainvoke({
+                "drug_name": drug_name,
+                "dosage_text": dosage_text
+            }, config=self.run_config)
+            self._memo_put(key, result)
             return result
         except Exception as e:
-            print(f"Error generating reminder: {e}")
-            # Fallback
-            return {
-                "drug": drug_name,
-                "dosage": "Unknown",
-                "times": [],
-                "instructions": "Could not parse instructions."
-            }
+            logger.warning("Error generating reminder: %s", e, extra={"drug": drug_name})
+            return self._fallback(drug_name, parsed)
+
+    async def agenerate_schedules(self, items: List[Tuple[str, str]],
+                                  max_concurrency: Optional[int] = None) -> AsyncIterator[dict]:
+        """
+        Generates schedules for many (drug_name, dosage_text) pairs, yielding each
+        result as soon as it is ready (not in input order):
+        {"index", "drug_name", "status": "ok" | "error", "schedule", "error"}.
+        Rule-based and memoized answers come back first; the rest go through the
+        chain's async batch path with at most max_concurrency (capped at
+        REMINDER_MAX_CONCURRENCY) LLM calls in flight.
+        A failed item is reported on its own (with the fallback schedule) and never
+        fails the batch.
+        """
+        # Pairs with the same dosage text share one LLM call
+        pending: Dict[str, List[Tuple[int, str, dict]]] = {}
+        for index, (drug_name, dosage_text) in enumerate(items):
+            schedule, parsed, key = self._without_llm(drug_name, dosage_text)
+            if schedule is not None:
+                yield {"index": index, "drug_name": drug_name, "status": "ok", "schedule": schedule, "error": None}
+            else:
+                pending.setdefault(key, []).append((index, drug_name, parsed))
+        if not pending:
+            return
+
+        keys = list(pending)
+        inputs = []
+        for key in keys:
+            index, drug_name, _parsed = pending[key][0]
+            inputs.append({"drug_name": drug_name, "dosage_text": items[index][1]})
+        self.llm_calls += len(inputs)
+        max_concurrency = min(max_concurrency or REMINDER_MAX_CONCURRENCY, REMINDER_MAX_CONCURRENCY)
+
+        async for position, result in self.chain.abatch_as_completed(
+            inputs, config={**self.run_config, "max_concurrency": max(1, max_concurrency)}, return_exceptions=True
+        ):
+            key = keys[position]
+            failed = isinstance(result, Exception)
+            if failed:
+                logger.warning("Error generating reminder: %s", result, extra={"drug": pending[key][0][1]})
+            else:
+                self._memo_put(key, result)
+            for index, drug_name, parsed in pending[key]:
+                if failed:
+                    yield {"index": index, "drug_name": drug_name, "status": "error",
+                           "schedule": self._fallback(drug_name, parsed), "error": str(result) or type(result).__name__}
+                else:
+                    yield {"index": index, "drug_name": drug_name, "status": "ok",
+                           "schedule": {**result, "drug": drug_name}, "error": None}
@@ -0,0 +1,379 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from backend.app.core.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+INDEX_REFRESH_SECONDS = float(os.getenv("INDEX_REFRESH_SECONDS", "5")) # how often in-memory indexes check for other processes' writes
+
+# Keywords that signal which label section a question is about
+SECTION_INTENTS = {
+    "Warnings": ("warning", "warnings", "caution", "precaution", "precautions", "danger", "dangerous",
+                 "safe", "pregnant", "pregnancy", "breastfeeding", "alcohol", "overdose", "allergic"),
+    "Adverse Reactions": ("side effect", "side effects", "adverse", "reaction", "reactions"),
+    "Dosage & Administration": ("dose", "doses", "dosage", "dosing", "how much", "how many", "how often",
+                                "administer", "administration", "mg"),
+    "Indications & Usage": ("used for", "use for", "uses", "indication", "indications", "indicated",
+                            "treat", "treats", "purpose"),
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "i", "if",
+    "in", "is", "it", "me", "my", "of", "on", "or", "should", "that", "the", "this", "to", "what",
+    "when", "which", "who", "with", "you", "your", "about", "tell", "there", "any",
+}
+
+MAX_NAME_WORDS = 4 # longest drug name (in words) recognized in a question
+RRF_K = 60 # reciprocal rank fusion constant
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over the chunks in the vector store, plus the
+    drug / generic names seen in their metadata (used to recognize drugs in questions).
+    Built lazily from the collection and kept current by RAGService on every upsert.
+    Writes by other processes (ingest_offline.py, other workers) change version_source(),
+    which triggers a reload of the chunks added or removed since. Chunks shared across labels carry the metadata of one label
+    only, so the names of every label (from name_source) are added too, with each brand
+    mapped to its generic.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, name_source: Optional[Callable[[], Iterable[dict]]] = None,
+                 version_source: Optional[Callable[[], Any]] = None):
+        self.k1 = k1
+        self.b = b
+        self.name_source = name_source
+        self.version_source = version_source
+        self._lock = threading.RLock()
+        self._built = False
+        self._version = None
+        self._checked = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict) # term -> {chunk_id: tf}
+        self.doc_len: Dict[str, int] = {}
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.doc_meta: Dict[str, Tuple[str, str, str]] = {} # chunk_id -> (drug, generic, section)
+        # Chunk ids per lower-cased drug / generic name and per section, so filtered searches
+        # score only the chunks the filter allows
+        self.drug_docs: Dict[str, Set[str]] = defaultdict(set)
+        self.section_docs: Dict[str, Set[str]] = defaultdict(set)
+        self.total_len = 0
+        # lower-cased name -> original spellings as stored in metadata (Chroma filters are case-sensitive)
+        self.drug_names: Dict[str, Set[str]] = defaultdict(set)
+        self.generic_names: Dict[str, Set[str]] = defaultdict(set)
+        self.brand_generics: Dict[str, Set[str]] = defaultdict(set) # lower-cased brand -> lower-cased generics
+
+    # --- Maintenance ---
+
+    def _current(self) -> bool:
+        return self._built and (self.version_source is None
+                                or time.monotonic() - self._checked < INDEX_REFRESH_SECONDS)
+
+    def ensure_built(self, vectorstore, page_size: int = 5000):
+        """
+        Loads the index from the collection on first use. When version_source (checked
+        at most every INDEX_REFRESH_SECONDS) shows another process wrote to it, only the
+        chunks added or removed since are loaded or dropped.
+        """
+        if self._current():
+            return
+        with self._lock:
+            if self._current():
+                return
+            version = self.version_source() if self.version_source is not None else None
+            self._checked = time.monotonic()
+            if self._built:
+                if version == self._version:
+                    return
+                self._reload_changes(vectorstore, page_size)
+            else:
+                offset = 0
+                while True:
+                    page = vectorstore.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                    if not page["ids"]:
+                        break
+                    self._add_many(zip(page["ids"], page["documents"], page["metadatas"]))
+                    offset += len(page["ids"])
+            if self.name_source is not None:
+                self._add_names(self.name_source())
+            self._version = version
+            self._built = True
+
+    def _reload_changes(self, vectorstore, page_size: int):
+        """
+        Applies another process's writes: reads the collection's ids only, then loads the
+        text of the new chunks and drops the deleted ones. Chunk ids are content hashes,
+        so a chunk whose id is already indexed hasn't changed.
+        """
+        stored: Set[str] = set()
+        offset = 0
+        while True:
+            page = vectorstore.get(include=[], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            stored.update(page["ids"])
+            offset += len(page["ids"])
+        removed = [doc_id for doc_id in self.doc_len if doc_id not in stored]
+        added = [doc_id for doc_id in stored if doc_id not in self.doc_len]
+        for doc_id in removed:
+            self._remove(doc_id)
+        for i in range(0, len(added), page_size):
+            page = vectorstore.get(ids=added[i:i + page_size], include=["documents", "metadatas"])
+            self._add_many(zip(page["ids"], page["documents"], page["metadatas"]))
+        logger.info("Collection changed in another process; updated the lexical index",
+                    extra={"added": len(added), "removed": len(removed)})
+
+    def sync(self, before, after):
+        """
+        Records this process's own write, already applied in place: if the index was
+        current at version before, it is current at version after.
+        """
+        with self._lock:
+            if self._built and self._version == before:
+                self._version = after
+
+    def add_documents(self, documents: List[Document]):
+        with self._lock:
+            self._add_many((doc.id, doc.page_content, doc.metadata) for doc in documents)
+
+    def _add_many(self, rows):
+        metadatas = []
+        for doc_id, text, meta in rows:
+            meta = meta or {}
+            metadatas.append(meta)
+            if doc_id in self.doc_len:
+                self._remove(doc_id)
+            terms = tokenize(text or "")
+            for term, tf in Counter(terms).items():
+                self.postings[term][doc_id] = tf
+            self.doc_terms[doc_id] = list(set(terms))
+            self.doc_len[doc_id] = len(terms)
+            self.total_len += len(terms)
+            drug = meta.get("drug_name") or ""
+            generic = meta.get("generic_name") or ""
+            self.doc_meta[doc_id] = (drug.lower(), generic.lower(), meta.get("section") or "")
+            self._file(doc_id, self.doc_meta[doc_id])
+        self._add_names(metadatas)
+
+    def add_names(self, metadatas: Iterable[dict]):
+        with self._lock:
+            self._add_names(metadatas)
+
+    def _add_names(self, metadatas):
+        for meta in metadatas:
+            drug = (meta or {}).get("drug_name") or ""
+            generic = (meta or {}).get("generic_name") or ""
+            if drug:
+                self.drug_names[drug.lower()].add(drug)
+            if generic:
+                self.generic_names[generic.lower()].add(generic)
+                if drug:
+                    self.brand_generics[drug.lower()].add(generic.lower())
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self.doc_len:
+                    self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        for term in self.doc_terms.pop(doc_id, []):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+        meta = self.doc_meta.pop(doc_id, None)
+        if meta is not None:
+            self._file(doc_id, meta, remove=True)
+
+    def _file(self, doc_id: str, meta: Tuple[str, str, str], remove: bool = False):
+        """Adds doc_id to (or removes it from) the per-drug and per-section id sets."""
+        drug, generic, section = meta
+        for index, key in ((self.drug_docs, drug), (self.drug_docs, generic), (self.section_docs, section)):
+            if not key:
+                continue
+            if not remove:
+                index[key].add(doc_id)
+            elif key in index:
+                index[key].discard(doc_id)
+                if not index[key]:
+                    del index[key]
+
+    # --- Query analysis ---
+
+    def find_drugs(self, question: str) -> Set[str]:
+        """Lower-cased drug / generic names mentioned in the question (longest match wins)."""
+        words = _words(question)
+        found = set()
+        i = 0
+        while i < len(words):
+            for n in range(min(MAX_NAME_WORDS, len(words) - i), 0, -1):
+                phrase = " ".join(words[i:i + n])
+                if phrase in self.drug_names or phrase in self.generic_names:
+                    found.add(phrase)
+                    found.update(self.brand_generics.get(phrase, ()))
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
+
+    def question_drugs(self, question: str) -> Set[str]:
+        """
+        The drugs a question is about: the known names it mentions, plus the words no
+        indexed label uses (most likely names of drugs not ingested yet).
+        """
+        found = self.find_drugs(question)
+        name_words = {w for name in found for w in name.split()}
+        with self._lock:
+            unknown = {t for t in tokenize(question) if t not in self.postings and t not in name_words}
+        return found | unknown
+
+    @staticmethod
+    def find_section(question: str) -> Optional[str]:
+        """The section a question is about, if exactly one section's keywords appear."""
+        text = " " + " ".join(_words(question)) + " "
+        matches = [section for section, keywords in SECTION_INTENTS.items()
+                   if any(f" {kw} " in text for kw in keywords)]
+        return matches[0] if len(matches) == 1 else None
+
+    def where_filter(self, drugs: Set[str], section: Optional[str]) -> Optional[Dict[str, Any]]:
+        clauses = []
+        if drugs:
+            brands = sorted({s for d in drugs for s in self.drug_names.get(d, ())})
+            generics = sorted({s for d in drugs for s in self.generic_names.get(d, ())})
+            name_clauses = []
+            if brands:
+                name_clauses.append({"drug_name": {"$in": brands}})
+            if generics:
+                name_clauses.append({"generic_name": {"$in": generics}})
+            if len(name_clauses) == 1:
+                clauses.append(name_clauses[0])
+            elif name_clauses:
+                clauses.append({"$or": name_clauses})
+        if section:
+            clauses.append({"section": section})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    # --- Scoring ---
+
+    def _allowed(self, drugs: Set[str], section: Optional[str]) -> Optional[Set[str]]:
+        """The chunk ids the drug / section filter allows; None = no filter."""
+        allowed = None
+        if drugs:
+            allowed = set().union(*(self.drug_docs.get(d, ()) for d in drugs))
+        if section:
+            in_section = self.section_docs.get(section, set())
+            allowed = in_section if allowed is None else allowed & in_section
+        return allowed
+
+    def search(self, question: str, k: int, drugs: Set[str] = frozenset(),
+               section: Optional[str] = None) -> List[Tuple[str, float]]:
+        """BM25 top-k chunk ids, restricted to the same drugs / section as the vector filter."""
+        with self._lock:
+            n_docs = len(self.doc_len)
+            if not n_docs:
+                return []
+            avg_len = self.total_len / n_docs
+            allowed = self._allowed(drugs, section)
+            if allowed is not None and not allowed:
+                return []
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(question)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                # Walk whichever is shorter: the term's postings or the chunks the filter allows
+                if allowed is None:
+                    matches = postings.items()
+                elif len(allowed) < len(postings):
+                    matches = ((doc_id, postings[doc_id]) for doc_id in allowed if doc_id in postings)
+                else:
+                    matches = ((doc_id, tf) for doc_id, tf in postings.items() if doc_id in allowed)
+                for doc_id, tf in matches:
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda x: -x[1])[:k]
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieval for drug questions:
+    1. Recognize drug names and the section the question is about.
+    2. Push them down as a Chroma `where` filter (relaxed if it returns too little).
+    3. Fuse the filtered vector ranking with a BM25 ranking via reciprocal rank fusion.
+    """
+    vectorstore: Any
+    index: LexicalIndex
+    k: int = 3
+    fetch_k: int = 20
+    min_hits: int = 3 # relax the filter only when it finds fewer hits than this (k may be larger)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with span("rag", "lexical_index_build"):
+            self.index.ensure_built(self.vectorstore)
+        drugs = self.index.find_drugs(query)
+        section = self.index.find_section(query)
+
+        # Most specific filter first; relax it when it can't fill k results,
+        # keeping the stricter hits ahead of the relaxed ones
+        attempts = [(drugs, section), (drugs, None), (set(), None)]
+        vector_hits = []
+        seen = set()
+        tried = set()
+        for attempt_drugs, attempt_section in attempts:
+            where = self.index.where_filter(attempt_drugs, attempt_section)
+            key = repr(where)
+            if key in tried:
+                continue
+            tried.add(key)
+            with span("rag", "vector_search"):
+                hits = self.vectorstore.similarity_search_with_score(query, k=self.fetch_k, filter=where)
+            for doc, distance in hits:
+                if doc.id not in seen:
+                    seen.add(doc.id)
+                    vector_hits.append((doc, distance))
+            if len(vector_hits) >= min(self.k, self.min_hits):
+                break
+
+        with span("rag", "lexical_search"):
+            lexical_hits = self.index.search(query, self.fetch_k, attempt_drugs, attempt_section)
+
+        fused: Dict[str, float] = defaultdict(float)
+        docs: Dict[str, Document] = {}
+        for rank, (doc, _distance) in enumerate(vector_hits):
+            fused[doc.id] += 1.0 / (RRF_K + rank + 1)
+            docs[doc.id] = doc
+        for rank, (doc_id, _score) in enumerate(lexical_hits):
+            fused[doc_id] += 1.0 / (RRF_K + rank + 1)
+
+        top = sorted(fused, key=lambda i: -fused[i])[:self.k]
+        missing = [i for i in top if i not in docs]
+        if missing:
+            page = self.vectorstore.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, text, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                docs[doc_id] = Document(id=doc_id, page_content=text, metadata=meta or {})
+        return [docs[i] for i in top if i in docs]
@@ -0,0 +1,472 @@
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma") # "chroma" or "mmap"
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "") # "" = ./chroma_db (chroma) or ./vector_index (mmap)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none") # mmap only, for new indexes: "none" (float32) or "int8"
+
+COLLECTION_NAME = "drug_labels"
+DEFAULT_PATHS = {"chroma": "./chroma_db", "mmap": "./vector_index"}
+SEARCH_BLOCK = 65536 # rows scored per matrix product (bounds the int8 -> float32 temporary)
+MIN_CAPACITY = 1024 # rows; the vector file grows by doubling
+
+def vector_store_path(persist_directory: Optional[str] = None, backend: str = VECTOR_BACKEND) -> str:
+    return persist_directory or VECTOR_STORE_PATH or DEFAULT_PATHS.get(backend)
+
+def make_vectorstore(embedding_function: Optional[Embeddings], persist_directory: Optional[str] = None,
+                     backend: str = VECTOR_BACKEND) -> VectorStore:
+    """The configured vector store for the drug_labels collection."""
+    path = vector_store_path(persist_directory, backend)
+    if backend == "mmap":
+        return MmapVectorStore(path, embedding_function)
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+        return Chroma(persist_directory=path, embedding_function=embedding_function, collection_name=COLLECTION_NAME)
+    raise ValueError(f"Unknown VECTOR_BACKEND {backend!r} (expected 'chroma' or 'mmap')")
+
+def collection_size(store: VectorStore) -> int:
+    return store.count() if isinstance(store, MmapVectorStore) else store._collection.count()
+
+class MmapVectorStore(VectorStore):
+    """
+    Exact (flat) vector index in a memory-mapped file. Every process maps the
+    same file, so uvicorn workers share one copy in the page cache, and opening
+    the index reads a small id table instead of loading an HNSW graph.
+
+    - vectors.bin: one L2-normalized row per chunk, float32, or int8 with a
+      float32 scale per row in scales.bin. Search is a dot product (cosine).
+    - index.sqlite3: id, document and metadata of every row, plus the settings
+      (dim, quantization). Writes run in one SQLite write transaction,
+      which also serializes writers across processes. A process applies its
+      own writes to its in-memory tables (id map, live rows, filter codes) in
+      place; another process's commit shows up in PRAGMA data_version and
+      triggers a full reload before the next call.
+
+    Implements the part of the Chroma API the services use: get(), delete(),
+    add_documents()/add_texts() (upserts) and similarity_search*() with Chroma
+    `where` filters ($and, $or, $eq, $ne, $in, $nin).
+    """
+
+    def __init__(self, path: str, embedding_function: Optional[Embeddings] = None,
+                 quantization: str = VECTOR_QUANTIZATION):
+        if quantization not in ("none", "int8"):
+            raise ValueError(f"Unknown quantization {quantization!r} (expected 'none' or 'int8')")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS items (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                document TEXT,
+                metadata TEXT
+            );
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );"""
+        )
+        self._conn.execute("INSERT OR IGNORE INTO settings VALUES ('quantization', ?)", (quantization,))
+        self._conn.commit()
+        self._data_version = None # forces a load on first use
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    # --- State ---
+
+    def _settings(self) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+
+    def _map(self, name: str, dtype, width: int, mode: str = "r"):
+        file_path = os.path.join(self.path, name)
+        rows = os.path.getsize(file_path) // (np.dtype(dtype).itemsize * width) if os.path.exists(file_path) else 0
+        if not rows:
+            return None
+        shape = (rows, width) if width > 1 else (rows,)
+        return np.memmap(file_path, dtype=dtype, mode=mode, shape=shape)
+
+    def _load(self):
+        settings = self._settings()
+        self.quantization = settings["quantization"]
+        self.dim = int(settings["dim"]) if "dim" in settings else None
+        rows = self._conn.execute("SELECT row, id FROM items").fetchall()
+        size = max((row for row, _id in rows), default=-1) + 1
+        self._size = size
+        self._id_at: List[Optional[str]] = [None] * size
+        self._row_of: Dict[str, int] = {}
+        for row, doc_id in rows:
+            self._id_at[row] = doc_id
+            self._row_of[doc_id] = row
+        self._alive = np.zeros(size, dtype=bool)
+        if rows:
+            self._alive[[row for row, _id in rows]] = True
+        self._metadatas = None # parsed lazily, only filters need them all
+        self._fields: Dict[str, Tuple[np.ndarray, Dict[Any, int]]] = {}
+        self._vectors = self._scales = None
+        self._remap()
+
+    def _refresh(self):
+        """Reloads if another process committed since the last load (own commits don't change data_version)."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._load()
+            self._data_version = version
+
+    def _remap(self):
+        if self.dim:
+            self._vectors = self._map("vectors.bin", np.int8 if self.quantization == "int8" else np.float32, self.dim)
+            if self.quantization == "int8":
+                self._scales = self._map("scales.bin", np.float32, 1)
+
+    def _resize(self, size: int):
+        """Extends the per-row tables to `size` rows."""
+        extra = size - self._size
+        if extra <= 0:
+            return
+        self._id_at.extend([None] * extra)
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+        if self._metadatas is not None:
+            self._metadatas.extend([None] * extra)
+        for name, (codes, vocab) in self._fields.items():
+            self._fields[name] = (np.concatenate([codes, np.full(extra, -1, dtype=np.int32)]), vocab)
+        self._size = size
+
+    def _set_row(self, row: int, doc_id: Optional[str], meta: Optional[dict]):
+        """Points a row at a document (or frees it, with doc_id None) in the in-memory tables."""
+        self._id_at[row] = doc_id
+        self._alive[row] = doc_id is not None
+        if doc_id is not None:
+            self._row_of[doc_id] = row
+        if self._metadatas is not None:
+            self._metadatas[row] = dict(meta or {}) if doc_id is not None else None
+        for name, (codes, vocab) in self._fields.items():
+            codes[row] = vocab.setdefault(meta[name], len(vocab)) if doc_id is not None and meta and name in meta else -1
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return int(self._alive.sum())
+
+    # --- Filters ---
+
+    def _field(self, name: str) -> Tuple[np.ndarray, Dict[Any, int]]:
+        """Per-row codes of a metadata field (-1 where missing) and the value -> code map."""
+        if name not in self._fields:
+            if self._metadatas is None:
+                self._metadatas = [None] * self._size
+                for row, metadata in self._conn.execute("SELECT row, metadata FROM items"):
+                    self._metadatas[row] = json.loads(metadata) if metadata else {}
+            vocab: Dict[Any, int] = {}
+            codes = np.full(self._size, -1, dtype=np.int32)
+            for row, meta in enumerate(self._metadatas):
+                if meta and name in meta:
+                    codes[row] = vocab.setdefault(meta[name], len(vocab))
+            self._fields[name] = (codes, vocab)
+        return self._fields[name]
+
+    def _mask(self, where: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(self._size, dtype=bool)
+        for key, value in where.items():
+            if key == "$and":
+                for clause in value:
+                    mask &= self._mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(self._size, dtype=bool)
+                for clause in value:
+                    any_mask |= self._mask(clause)
+                mask &= any_mask
+            else:
+                op, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+                codes, vocab = self._field(key)
+                values = operand if op in ("$in", "$nin") else [operand]
+                wanted = np.array([vocab[v] for v in values if v in vocab], dtype=np.int32)
+                if op not in ("$eq", "$ne", "$in", "$nin"):
+                    raise ValueError(f"Unsupported filter operator {op!r}")
+                hit = np.isin(codes, wanted)
+                mask &= ~hit if op in ("$ne", "$nin") else hit
+        return mask
+
+    # --- Reads ---
+
+    def _rows_to_results(self, rows: Sequence[int], include: Sequence[str]) -> Dict[str, Any]:
+        found: Dict[int, Tuple[str, Optional[str], Optional[str]]] = {}
+        rows = list(rows)
+        for i in range(0, len(rows), 500):
+            batch = rows[i:i + 500]
+            for row, doc_id, document, metadata in self._conn.execute(
+                f"SELECT row, id, document, metadata FROM items WHERE row IN ({','.join('?' * len(batch))})", batch
+            ):
+                found[row] = (doc_id, document, metadata)
+        rows = [row for row in rows if row in found]
+        return {
+            "ids": [found[row][0] for row in rows],
+            "documents": [found[row][1] for row in rows] if "documents" in include else None,
+            "metadatas": [json.loads(found[row][2]) if found[row][2] else {} for row in rows]
+            if "metadatas" in include else None,
+            "embeddings": self._dequantize(np.array(rows, dtype=np.int64)) if "embeddings" in include else None,
+        }
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        if self._vectors is None or not rows.size:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("documents", "metadatas"), **kwargs: Any) -> Dict[str, Any]:
+        """Chroma-style get: rows by id (in the given order) or all live rows in storage order."""
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+                if where:
+                    mask = self._mask(where)
+                    rows = [row for row in rows if mask[row]]
+            else:
+                mask = self._alive & self._mask(where) if where else self._alive
+                rows = np.flatnonzero(mask).tolist()
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._rows_to_results(rows, include)
+
+    def _search(self, embedding: Sequence[float], k: int, where: Optional[Dict[str, Any]]) -> List[Tuple[int, float]]:
+        if self._vectors is None or not self._size:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        query = query / norm if norm else query
+        mask = self._alive & self._mask(where) if where else self._alive
+        rows = np.flatnonzero(mask)
+        if not rows.size:
+            return []
+        if rows.size < self._size // 4:
+            # Selective filter: score only the matching rows
+            scores = np.empty(rows.size, dtype=np.float32)
+            for start in range(0, rows.size, SEARCH_BLOCK):
+                block = rows[start:start + SEARCH_BLOCK]
+                scores[start:start + block.size] = self._score(self._vectors[block], block, query)
+        else:
+            # Contiguous blocks read the file sequentially; the mask is applied afterwards
+            all_scores = np.empty(self._size, dtype=np.float32)
+            for start in range(0, self._size, SEARCH_BLOCK):
+                block = np.arange(start, min(start + SEARCH_BLOCK, self._size))
+                all_scores[block] = self._score(self._vectors[start:start + block.size], block, query)
+            scores = all_scores[rows]
+        k = min(k, rows.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _score(self, vectors: np.ndarray, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self._scales is None:
+            return np.asarray(vectors) @ query
+        return (np.asarray(vectors, dtype=np.float32) @ query) * self._scales[rows]
+
+    def similarity_search_by_vector_with_score(self, embedding: Sequence[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Best k documents with their cosine distance (1 - similarity)."""
+        with self._lock:
+            self._refresh()
+            hits = self._search(embedding, k, filter)
+            page = self._rows_to_results([row for row, _score in hits], ("documents", "metadatas"))
+        by_id = {doc_id: (document, meta) for doc_id, document, meta in
+                 zip(page["ids"], page["documents"], page["metadatas"])}
+        results = []
+        for row, score in hits:
+            doc_id = self._id_at[row] if row < len(self._id_at) else None
+            if doc_id in by_id:
+                document, meta = by_id[doc_id]
+                results.append((Document(id=doc_id, page_content=document or "", metadata=meta), 1.0 - score))
+        return results
+
+    def similarity_search_by_vector(self, embedding: Sequence[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _distance in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _distance in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    # --- Writes ---
+
+    def _grow(self, needed: int):
+        capacity = self._vectors.shape[0] if self._vectors is not None else 0
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, MIN_CAPACITY)
+        itemsize = 1 if self.quantization == "int8" else 4
+        with open(os.path.join(self.path, "vectors.bin"), "ab") as f:
+            f.truncate(capacity * self.dim * itemsize)
+        if self.quantization == "int8":
+            with open(os.path.join(self.path, "scales.bin"), "ab") as f:
+                f.truncate(capacity * 4)
+
+    def upsert(self, ids: Sequence[str], embeddings, documents: Sequence[Optional[str]],
+               metadatas: Sequence[Optional[dict]]):
+        """Writes precomputed embeddings (used by add_texts and by imports)."""
+        if not len(ids):
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Under the write lock: pick up rows other processes added
+                self._refresh()
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    self._conn.execute("INSERT INTO settings VALUES ('dim', ?)", (str(self.dim),))
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self.dim})")
+
+                free = iter(np.flatnonzero(~self._alive).tolist())
+                next_row = self._size
+                rows = []
+                assigned = {}
+                for doc_id in ids:
+                    row = self._row_of.get(doc_id, assigned.get(doc_id))
+                    if row is None:
+                        row = next(free, None)
+                        if row is None:
+                            row, next_row = next_row, next_row + 1
+                        assigned[doc_id] = row
+                    rows.append(row)
+
+                self._grow(max(rows) + 1)
+                dtype = np.int8 if self.quantization == "int8" else np.float32
+                target = self._map("vectors.bin", dtype, self.dim, mode="r+")
+                if self.quantization == "int8":
+                    scales = np.abs(vectors).max(axis=1) / 127.0
+                    scales[scales == 0] = 1.0
+                    target[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+                    scale_file = self._map("scales.bin", np.float32, 1, mode="r+")
+                    scale_file[rows] = scales
+                    scale_file.flush()
+                else:
+                    target[rows] = vectors
+                target.flush()
+
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO items (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [(row, doc_id, document, json.dumps(meta) if meta else None)
+                     for row, doc_id, document, meta in zip(rows, ids, documents, metadatas)]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                self._data_version = None # in-memory tables may be ahead of the file
+                raise
+            self._resize(max(rows) + 1)
+            for row, doc_id, meta in zip(rows, ids, metadatas):
+                self._set_row(row, doc_id, meta)
+            self._remap()
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [None] * len(texts)
+        self.upsert(ids, self.embedding_function.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        if not ids:
+            return
+        ids = list(ids)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                for i in range(0, len(ids), 500):
+                    batch = ids[i:i + 500]
+                    self._conn.execute(f"DELETE FROM items WHERE id IN ({','.join('?' * len(batch))})", batch)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            for doc_id in ids:
+                row = self._row_of.pop(doc_id, None)
+                if row is not None:
+                    self._set_row(row, None, None)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, path: str = DEFAULT_PATHS["mmap"], **kwargs: Any) -> "MmapVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# --- Export / import (JSON lines: id, document, metadata, embedding) ---
+
+def iter_records(store: VectorStore, page_size: int = 1000) -> Iterator[dict]:
+    """Every chunk of a store with its stored embedding, for moving a collection between backends."""
+    offset = 0
+    while True:
+        page = store.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        for doc_id, document, meta, embedding in zip(page["ids"], page["documents"], page["metadatas"],
+                                                     page["embeddings"]):
+            yield {"id": doc_id, "document": document, "metadata": meta or {},
+                   "embedding": np.asarray(embedding, dtype=np.float64).tolist()}
+        offset += len(page["ids"])
+
+def write_records(store: VectorStore, records: Iterable[dict], batch_size: int = 1000) -> int:
+    """Upserts records as produced by iter_records without re-embedding. Returns the count."""
+    written = 0
+    batch: List[dict] = []
+
+    def flush():
+        ids = [r["id"] for r in batch]
+        documents = [r["document"] for r in batch]
+        metadatas = [r["metadata"] or None for r in batch]
+        embeddings = [r["embedding"] for r in batch]
+        if isinstance(store, MmapVectorStore):
+            store.upsert(ids, embeddings, documents, metadatas)
+        else:
+            store._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+            written += len(batch)
+            batch = []
+    if batch:
+        flush()
+        written += len(batch)
+    return written
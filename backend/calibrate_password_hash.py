@@ -0,0 +1,19 @@
+import argparse
+
+from backend.app.core.security import MIN_PASSWORD_HASH_ROUNDS, PASSWORD_HASH_ROUNDS, calibrate_rounds
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick pbkdf2_sha256 rounds for a target hashing latency.")
+    parser.add_argument("--target-ms", type=float, default=250, help="Time per hash on this machine")
+    args = parser.parse_args()
+
+    rounds = calibrate_rounds(args.target_ms)
+    print(f"Current PASSWORD_HASH_ROUNDS={PASSWORD_HASH_ROUNDS}")
+    if rounds == MIN_PASSWORD_HASH_ROUNDS:
+        print(f"Suggested PASSWORD_HASH_ROUNDS={rounds} (the minimum; hashing is faster than the target here)")
+    else:
+        print(f"Suggested PASSWORD_HASH_ROUNDS={rounds} (~{args.target_ms:.0f} ms per hash)")
+    print("Weaker existing hashes are upgraded to the new setting on each user's next login.")
+
+if __name__ == "__main__":
+    main()
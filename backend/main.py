@@ -1,16 +1,135 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from uuid import uuid4
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 import os
+import asyncio
+import logging
 
 from backend.app.api.routes import router
-from backend.app.core.database import engine, Base
+from backend.app.api.health import router as health_router
+from backend.app.api.metrics import router as metrics_router
+from backend.app.core.database import engine, Base, dispose_async_engine
+from backend.app.core.security import password_hasher
+from backend.app.core.services import DISPATCH_ENABLED, SERVICE_WARMUP, ServiceUnavailable, registry
+from backend.app.core.logs import configure_logging, request_id_var
+from backend.app.core.metrics import counter, histogram
 from backend.app.models import sql_models
+from backend.migrate_indexes import upgrade_schema
+
+registry.record_phase("import", _import_started)
+
+configure_logging()
+logger = logging.getLogger("backend.main")
+
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_SECONDS = histogram("http_request_duration_seconds",
+                         "Time to response headers (the first chunk, for streamed responses)", ["method", "route"])
+QUIET_ROUTES = ("/health/live", "/health/ready", "/metrics") # scraped constantly; logged at DEBUG
+
+# Startup steps that need the database are retried in the background until they succeed
+STARTUP_RETRY_INTERVAL = float(os.getenv("STARTUP_RETRY_INTERVAL", "5")) # seconds, doubled per failed retry
+STARTUP_RETRY_MAX_INTERVAL = 60.0
+
+async def _create_tables(app: FastAPI):
+    # create_all only creates missing tables; upgrade_schema adds missing columns
+    await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+    added = await asyncio.to_thread(upgrade_schema, engine)
+    if added:
+        logger.info("Added columns to existing tables", extra={"columns": [f"{t}.{c}" for t, c in added]})
+
+async def _start_dispatcher(app: FastAPI):
+    # run() loads the schedule once it holds the dispatch lease
+    dispatcher = registry.get("dispatcher")
+    app.state.dispatch_task = asyncio.create_task(dispatcher.run())
+
+async def _run_steps(app: FastAPI, steps) -> tuple:
+    """Runs startup steps in order. Returns (the steps that failed, their errors)."""
+    failed, errors = [], []
+    for name, step in steps:
+        phase = time.perf_counter()
+        try:
+            await step(app)
+        except Exception as e:
+            failed.append((name, step))
+            errors.append(f"{name}: {type(e).__name__}: {e}")
+        registry.record_phase(name, phase)
+    return failed, errors
+
+async def _retry_startup(app: FastAPI, failed):
+    """
+    Retries failed startup steps (e.g. the database was down at boot) until they
+    succeed, so /health/ready recovers without a restart.
+    """
+    delay = STARTUP_RETRY_INTERVAL
+    while failed:
+        await asyncio.sleep(delay)
+        failed, errors = await _run_steps(app, failed)
+        app.state.startup_errors = errors
+        if errors:
+            logger.warning("Startup steps still failing", extra={"errors": errors})
+        else:
+            logger.info("Startup completed after retrying")
+        delay = min(delay * 2, STARTUP_RETRY_MAX_INTERVAL)
+
+async def _warm_up():
+    async def hasher():
+        try:
+            await asyncio.to_thread(password_hasher.warm)
+        except Exception as e:
+            logger.warning("Password hasher warm-up failed: %s", e)
+
+    await asyncio.gather(registry.warm_up(["rag", "reminder"]), hasher())
 
-# Init Tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Nothing heavy happens at import time; it happens here, once the server owns
+    the event loop. Slow, optional work (embedding model, first Chroma query)
+    runs in the background so the process starts answering /health/live at once
+    and /health/ready flips when it is done. Steps that fail (database down) are
+    retried in the background; /health/ready reports them until they succeed.
+    """
+    started = time.perf_counter()
+    app.state.startup_errors = None
+    app.state.dispatch_task = None
 
-app = FastAPI(title="Medication Assistant", version="0.1.0")
+    email_worker = registry.get("email_worker")
+    email_worker.start()
+    password_hasher.start() # its processes are spawned by the warm-up
+
+    steps = [("create_tables", _create_tables)]
+    if DISPATCH_ENABLED:
+        steps.append(("dispatcher", _start_dispatcher))
+    failed, errors = await _run_steps(app, steps)
+    retry_task = asyncio.create_task(_retry_startup(app, failed)) if failed else None
+
+    warm_task = asyncio.create_task(_warm_up()) if SERVICE_WARMUP else None
+
+    for error in errors:
+        logger.error("Startup error: %s", error)
+    app.state.startup_errors = errors
+    registry.record_phase("startup", started)
+    logger.info("Startup profile (ms)", extra={"phases": registry.phases})
+
+    yield
+
+    for task in (warm_task, retry_task):
+        if task is not None and not task.done():
+            task.cancel()
+    if app.state.dispatch_task is not None:
+        registry.get("dispatcher").stop()
+        await app.state.dispatch_task
+    await asyncio.to_thread(email_worker.stop)
+    await asyncio.to_thread(registry.close_all)
+    await dispose_async_engine()
+    password_hasher.shutdown()
+
+app = FastAPI(title="Medication Assistant", version="0.1.0", lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -22,6 +141,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def route_template(request: Request) -> str:
+    """The matched route's path template, e.g. /api/v1/adherence/{user_id}."""
+    route = request.scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    if ":path}" in template:
+        return template
+    # Newer FastAPI keeps the include_router prefix out of route.path: recover it from the URL
+    path = request.url.path.rstrip("/") or "/"
+    prefix_segments = path.count("/") - template.count("/")
+    return "/".join(path.split("/")[:prefix_segments + 1]) + template if prefix_segments > 0 else template
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Request ID (from X-Request-ID or generated) on every log line, plus latency metrics."""
+    request_id = request.headers.get("x-request-id") or uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        # The route template, not the raw path, keeps label cardinality bounded
+        path = route_template(request)
+        HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+        HTTP_SECONDS.observe(elapsed, method=request.method, route=path)
+        logger.log(logging.DEBUG if path in QUIET_ROUTES else logging.INFO, "request", extra={
+            "method": request.method, "path": request.url.path, "status": status,
+            "duration_ms": round(elapsed * 1000, 2)
+        })
+        request_id_var.reset(token)
+
+@app.exception_handler(ServiceUnavailable)
+async def service_unavailable(request: Request, exc: ServiceUnavailable):
+    # e.g. Ollama or Chroma down; the service is rebuilt on the next request
+    return JSONResponse({"detail": f"Service '{exc}' is unavailable"}, status_code=503,
+                        headers={"Retry-After": "5"})
+
+app.include_router(health_router, prefix="/health", tags=["health"])
+app.include_router(metrics_router, tags=["metrics"])
 app.include_router(router, prefix="/api/v1")
 
 # Mount static files (Production Build)
@@ -39,4 +203,3 @@ def read_root(full_path: str):
     if os.path.exists("frontend/dist/index.html"):
         return FileResponse("frontend/dist/index.html")
     return {"message": "Frontend build not found. Run 'npm run build' in frontend/."}
-
@@ -0,0 +1,96 @@
+import datetime
+
+from sqlalchemy import inspect, text
+from backend.app.core.database import engine
+from backend.app.models.sql_models import reminder_end_date
+
+# create_all() never alters existing tables, so databases created before the
+# adherence uniqueness constraint existed need these (upgrade_schema() runs the
+# adherence ones at startup: the ON CONFLICT upserts depend on that index).
+ADHERENCE_UNIQUE_STATEMENTS = [
+    # Keep only the newest record per (reminder_id, date) before enforcing uniqueness
+    """
+    DELETE FROM adherence
+    WHERE id NOT IN (SELECT MAX(id) FROM adherence GROUP BY reminder_id, date)
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_adherence_reminder_date ON adherence (reminder_id, date)",
+]
+STATEMENTS = ADHERENCE_UNIQUE_STATEMENTS + [
+    "CREATE INDEX IF NOT EXISTS ix_reminders_user_id ON reminders (user_id)",
+]
+
+# Columns added to existing tables since they were first created: (table, column, SQL type).
+# Nullable, so they can be added on every backend (SQLite has no ADD COLUMN IF NOT EXISTS).
+ADDED_COLUMNS = [
+    ("reminders", "ends_on", "DATE"),
+    ("users", "timezone", "VARCHAR"),
+]
+
+def add_missing_columns(conn) -> list:
+    """Adds the ADDED_COLUMNS a table lacks; returns the (table, column) pairs added."""
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    added = []
+    for table, column, sql_type in ADDED_COLUMNS:
+        if table not in tables:
+            continue # create_all() builds it with every column
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+            added.append((table, column))
+    return added
+
+def ensure_adherence_unique(conn) -> bool:
+    """Creates the (reminder_id, date) unique index if adherence has no such index or constraint."""
+    inspector = inspect(conn)
+    if "adherence" not in inspector.get_table_names():
+        return False
+    unique = [c["column_names"] for c in inspector.get_unique_constraints("adherence")]
+    unique += [i["column_names"] for i in inspector.get_indexes("adherence") if i.get("unique")]
+    if any(sorted(columns) == ["date", "reminder_id"] for columns in unique):
+        return False
+    for statement in ADHERENCE_UNIQUE_STATEMENTS:
+        conn.execute(text(statement))
+    return True
+
+def backfill_reminder_end_dates(conn):
+    rows = conn.execute(text(
+        "SELECT id, created_at, duration FROM reminders WHERE ends_on IS NULL AND created_at IS NOT NULL"
+    )).all()
+    updated = 0
+    for reminder_id, created_at, duration in rows:
+        if isinstance(created_at, str): # SQLite hands raw DATETIME text back to text() queries
+            created_at = datetime.datetime.fromisoformat(created_at)
+        ends_on = reminder_end_date(created_at.date(), duration)
+        if ends_on:
+            conn.execute(text("UPDATE reminders SET ends_on = :ends_on WHERE id = :id"),
+                         {"ends_on": ends_on, "id": reminder_id})
+            updated += 1
+    return updated
+
+def upgrade_schema(bind=engine) -> list:
+    """
+    The part of the migration that is safe to run at every startup (the app's
+    lifespan does, right after create_all): missing columns, the ends_on backfill
+    when that column was just added, and the adherence (reminder_id, date) unique
+    index the upserts need (duplicate records are collapsed first, once).
+    Returns the columns added.
+    """
+    with bind.begin() as conn:
+        added = add_missing_columns(conn)
+        if ("reminders", "ends_on") in added:
+            backfill_reminder_end_dates(conn)
+        ensure_adherence_unique(conn)
+    return added
+
+def migrate():
+    with engine.begin() as conn:
+        for table, column in add_missing_columns(conn):
+            print(f"Added column {table}.{column}")
+        for statement in STATEMENTS:
+            print(f"Running: {' '.join(statement.split())}")
+            conn.execute(text(statement))
+        print(f"Backfilled ends_on for {backfill_reminder_end_dates(conn)} reminders.")
+    print("Migration complete.")
+
+if __name__ == "__main__":
+    migrate()
@@ -20,6 +20,48 @@ export const api = {
         return res.data;
     },
 
+    // Streams the answer over SSE, calling onToken for each chunk as it arrives.
+    chatStream: async (question, onToken) => {
+        const res = await fetch(`${API_BASE}/chat/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ question })
+        });
+        if (!res.ok || !res.body) throw new Error(`Chat failed: ${res.status}`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE events are separated by a blank line
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+
+                let event = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (event === 'done') return;
+                if (event === 'error') throw new Error(JSON.parse(data).detail);
+                onToken(JSON.parse(data).token);
+            }
+        }
+    },
+
+    // Autocomplete over drugs already in the library (local index, no openFDA call)
+    searchDrugs: async (query, fuzzy = true) => {
+        const res = await axios.get(`${API_BASE}/drugs/search`, { params: { q: query, fuzzy, limit: 8 } });
+        return res.data.results;
+    },
+
     ingest: async (drugName) => {
         try {
             const res = await axios.post(`${API_BASE}/ingest/${drugName}`);
@@ -37,6 +79,32 @@ export const api = {
         return res.data;
     },
 
+    // items: [{ drug_name, dosage_text }]. Calls onItem({ index, drug_name, status, schedule, error })
+    // for each medication as soon as its schedule is ready (NDJSON stream).
+    generateRemindersBatch: async (items, onItem) => {
+        const res = await fetch(`${API_BASE}/reminders/generate/batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ items })
+        });
+        if (!res.ok || !res.body) throw new Error(`Schedule generation failed: ${res.status}`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let newline;
+            while ((newline = buffer.indexOf('\n')) !== -1) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (line) onItem(JSON.parse(line));
+            }
+        }
+    },
+
     // Persistence
     addReminder: async (reminderData) => {
         const res = await axios.post(`${API_BASE}/reminders/add`, reminderData);
@@ -53,8 +121,21 @@ export const api = {
         return res.data;
     },
 
-    getAdherence: async (userId) => {
-        const res = await axios.get(`${API_BASE}/adherence/${userId}`);
+    // records: [{ reminder_id, date, status }], e.g. doses queued while offline
+    recordAdherenceBatch: async (records) => {
+        const res = await axios.post(`${API_BASE}/adherence/batch`, { records });
+        return res.data;
+    },
+
+    // range: optional { start, end } as 'YYYY-MM-DD'
+    getAdherence: async (userId, range = {}) => {
+        const res = await axios.get(`${API_BASE}/adherence/${userId}`, { params: range });
+        return res.data;
+    },
+
+    // Server-side rates per reminder and per day/week/month over a window
+    getAdherenceSummary: async (userId, { start, end, granularity = 'day' } = {}) => {
+        const res = await axios.get(`${API_BASE}/adherence/${userId}/summary`, { params: { start, end, granularity } });
         return res.data;
     },
 
@@ -62,5 +143,13 @@ export const api = {
     getPatients: async () => {
         const res = await axios.get(`${API_BASE}/users/patients`);
         return res.data;
+    },
+
+    // One page of patients with today's adherence; pass next_cursor back as afterId
+    getPatientRoster: async (afterId = null, limit = 50) => {
+        const params = { limit };
+        if (afterId !== null) params.after_id = afterId;
+        const res = await axios.get(`${API_BASE}/caregiver/patients`, { params });
+        return res.data;
     }
 };
@@ -16,11 +16,20 @@ const CalendarView = ({ adherenceData: propData }) => {
         if (!propData && user) {
             const fetchData = async () => {
                 try {
-                    const data = await api.getAdherence(user.id);
-                    // Convert array to map: { 'YYYY-MM-DD': 'status' }
-                    const map = data.reduce((acc, curr) => ({
+                    // Only the visible month, aggregated per day on the server
+                    const pad = (n) => String(n).padStart(2, '0');
+                    const year = currentDate.getFullYear();
+                    const month = currentDate.getMonth() + 1;
+                    const lastDay = new Date(year, month, 0).getDate();
+                    const summary = await api.getAdherenceSummary(user.id, {
+                        start: `${year}-${pad(month)}-01`,
+                        end: `${year}-${pad(month)}-${pad(lastDay)}`,
+                        granularity: 'day'
+                    });
+                    // Convert to map: { 'YYYY-MM-DD': 'full' | 'missed' | 'partial' }
+                    const map = summary.by_period.reduce((acc, day) => ({
                         ...acc,
-                        [curr.date]: curr.status
+                        [day.period]: day.taken === day.total ? 'full' : (day.taken === 0 && day.partial === 0 ? 'missed' : 'partial')
                     }), {});
                     setInternalData(map);
                 } catch (e) {
@@ -29,7 +38,7 @@ const CalendarView = ({ adherenceData: propData }) => {
             };
             fetchData();
         }
-    }, [user, propData]);
+    }, [user, propData, currentDate]);
 
 
     const getDaysInMonth = (date) => {
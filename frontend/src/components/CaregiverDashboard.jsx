@@ -7,16 +7,19 @@ import DoctorPatientView from './DoctorPatientView';
 const CaregiverDashboard = () => {
     const [patients, setPatients] = useState([]);
     const [selectedPatient, setSelectedPatient] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+
+    const fetchPatients = async (afterId = null) => {
+        try {
+            const page = await api.getPatientRoster(afterId);
+            setPatients(prev => afterId === null ? page.items : [...prev, ...page.items]);
+            setNextCursor(page.next_cursor);
+        } catch (e) {
+            console.error("Failed to load patients", e);
+        }
+    };
 
     useEffect(() => {
-        const fetchPatients = async () => {
-            try {
-                const data = await api.getPatients();
-                setPatients(data);
-            } catch (e) {
-                console.error("Failed to load patients", e);
-            }
-        };
         fetchPatients();
     }, []);
 
@@ -55,6 +58,12 @@ const CaregiverDashboard = () => {
                                 <div>
                                     <h3 style={{ margin: 0, fontSize: '1.1rem' }}>{patient.username}</h3>
                                     <span style={{ fontSize: '0.9rem', color: '#64748b' }}>Patient ID: #{patient.id}</span>
+                                    <div style={{ fontSize: '0.85rem', color: '#64748b', marginTop: '4px' }}>
+                                        <Activity size={12} style={{ marginRight: 4 }} />
+                                        Today: {patient.taken_doses_today}/{patient.expected_doses_today} doses
+                                        {' · '}{patient.active_reminders} active
+                                        {patient.last_missed && <span style={{ color: '#b91c1c' }}>{' · '}Last missed {patient.last_missed}</span>}
+                                    </div>
                                 </div>
                             </div>
                             <ChevronRight color="#cbd5e1" />
@@ -65,6 +74,11 @@ const CaregiverDashboard = () => {
                         <div style={{ color: '#64748b', fontStyle: 'italic' }}>No patients found.</div>
                     )}
                 </div>
+                {nextCursor !== null && (
+                    <button className="btn btn-secondary" style={{ marginTop: '20px' }} onClick={() => fetchPatients(nextCursor)}>
+                        Load more patients
+                    </button>
+                )}
             </div>
 
             {/* Modal for Patient View */}
@@ -23,9 +23,21 @@ const Chat = () => {
         setInput('');
         setLoading(true);
 
+        let started = false;
         try {
-            const res = await api.chat(userMsg.text);
-            setMessages(prev => [...prev, { role: 'system', text: res.answer }]);
+            await api.chatStream(userMsg.text, (token) => {
+                if (!started) {
+                    // First token: swap the "Typing..." indicator for the answer bubble
+                    started = true;
+                    setLoading(false);
+                    setMessages(prev => [...prev, { role: 'system', text: token }]);
+                    return;
+                }
+                setMessages(prev => {
+                    const last = prev[prev.length - 1];
+                    return [...prev.slice(0, -1), { ...last, text: last.text + token }];
+                });
+            });
         } catch (e) {
             setMessages(prev => [...prev, { role: 'system', text: "Error: Could not reach assistant." }]);
         } finally {
@@ -16,8 +16,8 @@ const Dashboard = () => {
             // 1. Get Reminders (The Plan)
             const reminders = await api.getReminders(user.id);
 
-            // 2. Get Adherence (The History)
-            const adherenceHistory = await api.getAdherence(user.id);
+            // 2. Get Adherence (only today's records are needed here)
+            const adherenceHistory = await api.getAdherence(user.id, { start: todayStr, end: todayStr });
 
             // 3. Filter for Today's Status
             const todayStatusMap = {}; // { reminderId: 'taken' | 'missed' }
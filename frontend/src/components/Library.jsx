@@ -9,9 +9,26 @@ const Library = () => {
     const [results, setResults] = useState(null);
     const [loading, setLoading] = useState(false);
     const [selectedDrug, setSelectedDrug] = useState(null);
+    const [suggestions, setSuggestions] = useState([]);
+
+    // Suggest drugs that are already ingested while the user types
+    React.useEffect(() => {
+        if (!query.trim()) { setSuggestions([]); return; }
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const names = await api.searchDrugs(query);
+                if (!cancelled) setSuggestions(names);
+            } catch (e) {
+                if (!cancelled) setSuggestions([]);
+            }
+        }, 150);
+        return () => { cancelled = true; clearTimeout(timer); };
+    }, [query]);
 
     const handleSearch = async () => {
         if (!query) return;
+        setSuggestions([]);
         setLoading(true);
         setResults(null);
 
@@ -63,6 +80,23 @@ const Library = () => {
                 </button>
             </div>
 
+            {suggestions.length > 0 && (
+                <div className="card" style={{ marginTop: '-20px', marginBottom: '30px', padding: '8px 0' }}>
+                    {suggestions.map((s) => (
+                        <div
+                            key={`${s.kind}:${s.name}`}
+                            onClick={() => { setSuggestions([]); setSelectedDrug(s.name); }}
+                            style={{ padding: '8px 24px', cursor: 'pointer', display: 'flex', justifyContent: 'space-between' }}
+                        >
+                            <span>{s.name}</span>
+                            <span style={{ color: '#8b949e', fontSize: '13px' }}>
+                                {s.kind === 'brand' && s.generic_name ? s.generic_name : s.kind}
+                            </span>
+                        </div>
+                    ))}
+                </div>
+            )}
+
             <div className="results-grid" style={{ display: 'grid', gridTemplateColumns: 'repeat(auto-fill, minmax(280px, 1fr))', gap: '20px' }}>
                 {results === null && (
                     <div style={{ textAlign: 'center', gridColumn: '1/-1', color: '#8b949e', padding: '40px' }}>
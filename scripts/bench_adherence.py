@@ -0,0 +1,105 @@
+import sys
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import datetime
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Requests/sec for concurrent adherence traffic, in-process (one worker):
+# the async routes vs. the previous threadpool-bound sync handlers, on the
+# database in DATABASE_URL (a throwaway SQLite file unless --database-url is given).
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent adherence traffic against the persistence routes.")
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite file")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--read-ratio", type=float, default=0.5, help="Share of summary reads vs. writes")
+    return parser.parse_args()
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_adherence.db")
+os.environ.setdefault("EMAIL_OUTBOX_PATH", "")
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session
+
+from backend.app.core.database import Base, SessionLocal, engine, get_db, pool_stats
+from backend.app.models.sql_models import Adherence, Reminder, User
+from backend.app.api import endpoints
+from backend.app.services.adherence_service import upsert_adherence
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(endpoints.router)
+
+    # The pre-async handlers, kept here as the baseline
+    @app.post("/sync/adherence")
+    def record_adherence_sync(record: endpoints.AdherenceCreate, db: Session = Depends(get_db)):
+        upsert_adherence(db, [{"reminder_id": record.reminder_id, "date": datetime.date.fromisoformat(record.date),
+                               "status": record.status}])
+        db.commit()
+        return {"success": True}
+
+    @app.get("/sync/adherence/{user_id}")
+    def get_adherence_sync(user_id: int, db: Session = Depends(get_db)):
+        return db.query(Adherence).join(Reminder).filter(Reminder.user_id == user_id).limit(100).all()
+
+    return app
+
+def seed(n_users: int) -> int:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.bulk_insert_mappings(User, [{"id": i + 1, "username": f"bench{i + 1}", "role": "patient"} for i in range(n_users)])
+    db.bulk_insert_mappings(Reminder, [{"id": i + 1, "user_id": i + 1, "drug_name": "drug", "times": ["08:00"]}
+                                       for i in range(n_users)])
+    db.commit()
+    db.close()
+    return n_users
+
+async def run(app: FastAPI, prefix: str, n_users: int) -> float:
+    rng = random.Random(1)
+    today = datetime.date.today()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            user = rng.randint(1, n_users)
+            async with semaphore:
+                if rng.random() < args.read_ratio:
+                    response = await client.get(f"{prefix}/adherence/{user}")
+                else:
+                    day = today - datetime.timedelta(days=rng.randint(0, 29))
+                    response = await client.post(f"{prefix}/adherence", json={
+                        "reminder_id": user, "date": day.isoformat(), "status": rng.choice(["taken", "missed"])
+                    })
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        return time.perf_counter() - start
+
+def main():
+    app = build_app()
+    n_users = seed(args.users)
+    print(f"Database: {os.environ['DATABASE_URL']}")
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.read_ratio:.0%} reads")
+    for label, prefix in (("sync (threadpool)", "/sync"), ("async", "")):
+        elapsed = asyncio.run(run(app, prefix, n_users))
+        print(f"{label:<18} {args.requests / elapsed:8.0f} req/s")
+    print(f"Pool: {pool_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Prompt size and time-to-first-token: the previous prompt assembly (top-3
+# chunks verbatim via format_docs) vs. the ContextBuilder (over-retrieve, MMR,
+# merge neighbouring chunks, fit a token budget), on the same questions over the
+# same store. Also checks that the fact each question asks about still reaches
+# the prompt. By default the LLM is the fake model with a simulated prefill cost
+# per prompt token; --ollama MODEL measures a real model instead. --layout legacy
+# stores the chunks as written before deduplication (drug name in every chunk,
+# 200-character overlap, one copy per label), as in a store not yet re-ingested.
+
+WORK_DIR = tempfile.mkdtemp(prefix="medbench-context-")
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["FDA_CACHE_PATH"] = ""
+os.environ["DRUG_INDEX_PATH"] = os.path.join(WORK_DIR, "drug_index.json")
+os.environ["CHUNK_STORE_PATH"] = os.path.join(WORK_DIR, "chunk_store.sqlite3")
+os.environ.setdefault("CONTEXT_BUILDER", "1") # the chain over-retrieves for the builder
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from backend.app.services.rag_service import RAGService, build_label_documents, format_docs
+from backend.app.services.retrieval import HybridRetriever
+from scripts.bench_fakes import FakeChatModel, HashingEmbeddings, legacy_label_documents, synthetic_families
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+async def first_token_seconds(rag: RAGService, context: str, question: str) -> float:
+    start = time.perf_counter()
+    async for _token in rag.answer_chain.astream({"context": context, "question": question}):
+        return time.perf_counter() - start
+    return time.perf_counter() - start
+
+async def measure(rag: RAGService, contexts, questions) -> dict:
+    tokens, ttft, found = [], [], 0
+    for context, (question, _drug, _section, fact) in zip(contexts, questions):
+        tokens.append(rag.context_builder.count_tokens(rag.prompt.format(context=context, question=question)))
+        ttft.append(await first_token_seconds(rag, context, question))
+        found += fact in context
+    return {
+        "avg_prompt_tokens": round(sum(tokens) / len(tokens), 1),
+        "ttft_p50_ms": round(percentile(ttft, 50) * 1000, 1),
+        "ttft_p99_ms": round(percentile(ttft, 99) * 1000, 1),
+        "fact_in_context": round(found / len(questions), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens and time-to-first-token: top-3 verbatim vs. ContextBuilder.")
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--variants", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=120)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=1.0,
+                        help="Simulated prompt evaluation cost of the fake model")
+    parser.add_argument("--ollama", metavar="MODEL", help="Measure a real Ollama model instead of the fake one")
+    parser.add_argument("--layout", choices=("dedup", "legacy"), default="dedup", help="How the labels are chunked")
+    args = parser.parse_args()
+
+    if args.ollama:
+        from langchain_community.chat_models import ChatOllama
+        llm = ChatOllama(model=args.ollama)
+    else:
+        llm = FakeChatModel(prefill_per_token=args.prefill_ms_per_token / 1000)
+    rag = RAGService(persist_directory=os.path.join(WORK_DIR, "chroma"), embeddings=HashingEmbeddings(), llm=llm)
+
+    labels, questions = synthetic_families(args.families, args.variants)
+    legacy_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    for label in labels:
+        if args.layout == "legacy":
+            docs = legacy_label_documents(label, label.brand_name, legacy_splitter)
+            rag.vectorstore.add_documents(docs, ids=[doc.id for doc in docs])
+        else:
+            rag.upsert_documents(build_label_documents(label, label.brand_name, rag.text_splitter))
+    questions = questions[:args.questions]
+
+    top3 = HybridRetriever(vectorstore=rag.vectorstore, index=rag.lexical_index, k=3)
+    before_contexts = [format_docs(top3.invoke(q[0])) for q in questions]
+    start = time.perf_counter()
+    after_contexts = [rag.context_builder.build(rag.retriever.invoke(q[0]), q[0])[0] for q in questions]
+    build_ms = (time.perf_counter() - start) * 1000 / len(questions)
+
+    before = asyncio.run(measure(rag, before_contexts, questions))
+    after = asyncio.run(measure(rag, after_contexts, questions))
+    print(f"{len(questions)} questions over {len(labels)} labels ({args.layout} chunks); budget {rag.context_builder.budget} tokens")
+    print(f"Top-3 verbatim:  {before}")
+    print(f"Context builder: {after} (retrieve + build {build_ms:.1f} ms/question)")
+    print(f"Prompt tokens {before['avg_prompt_tokens'] / after['avg_prompt_tokens']:.2f}x fewer, "
+          f"TTFT p50 {before['ttft_p50_ms']:.0f} -> {after['ttft_p50_ms']:.0f} ms")
+
+if __name__ == "__main__":
+    main()
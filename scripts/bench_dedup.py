@@ -0,0 +1,142 @@
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Measures what structure-aware splitting plus cross-label deduplication saves at
+# ingest: embedding calls and vector store size, against the previous layout
+# (drug name in every chunk, RecursiveCharacterTextSplitter 1000/200, one copy per
+# label). Both stores are queried with the same fixed question set through the
+# same hybrid retriever, so any retrieval regression shows up as lower recall.
+#
+# The default corpus is synthetic: families of store-brand labels that repeat one
+# generic's text, some with a word changed (near-duplicates) or an extra
+# subsection. --file runs on real openFDA data (.json or .zip) instead.
+
+WORK_DIR = tempfile.mkdtemp(prefix="medbench-dedup-")
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["FDA_CACHE_PATH"] = ""
+os.environ["DRUG_INDEX_PATH"] = os.path.join(WORK_DIR, "drug_index.json")
+os.environ["CHUNK_STORE_PATH"] = os.path.join(WORK_DIR, "chunk_store.sqlite3")
+
+from langchain_chroma import Chroma
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from backend.app.services.fda_client import label_to_drug_info
+from backend.app.services.rag_service import RAGService, build_label_documents
+from backend.app.services.retrieval import HybridRetriever, LexicalIndex
+from scripts.bench_fakes import (QUESTIONS, SECTIONS, FakeChatModel, HashingEmbeddings, legacy_label_documents,
+                                 synthetic_families)
+from scripts.ingest_offline import iter_results, iter_sources
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self, dim: int = 384):
+        super().__init__(dim)
+        self.documents_embedded = 0
+
+    def embed_documents(self, texts):
+        self.documents_embedded += len(texts)
+        return super().embed_documents(texts)
+
+# --- Corpus ---
+
+def file_corpus(path: str, limit: int, seed: int = 5):
+    """(labels, questions) from openFDA data; a hit is any chunk of the right drug and section."""
+    rng = random.Random(seed)
+    labels, questions = [], []
+    for _source, opener in iter_sources(path):
+        with opener() as f:
+            for item in iter_results(f):
+                info = label_to_drug_info(item)
+                name = info.brand_name or info.generic_name
+                if not name:
+                    continue
+                info.brand_name = name
+                labels.append(info)
+                section, template = rng.choice(list(QUESTIONS.items()))
+                if getattr(info, SECTIONS[section]):
+                    questions.append((template.format(name), (info.generic_name or name).lower(), section, None))
+                if len(labels) >= limit:
+                    return labels, questions
+    return labels, questions
+
+# --- Stores ---
+
+def build_legacy(labels) -> dict:
+    embeddings = CountingEmbeddings()
+    store = Chroma(persist_directory=os.path.join(WORK_DIR, "legacy"), embedding_function=embeddings,
+                   collection_name="drug_labels")
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    start = time.perf_counter()
+    for label in labels:
+        docs = legacy_label_documents(label, label.brand_name, splitter)
+        if docs:
+            store.add_documents(docs, ids=[doc.id for doc in docs])
+    elapsed = time.perf_counter() - start
+    return {"store": store, "retriever": HybridRetriever(vectorstore=store, index=LexicalIndex(), k=3),
+            "embedded": embeddings.documents_embedded, "size": store._collection.count(), "seconds": elapsed}
+
+def build_deduplicated(labels) -> dict:
+    embeddings = CountingEmbeddings()
+    rag = RAGService(persist_directory=os.path.join(WORK_DIR, "dedup"), embeddings=embeddings, llm=FakeChatModel())
+    start = time.perf_counter()
+    for label in labels:
+        rag.upsert_documents(build_label_documents(label, label.brand_name, rag.text_splitter))
+    elapsed = time.perf_counter() - start
+    # k=3 like the legacy side (the service itself over-retrieves for the context builder)
+    retriever = HybridRetriever(vectorstore=rag.vectorstore, index=rag.lexical_index, k=3)
+    return {"rag": rag, "retriever": retriever, "embedded": embeddings.documents_embedded,
+            "size": rag.vectorstore._collection.count(), "seconds": elapsed, "stats": dict(rag.ingest_stats)}
+
+def recall(retriever, questions) -> float:
+    hits = 0
+    for question, drug, section, fact in questions:
+        for doc in retriever.invoke(question):
+            meta = doc.metadata
+            names = {(meta.get("generic_name") or "").lower(), (meta.get("drug_name") or "").lower()}
+            if drug in names and meta.get("section") == section and (fact is None or fact in doc.page_content):
+                hits += 1
+                break
+    return hits / len(questions) if questions else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding calls, collection size and recall: legacy vs. deduplicated chunks.")
+    parser.add_argument("--families", type=int, default=40, help="Synthetic generics")
+    parser.add_argument("--variants", type=int, default=8, help="Store-brand labels per generic")
+    parser.add_argument("--file", help="Use openFDA label data (.json or .zip) instead of the synthetic corpus")
+    parser.add_argument("--limit", type=int, default=2000, help="Labels to read from --file")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if recall drops below the legacy layout")
+    args = parser.parse_args()
+
+    if args.file:
+        labels, questions = file_corpus(args.file, args.limit)
+    else:
+        labels, questions = synthetic_families(args.families, args.variants)
+    print(f"Corpus: {len(labels)} labels, {len(questions)} questions (work dir {WORK_DIR})")
+
+    legacy = build_legacy(labels)
+    dedup = build_deduplicated(labels)
+    legacy_recall = recall(legacy["retriever"], questions)
+    dedup_recall = recall(dedup["retriever"], questions)
+
+    stats = dedup["stats"]
+    print(f"Legacy:       {legacy['embedded']} embedding calls, {legacy['size']} vectors, "
+          f"ingest {legacy['seconds']:.2f}s, recall@3 {legacy_recall:.3f}")
+    print(f"Deduplicated: {dedup['embedded']} embedding calls, {dedup['size']} vectors, "
+          f"ingest {dedup['seconds']:.2f}s, recall@3 {dedup_recall:.3f}")
+    print(f"  {stats['chunks']} chunks: {stats['duplicates']} exact and {stats['near_duplicates']} "
+          f"near-duplicates shared across labels")
+    print(f"Reduction: {legacy['embedded'] / max(dedup['embedded'], 1):.2f}x embedding calls, "
+          f"{legacy['size'] / max(dedup['size'], 1):.2f}x collection size")
+
+    if args.check and dedup_recall < legacy_recall:
+        print("FAILED: recall dropped")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.app.services.dosage_parser import DOSAGE_PARSER_MIN_CONFIDENCE, parse_dosage
+
+# Used when no openFDA bulk files are available
+SAMPLE_TEXTS = [
+    "Take 500 mg twice daily with meals.",
+    "One tablet once a day.",
+    "Take 1 capsule every 8 hours.",
+    "500 mg three times daily",
+    "Apply one patch once weekly.",
+    "Take two tablets at bedtime.",
+    "2 puffs every 4 to 6 hours as needed.",
+    "adults and children 12 years and over: take 2 caplets every 6 hours while symptoms last. "
+    "do not take more than 6 caplets in 24 hours. children under 12 years: ask a doctor",
+    "The recommended initial dose is 10 mg once daily. Titrate to 40 mg as needed.",
+    "Dosing should be individualized based on renal function.",
+    # Limits, tapers and as-needed dosing must not pass as fixed schedules
+    "Take 2 tablets by mouth. Do not exceed 4 doses daily.",
+    "1 tablet daily for 3 days then 2 tablets daily.",
+    "Take 1 tablet every 4 to 6 hours as needed for pain.",
+    "Take 1 capsule twice daily; not to exceed 4 capsules daily.",
+    # Counts written as digits, and count ranges
+    "Take 1 tablet 3 times daily.",
+    "Take 1 capsule 2 times daily with food.",
+    "Apply a thin layer to the affected area 3 or 4 times daily.",
+]
+
+# (text, expected times, passes the threshold): checked before timing so a parser
+# change that turns these into wrong fast-path schedules fails the run
+REGRESSION_CASES = [
+    ("take 1 tablet 3 times daily", ["08:00", "14:00", "20:00"], True),
+    ("take 1 capsule 2 times daily with food", ["08:00", "20:00"], True),
+    ("take 1 tablet 4x per day", ["08:00", "12:00", "16:00", "20:00"], True),
+    ("take 2 tablets daily", ["08:00"], True),
+    ("apply to the affected area 3 or 4 times daily", None, False),
+    ("take 1 tablet 2 to 3 times a day", None, False),
+    ("take 2 tablets by mouth. do not exceed 4 doses daily.", None, False),
+    ("1 tablet daily for 3 days then 2 tablets daily.", None, False),
+]
+
+def check_regressions(min_confidence: float) -> int:
+    failures = 0
+    for text, expected_times, fast_path in REGRESSION_CASES:
+        schedule, confidence = parse_dosage("bench", text)
+        ok = (confidence >= min_confidence) == fast_path
+        if expected_times is not None:
+            ok = ok and schedule["times"] == expected_times
+        if not ok:
+            failures += 1
+            print(f"REGRESSION: {text!r} -> times={schedule['times']} confidence={confidence}")
+    return failures
+
+def load_texts(data_dir: str, limit: int):
+    """dosage_and_administration strings from the openFDA bulk files in data_dir."""
+    from scripts.ingest_offline import load_data_files, iter_sources, iter_results
+
+    texts = []
+    for file_name in load_data_files(data_dir):
+        for _name, opener in iter_sources(os.path.join(data_dir, file_name)):
+            with opener() as f:
+                for item in iter_results(f):
+                    value = item.get("dosage_and_administration")
+                    if isinstance(value, list):
+                        value = "\n".join(value)
+                    if value:
+                        texts.append(value)
+                    if len(texts) >= limit:
+                        return texts
+    return texts
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def report(label, latencies):
+    if not latencies:
+        return
+    ms = [x * 1000 for x in latencies]
+    print(f"{label:<12} n={len(ms):<6} mean={statistics.mean(ms):.3f}ms "
+          f"p50={percentile(ms, 50):.3f}ms p99={percentile(ms, 99):.3f}ms")
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Benchmark the rule-based dosage parser against label text.")
+    parser.add_argument("--data-dir", default=os.path.join(base_dir, 'data'))
+    parser.add_argument("--limit", type=int, default=5000, help="Max dosage texts to read")
+    parser.add_argument("--min-confidence", type=float, default=DOSAGE_PARSER_MIN_CONFIDENCE)
+    parser.add_argument("--with-llm", type=int, default=0, metavar="N",
+                        help="Also time N low-confidence texts through ReminderService (needs Ollama)")
+    args = parser.parse_args()
+
+    failures = check_regressions(args.min_confidence)
+    if failures:
+        print(f"{failures} regression case(s) failed")
+        sys.exit(1)
+
+    texts = load_texts(args.data_dir, args.limit) if os.path.isdir(args.data_dir) else []
+    if not texts:
+        print("No openFDA files found; using built-in samples.")
+        texts = SAMPLE_TEXTS
+
+    hits, misses = [], []
+    fast, slow = [], []
+    for text in texts:
+        start = time.perf_counter()
+        _schedule, confidence = parse_dosage("bench", text)
+        elapsed = time.perf_counter() - start
+        if confidence >= args.min_confidence:
+            hits.append(text)
+            fast.append(elapsed)
+        else:
+            misses.append(text)
+            slow.append(elapsed)
+
+    print(f"Texts: {len(texts)}  fast-path hit rate: {len(hits) / len(texts):.1%} "
+          f"(threshold {args.min_confidence})")
+    report("parser hit", fast)
+    report("parser miss", slow)
+
+    if args.with_llm and misses:
+        from backend.app.services.reminder_service import ReminderService
+
+        service = ReminderService(min_confidence=args.min_confidence)
+        llm = []
+        for text in misses[:args.with_llm]:
+            start = time.perf_counter()
+            service.generate_schedule("bench", text)
+            llm.append(time.perf_counter() - start)
+        report("llm", llm)
+
+if __name__ == "__main__":
+    main()
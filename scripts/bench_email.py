@@ -0,0 +1,112 @@
+import sys
+import os
+import time
+import socket
+import smtplib
+import argparse
+import threading
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.app.services.email_delivery import EmailDeliveryWorker, EmailOutbox
+from backend.app.services.email_service import format_prescription_email
+
+# Measures email delivery throughput against a local aiosmtpd server
+# (pip install aiosmtpd): per-message connections (the old send_email path)
+# vs. the queued worker with pooled connections. Also checks that refused
+# recipients are dead-lettered rather than retried.
+
+class CountingHandler:
+    def __init__(self, reject_domain: str):
+        self.reject_domain = reject_domain
+        self.received = 0
+        self.lock = threading.Lock()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith("@" + self.reject_domain):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.received += 1
+        return "250 Message accepted for delivery"
+
+def make_message(i: int, domain: str = "example.com") -> dict:
+    body = format_prescription_email(f"patient{i}", "Amoxicillin", "500 mg", "twice daily", ["08:00", "20:00"])
+    return {"to": f"patient{i}@{domain}", "subject": "New Prescription Added - MedCare", "body": body}
+
+def bench_per_message(host: str, port: int, n: int) -> float:
+    """One connection per email, as send_email() does (without STARTTLS / login)."""
+    start = time.perf_counter()
+    for i in range(n):
+        message = make_message(i)
+        server = smtplib.SMTP(host, port)
+        server.sendmail("medcare@localhost", message["to"], message["body"])
+        server.quit()
+    return time.perf_counter() - start
+
+def bench_worker(host: str, port: int, n: int, workers: int, batch_size: int, rejected: int):
+    outbox = EmailOutbox("")
+    worker = EmailDeliveryWorker(outbox, host=host, port=port, user=None, password=None, starttls=False,
+                                 workers=workers, batch_size=batch_size, mock=False)
+    messages = [make_message(i) for i in range(n)] + [make_message(i, "rejected.test") for i in range(rejected)]
+    start = time.perf_counter()
+    worker.enqueue_many(messages)
+    worker.start()
+    while True:
+        counts = outbox.counts()
+        if counts["pending"] == 0 and counts["sending"] == 0:
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    worker.stop()
+    return elapsed, worker.metrics()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Email delivery throughput against a local SMTP stand-in.")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--baseline", type=int, default=200, help="Messages for the per-connection baseline")
+    args = parser.parse_args()
+
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("aiosmtpd is required: pip install aiosmtpd")
+        return
+
+    handler = CountingHandler(reject_domain="rejected.test")
+    host, port = "127.0.0.1", free_port()
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+    try:
+        if args.baseline:
+            elapsed = bench_per_message(host, port, args.baseline)
+            print(f"Per-message connections: {args.baseline} in {elapsed:.2f}s "
+                  f"({args.baseline / elapsed:.0f} msg/s)")
+
+        before = handler.received
+        rejected = 5
+        elapsed, metrics = bench_worker(host, port, args.messages, args.workers, args.batch_size, rejected)
+        delivered = handler.received - before
+        print(f"Pooled worker ({args.workers} connections, batches of {args.batch_size}): "
+              f"{delivered} in {elapsed:.2f}s ({delivered / elapsed:.0f} msg/s)")
+        print(f"Metrics: {metrics}")
+        if delivered != args.messages or metrics["dead_letters"] != rejected:
+            print("FAILED: expected every message delivered and every refused recipient dead-lettered")
+            sys.exit(1)
+        print("OK")
+    finally:
+        controller.stop()
+
+if __name__ == "__main__":
+    main()
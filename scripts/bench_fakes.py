@@ -0,0 +1,202 @@
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from backend.app.models.schemas import DrugInfo
+
+# Deterministic stand-ins for Ollama, so the benchmark suite runs on any box
+# and two runs on the same machine measure the same work.
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words, L2-normalized. Deterministic and cheap, yet texts
+    sharing words land near each other, so retrieval behaves like retrieval.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class FakeChatModel(BaseChatModel):
+    """
+    Answers every prompt with the same text after a fixed delay, standing in for
+    generation time, plus prefill_per_token for every (estimated) prompt token.
+    With json_schedule=True it answers a valid reminder schedule.
+    """
+
+    latency: float = 0.0 # seconds per call
+    prefill_per_token: float = 0.0 # seconds per prompt token (CPU prompt evaluation)
+    json_schedule: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, messages) -> str:
+        if self.json_schedule:
+            return json.dumps({"drug": "benchmark", "dosage": "1 tablet", "times": ["09:00", "21:00"],
+                               "instructions": "Take with food"})
+        prompt = messages[-1].content if messages else ""
+        return f"Based on the label ({len(prompt)} characters of context): see the Warnings section."
+
+    def _delay(self, messages) -> float:
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        return self.latency + self.prefill_per_token * prompt_chars / 4
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self._delay(messages):
+            time.sleep(self._delay(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        if self._delay(messages):
+            await asyncio.sleep(self._delay(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+# --- Synthetic label corpus ---
+
+SECTION_WORDS = {
+    "purpose": "indicated treatment relief pain fever hypertension infection adults pediatric patients "
+               "management symptoms chronic acute therapy adjunct diet exercise control".split(),
+    "warnings": "warning liver damage bleeding allergic reaction stomach ulcer alcohol pregnancy overdose "
+                "kidney heart attack stroke risk discontinue consult physician severe rash".split(),
+    "dosage_instructions": "take tablet capsule mg daily twice once every hours food water bedtime "
+                           "maximum dose adults children exceed do not swallow whole morning".split(),
+    "adverse_reactions": "nausea headache dizziness diarrhea rash fatigue insomnia vomiting constipation "
+                         "dry mouth cough edema palpitations reported clinical trials incidence".split(),
+}
+
+def synthetic_labels(count: int, seed: int = 7, min_words: int = 80, max_words: int = 600) -> List[DrugInfo]:
+    """count reproducible labels with section lengths typical of openFDA (a few hundred words)."""
+    rng = random.Random(seed)
+    labels = []
+    for i in range(count):
+        fields = {
+            field: " ".join(rng.choice(words) for _ in range(rng.randint(min_words, max_words))) + "."
+            for field, words in SECTION_WORDS.items()
+        }
+        labels.append(DrugInfo(brand_name=f"Benchdrug{i}", generic_name=f"benchgeneric{i % max(1, count // 4)}",
+                               set_id=f"bench-{seed}-{i}", version="1", **fields))
+    return labels
+
+def synthetic_questions(labels: List[DrugInfo], count: int, seed: int = 11) -> List[str]:
+    """count distinct (topic, drug) questions, so none is answered from the exact-match cache."""
+    rng = random.Random(seed)
+    topics = ["What are the warnings for {}?", "What side effects does {} have?", "How should I take {}?",
+              "What is {} used for?", "What is the maximum dose of {}?", "Can {} cause liver damage?"]
+    pairs = [(topic, label.brand_name) for topic in topics for label in labels]
+    rng.shuffle(pairs)
+    return [topic.format(name) for topic, name in pairs[:count]]
+
+# --- Store-brand label families (structured, with facts to retrieve) ---
+
+SECTIONS = {
+    "Indications & Usage": "purpose",
+    "Warnings": "warnings",
+    "Dosage & Administration": "dosage_instructions",
+    "Adverse Reactions": "adverse_reactions",
+}
+SUBSECTION_TITLES = ["General Information", "Recommended Use", "Special Populations", "Monitoring",
+                     "Hepatic Impairment", "Renal Impairment", "Use in Children"]
+QUESTIONS = {
+    "Indications & Usage": "What is {} used for?",
+    "Warnings": "What are the warnings for {}?",
+    "Dosage & Administration": "What is the maximum dose of {}?",
+}
+
+def _sentences(rng: random.Random, words, count: int) -> str:
+    return " ".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        for _ in range(count)
+    )
+
+def synthetic_families(families: int, variants: int, seed: int = 5):
+    """
+    (labels, questions). Every family shares one generic's label text across
+    `variants` store brands; each question carries a fact that only the right
+    family's chunk contains.
+    """
+    rng = random.Random(seed)
+    labels, questions = [], []
+    for f in range(families):
+        generic = f"benchgeneric{f}"
+        facts = {
+            "Indications & Usage": f"{generic.capitalize()} is indicated for the relief of condition{f}.",
+            "Warnings": f"Stop use and ask a doctor if symptom{f} occurs.",
+            "Dosage & Administration": f"The maximum dose is {100 + 25 * f} mg per day.",
+        }
+        # Numbered subsections as in openFDA label text; the fact sits in one of them
+        base = {}
+        for s, (section, field) in enumerate(SECTIONS.items(), start=1):
+            subsections = []
+            for j in range(1, rng.randint(3, 5) + 1):
+                title = rng.choice(SUBSECTION_TITLES)
+                subsections.append(f"{s}.{j} {title} " + _sentences(rng, SECTION_WORDS[field], rng.randint(3, 8)))
+            if section in facts:
+                k = rng.randrange(len(subsections))
+                subsections[k] += " " + facts[section]
+            base[field] = subsections
+
+        for v in range(variants):
+            fields = {field: list(subs) for field, subs in base.items()}
+            roll = rng.random()
+            if v and roll < 0.4:
+                # Near-duplicate: one word changed in one subsection
+                field = rng.choice(list(fields))
+                k = rng.randrange(len(fields[field]))
+                words = fields[field][k].split(" ")
+                i = rng.randrange(3, len(words) - 1)
+                words[i] = rng.choice(SECTION_WORDS[field])
+                fields[field][k] = " ".join(words)
+            elif v and roll < 0.6:
+                # An extra subsection only this label has
+                field = rng.choice(list(fields))
+                fields[field].append(f"9.{v} Additional Information " + _sentences(rng, SECTION_WORDS[field], 4))
+            brand = f"Shopbrand{v}x{f}"
+            labels.append(DrugInfo(brand_name=brand, generic_name=generic, set_id=f"dedup-{f}-{v}", version="1",
+                                   **{field: " ".join(subs) for field, subs in fields.items()}))
+            for section, template in QUESTIONS.items():
+                questions.append((template.format(brand), generic, section, facts[section]))
+    return labels, questions
+
+def legacy_label_documents(drug_info: DrugInfo, drug_name: str, splitter) -> list:
+    """The chunk layout before deduplication: drug name in every chunk, overlapping splits, per-label ids."""
+    set_id = drug_info.set_id or f"name:{drug_name.lower()}"
+    base = {k: v for k, v in {"drug_name": drug_name, "generic_name": drug_info.generic_name,
+                              "set_id": set_id, "version": drug_info.version}.items() if v is not None}
+    documents = []
+    for section, field in SECTIONS.items():
+        content = getattr(drug_info, field)
+        if content:
+            full_content = f"Drug: {drug_name}\nSection: {section}\nContent: {content}"
+            for doc in splitter.create_documents([full_content], metadatas=[{**base, "section": section}]):
+                doc.id = hashlib.sha256(f"{set_id}|{section}|{doc.page_content}".encode("utf-8")).hexdigest()[:32]
+                documents.append(doc)
+    return documents
@@ -0,0 +1,135 @@
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# FDAClient.search_drug answered from the local label store vs. the previous
+# best case, a warm on-disk response cache (a cold cache is a network round
+# trip). The API is an http.server stand-in on an ephemeral local port that
+# serves the same labels, so a cold lookup costs a local round trip rather than
+# an internet one (a lower bound on the real API). Also times the build and full-text
+# search over section text (a worst case on the synthetic labels, which all share
+# one small vocabulary). --file loads a real openFDA file (.json or .zip)
+# instead of the synthetic labels.
+
+WORK_DIR = tempfile.mkdtemp(prefix="medbench-labels-")
+
+from backend.app.services.fda_client import FDAClient, ResponseCache
+from backend.app.services.label_store import LabelStore
+from scripts.ingest_offline import iter_results, iter_sources
+
+WORDS = ["tablet", "dose", "hepatic", "renal", "pregnancy", "nausea", "headache", "rash", "children", "daily",
+         "hypertension", "infection", "pain", "fever", "bleeding", "dizziness", "overdose", "alcohol"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def synthetic_records(count: int, seed: int = 9):
+    """openFDA-shaped labels; every fifth set_id also has an older version."""
+    rng = random.Random(seed)
+    text = lambda n: " ".join(rng.choice(WORDS) for _ in range(n)) + "."
+    for i in range(count):
+        versions = (1, 2) if i % 5 == 0 else (1,)
+        for version in versions:
+            yield {
+                "set_id": f"set-{i}", "version": str(version), "effective_time": f"2024{version:02d}01",
+                "openfda": {"brand_name": [f"Brand{i} Extra Strength" if i % 3 == 0 else f"Brand{i}"],
+                            "generic_name": [f"generic{i // 4}"]},
+                "indications_and_usage": [text(60)], "warnings": [text(200)],
+                "dosage_and_administration": [text(120)], "adverse_reactions": [text(150)],
+            }
+
+def serve_labels(by_name):
+    """openFDA stand-in on an ephemeral port: label lookups by exact brand name, 404 otherwise."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            search = parse_qs(urlparse(self.path).query).get("search", [""])[0]
+            record = by_name.get(search.split('"')[1].upper()) if '"' in search else None
+            body = json.dumps({"meta": {}, "results": [record]} if record else {"error": {}}).encode("utf-8")
+            self.send_response(200 if record else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/drug/label.json"
+
+def time_lookups(client: FDAClient, queries):
+    latencies, hits = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        result = client.search_drug(query)
+        latencies.append(time.perf_counter() - start)
+        hits += bool(result and result.results)
+    return {"p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3), "hit_rate": round(hits / len(queries), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Local label store vs. response cache for FDA name lookups.")
+    parser.add_argument("--labels", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--file", help="openFDA .json or .zip to load instead of synthetic labels")
+    args = parser.parse_args()
+
+    if args.file:
+        records = [item for _name, opener in iter_sources(args.file) for item in iter_results(opener())]
+    else:
+        records = list(synthetic_records(args.labels))
+    path = os.path.join(WORK_DIR, "labels.sqlite3")
+    store = LabelStore(path)
+    start = time.perf_counter()
+    store.add(records)
+    store.commit()
+    build = time.perf_counter() - start
+    print(f"{store.count()} labels ({store.versions()} versions) stored in {build:.1f}s, "
+          f"{os.path.getsize(path) / 2**20:.0f} MB; {WORK_DIR}")
+
+    rng = random.Random(3)
+    names = [(r["openfda"].get("brand_name") or r["openfda"].get("generic_name") or [""])[0]
+             for r in records if r.get("openfda")]
+    exact = [rng.choice(names).upper() for _ in range(args.queries)]
+    multiword = [name for name in names if " " in name] or names
+    phrase = [rng.choice(multiword).split()[0] for _ in range(args.queries)] # not a whole name: FTS phrase match
+
+    by_name = {}
+    for record in records:
+        for name in record["openfda"].get("brand_name", []):
+            by_name[name.upper()] = record
+    server, api_url = serve_labels(by_name)
+
+    local = FDAClient(base_url=api_url, cache=ResponseCache(":memory:"), label_store=store, offline=True)
+    print(f"Local store, exact name:   {time_lookups(local, exact)}")
+    print(f"Local store, phrase:       {time_lookups(local, phrase)}")
+
+    # Previous path with every answer already cached: SQLite read + JSON parse of the API body
+    cached = FDAClient(base_url=api_url, cache=ResponseCache(os.path.join(WORK_DIR, "cache.sqlite3")),
+                       label_store=None, max_retries=0)
+    for query in set(exact):
+        body = json.dumps({"meta": {}, "results": [by_name.get(query, records[0])]})
+        cached._store(cached._cache_key(cached._params(query, 1)), 200, body, {})
+    print(f"Warm response cache:       {time_lookups(cached, exact)}")
+    cold = FDAClient(base_url=api_url, cache=ResponseCache(":memory:"), label_store=None, max_retries=0)
+    print(f"No store, cold cache (local API stand-in): {time_lookups(cold, list(dict.fromkeys(exact))[:200])}")
+    server.shutdown()
+
+    start = time.perf_counter()
+    found = sum(len(store.search_text(f"{rng.choice(WORDS)} {rng.choice(WORDS)}", 10)) for _ in range(200))
+    print(f"Full-text search: {(time.perf_counter() - start) * 1000 / 200:.2f} ms/query ({found / 200:.1f} results)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import sys
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Login throughput under a concurrent burst, in-process (one worker), with
+# hashing on the request threadpool vs. the process pool, plus how long a
+# cheap sync endpoint takes to answer while the burst is running.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent login benchmark.")
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Hashing processes")
+    parser.add_argument("--max-pending", type=int, default=256)
+    return parser.parse_args()
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_login.db")
+os.environ.setdefault("EMAIL_OUTBOX_PATH", "")
+
+import httpx
+from fastapi import FastAPI
+
+from backend.app.core.database import Base, SessionLocal, engine
+from backend.app.core.security import PASSWORD_HASH_ROUNDS, PasswordHasher, get_password_hash
+from backend.app.models.sql_models import User
+from backend.app.api import endpoints
+
+def seed(n_users: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    password_hash = get_password_hash("password")
+    db = SessionLocal()
+    db.bulk_insert_mappings(User, [
+        {"id": i + 1, "username": f"bench{i + 1}", "role": "patient", "password_hash": password_hash}
+        for i in range(n_users)
+    ])
+    db.commit()
+    db.close()
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+async def run(app: FastAPI):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, probe_latencies, statuses = [], [], {}
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        async def login(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/auth/login", json={"username": f"bench{i % args.users + 1}",
+                                                                  "password": "password"})
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            # A cheap sync endpoint sharing the threadpool with the logins
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/users/patients")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+    return elapsed, latencies, probe_latencies, statuses
+
+def main():
+    seed(args.users)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    print(f"{args.logins} logins, concurrency {args.concurrency}, PASSWORD_HASH_ROUNDS={PASSWORD_HASH_ROUNDS}")
+
+    asyncio.run(compare(app))
+
+async def compare(app: FastAPI):
+    # One event loop for both runs: the async engine's pool is bound to it
+    for label, hasher in (("threadpool", PasswordHasher(workers=0, max_pending=args.max_pending)),
+                          (f"process pool x{args.workers}", PasswordHasher(workers=args.workers,
+                                                                           max_pending=args.max_pending))):
+        endpoints.password_hasher = hasher
+        hasher.start()
+        await asyncio.to_thread(hasher.warm)
+        try:
+            elapsed, latencies, probes, statuses = await run(app)
+        finally:
+            hasher.shutdown()
+        print(f"{label:<18} {args.logins / elapsed:7.1f} logins/s  "
+              f"p50={percentile(latencies, 50) * 1000:.0f}ms p99={percentile(latencies, 99) * 1000:.0f}ms  "
+              f"other endpoint p99={percentile(probes, 99) * 1000:.0f}ms  statuses={statuses}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import sys
+import os
+import json
+import time
+import shutil
+import random
+import zipfile
+import argparse
+import tempfile
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scripts.ingest_offline import iter_results, iter_sources, split_parts
+from scripts.split_files import split_file
+
+# Reading an openFDA ZIP that split_files.py cut into parts: reassembling the
+# parts into a full-size copy first (the previous workflow) vs. streaming the
+# members straight from the parts through MultiPartFile. Both parse every label
+# with the ingest script's streaming reader. Bytes come from /proc/self/io:
+# rchar/wchar are what the process read and wrote, write_bytes what reached the
+# disk. Runs on a synthetic dump, or on an existing split archive with --zip
+# PATH (PATH itself absent, PATH.001, .002, ... present), e.g. a full dump.
+
+WORDS = ["tablet", "dose", "hepatic", "renal", "pregnancy", "nausea", "headache", "rash", "children", "daily",
+         "hypertension", "infection", "pain", "fever", "bleeding", "dizziness", "overdose", "alcohol"]
+
+def io_counters() -> dict:
+    try:
+        with open("/proc/self/io") as f:
+            return {k: int(v) for k, v in (line.split(": ") for line in f)}
+    except OSError:
+        return {}
+
+def synthetic_split_zip(work_dir: str, labels: int, members: int, part_mb: float, seed: int = 5) -> str:
+    rng = random.Random(seed)
+    text = lambda n: [" ".join(rng.choice(WORDS) + str(rng.randint(0, 999)) for _ in range(n)) + "."]
+    path = os.path.join(work_dir, "drug-label-bench.json.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        per_member = labels // members
+        for m in range(members):
+            results = [{"set_id": f"set-{m}-{i}", "version": "1",
+                        "openfda": {"brand_name": [f"Brand{m}x{i}"], "generic_name": [f"generic{i % 500}"]},
+                        "indications_and_usage": text(60), "warnings": text(200),
+                        "dosage_and_administration": text(120), "adverse_reactions": text(150)}
+                       for i in range(per_member)]
+            z.writestr(f"drug-label-{m + 1:04d}-of-{members:04d}.json", json.dumps({"meta": {}, "results": results}))
+    split_file(path, chunk_size=int(part_mb * 1024 * 1024))
+    os.remove(path)
+    return path
+
+def count_labels(path: str) -> int:
+    count = 0
+    for _source, opener in iter_sources(path):
+        with opener() as f:
+            count += sum(1 for _ in iter_results(f))
+    return count
+
+def measure(fn):
+    before, start = io_counters(), time.perf_counter()
+    count = fn()
+    elapsed, after = time.perf_counter() - start, io_counters()
+    delta = {k: (after.get(k, 0) - before.get(k, 0)) / 2**20 for k in ("rchar", "wchar", "write_bytes")}
+    return count, elapsed, delta
+
+def main():
+    parser = argparse.ArgumentParser(description="Split ZIP ingestion: reassemble first vs. read the parts in place.")
+    parser.add_argument("--zip", help="Split archive to read (its .001, .002, ... parts must exist)")
+    parser.add_argument("--labels", type=int, default=40000)
+    parser.add_argument("--members", type=int, default=4, help="JSON files inside the synthetic ZIP")
+    parser.add_argument("--part-mb", type=float, default=20, help="Part size for the synthetic ZIP")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="medbench-split-")
+    try:
+        path = args.zip or synthetic_split_zip(work_dir, args.labels, args.members, args.part_mb)
+        parts = split_parts(path)
+        if not parts:
+            print(f"No parts found for {path}")
+            return
+        total = sum(os.path.getsize(p) for p in parts) / 2**20
+        print(f"{path}: {len(parts)} parts, {total:.0f} MB")
+
+        def reassemble():
+            full = os.path.join(work_dir, "reassembled.zip")
+            with open(full, "wb") as out:
+                for part in parts:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, out, 8 * 1024 * 1024)
+                out.flush()
+                os.fsync(out.fileno()) # the copy has to reach the disk before it can be trusted
+            try:
+                return count_labels(full)
+            finally:
+                os.remove(full)
+
+        results = {}
+        for name, fn in (("Reassemble, then read", reassemble), ("Read parts in place", lambda: count_labels(path))):
+            count, elapsed, delta = measure(fn)
+            results[name] = (elapsed, delta)
+            print(f"{name:22s} {count} labels in {elapsed:6.1f}s  read {delta['rchar']:7.0f} MB  "
+                  f"written {delta['wchar']:6.0f} MB  (to disk {delta['write_bytes']:6.0f} MB)")
+
+        (before, before_io), (after, after_io) = results.values()
+        print(f"In place: {before - after:.1f}s ({(before - after) / before:.0%}) faster, "
+              f"{before_io['rchar'] - after_io['rchar']:.0f} MB less read, "
+              f"{before_io['wchar'] - after_io['wchar']:.0f} MB less written, no {total:.0f} MB second copy on disk")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import sys
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from backend.app.services.vector_store import MmapVectorStore, make_vectorstore, write_records
+
+# Chroma vs. the memory-mapped flat index (float32 and int8) on the same
+# synthetic collection: open + first query in a fresh process (cold start),
+# warm query latency and recall@k against exact cosine search, unfiltered and
+# with the drug / section filters the hybrid retriever pushes down. Vectors are
+# clustered per drug so neighbours are meaningful. The ingest run repeats what
+# RAGService.upsert_documents does per label (a filtered get() for the label's
+# existing chunks, then a write) and reports the rate at the start and the end
+# of the run, so per-write costs that grow with the collection show up.
+
+SECTIONS = ["Indications & Usage", "Warnings", "Dosage & Administration", "Adverse Reactions"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def make_corpus(size: int, dim: int, drugs: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(drugs, dim)).astype(np.float32)
+    drug_of = rng.integers(0, drugs, size=size)
+    vectors = centers[drug_of] + 0.8 * rng.normal(size=(size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    records = [
+        {"id": f"chunk-{i}", "document": f"Section text {i}",
+         "metadata": {"drug_name": f"Drug{drug_of[i]}", "generic_name": f"generic{drug_of[i] // 2}",
+                      "section": SECTIONS[i % len(SECTIONS)], "set_id": f"set-{i // 12}"},
+         "embedding": vectors[i].tolist()}
+        for i in range(size)
+    ]
+    return records, vectors, centers
+
+def make_queries(records, centers, count: int, seed: int = 4):
+    """(vector, where) pairs: half unfiltered, half filtered by drug and section like the retriever."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in range(count):
+        drug = int(rng.integers(0, len(centers)))
+        vector = centers[drug] + 0.8 * rng.normal(size=centers.shape[1]).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        where = None
+        if i % 2:
+            where = {"$and": [{"$or": [{"drug_name": {"$in": [f"Drug{drug}"]}},
+                                       {"generic_name": {"$in": [f"generic{drug // 2}"]}}]},
+                              {"section": SECTIONS[i % len(SECTIONS)]}]}
+        queries.append((vector, where))
+    return queries
+
+def matches(meta: dict, where) -> bool:
+    if not where:
+        return True
+    if "$and" in where:
+        return all(matches(meta, clause) for clause in where["$and"])
+    if "$or" in where:
+        return any(matches(meta, clause) for clause in where["$or"])
+    (key, value), = where.items()
+    return meta.get(key) in value["$in"] if isinstance(value, dict) else meta.get(key) == value
+
+def exact_top_k(records, vectors, queries, k: int):
+    truth = []
+    metas = [r["metadata"] for r in records]
+    for vector, where in queries:
+        allowed = np.array([matches(meta, where) for meta in metas])
+        scores = np.where(allowed, vectors @ vector, -np.inf)
+        top = np.argsort(-scores)[:k]
+        truth.append({records[i]["id"] for i in top if allowed[i]})
+    return truth
+
+def open_store(backend: str, path: str):
+    if backend == "chroma":
+        return make_vectorstore(None, path, backend="chroma")
+    return MmapVectorStore(path, quantization="int8" if backend == "mmap-int8" else "none")
+
+def cold_start(backend: str, path: str, vector, where, k: int) -> float:
+    """Open + first query in a fresh process, as a newly started uvicorn worker would."""
+    start = time.perf_counter()
+    store = open_store(backend, path)
+    store.similarity_search_by_vector(vector.tolist(), k=k, filter=where)
+    return time.perf_counter() - start
+
+def measure(backend: str, path: str, queries, truth, k: int) -> dict:
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        cold = pool.apply(cold_start, (backend, path, queries[0][0], queries[0][1], k))
+
+    store = open_store(backend, path)
+    store.similarity_search_by_vector(queries[1][0].tolist(), k=k, filter=queries[1][1])
+    latencies, recalls = [], []
+    for (vector, where), expected in zip(queries, truth):
+        start = time.perf_counter()
+        docs = store.similarity_search_by_vector(vector.tolist(), k=k, filter=where)
+        latencies.append(time.perf_counter() - start)
+        if expected:
+            recalls.append(len({doc.id for doc in docs} & expected) / len(expected))
+    return {
+        "cold_start_ms": round(cold * 1000, 1),
+        "query_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "query_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "recall_at_k": round(sum(recalls) / len(recalls), 4),
+    }
+
+def ingest_rates(backend: str, path: str, labels: int, chunks: int, dim: int) -> dict:
+    """Labels/s over the first and last quarter of a label-by-label ingest."""
+    rng = np.random.default_rng(6)
+    store = open_store(backend, path)
+    times = []
+    for label in range(labels):
+        set_id = f"set-{label}"
+        start = time.perf_counter()
+        store.get(where={"set_id": {"$in": [set_id]}}, include=["metadatas"])
+        vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+        write_records(store, [{"id": f"{set_id}-{i}", "document": f"Chunk {i} of {set_id}",
+                               "metadata": {"set_id": set_id, "section": SECTIONS[i % len(SECTIONS)]},
+                               "embedding": vectors[i].tolist()} for i in range(chunks)])
+        times.append(time.perf_counter() - start)
+    quarter = max(1, labels // 4)
+    return {"first_labels_per_sec": round(quarter / sum(times[:quarter]), 1),
+            "last_labels_per_sec": round(quarter / sum(times[-quarter:]), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store backends: cold start, latency and recall.")
+    parser.add_argument("--size", type=int, default=50000, help="Chunks in the collection")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension (llama3 via Ollama: 4096)")
+    parser.add_argument("--drugs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20, help="Results per query (the retriever's fetch_k)")
+    parser.add_argument("--ingest-labels", type=int, default=2000, help="Labels in the ingest-path run (0 = skip)")
+    parser.add_argument("--chunks-per-label", type=int, default=8)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="medbench-vectors-")
+    records, vectors, centers = make_corpus(args.size, args.dim, args.drugs)
+    queries = make_queries(records, centers, args.queries)
+    truth = exact_top_k(records, vectors, queries, args.k)
+    print(f"{args.size} chunks x {args.dim} dims, {args.queries} queries (half filtered), k={args.k}; {work_dir}")
+
+    for backend in ("chroma", "mmap", "mmap-int8"):
+        path = os.path.join(work_dir, backend)
+        start = time.perf_counter()
+        write_records(open_store(backend, path), records, batch_size=5000)
+        build = time.perf_counter() - start
+        result = measure(backend, path, queries, truth, args.k)
+        print(f"{backend:10s} build {build:6.1f}s  {result}")
+
+    if args.ingest_labels:
+        print(f"Ingest path: {args.ingest_labels} labels x {args.chunks_per_label} chunks, get(where) + write per label")
+        for backend in ("chroma", "mmap", "mmap-int8"):
+            rates = ingest_rates(backend, os.path.join(work_dir, f"ingest-{backend}"), args.ingest_labels,
+                                 args.chunks_per_label, args.dim)
+            print(f"{backend:10s} {rates}")
+
+if __name__ == "__main__":
+    main()
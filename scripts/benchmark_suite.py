@@ -0,0 +1,296 @@
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import platform
+import tempfile
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Reproducible offline benchmarks: deterministic fake embeddings and chat model
+# (scripts/bench_fakes.py), a temporary Chroma directory and a temporary SQLite
+# database. Prints one JSON document of metrics and compares it against a baseline
+# report from the same machine (--save-baseline records one): a metric regresses when
+# it is worse than the baseline by more than its tolerance in
+# scripts/benchmark_thresholds.json. --check exits non-zero on a regression.
+
+SUITES = ("ingest", "query", "schedule", "api")
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite (no Ollama, Postgres or network).")
+    parser.add_argument("--only", choices=SUITES, action="append", help="Run only these suites (repeatable)")
+    parser.add_argument("--labels", type=int, default=200, help="Synthetic labels to ingest")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--schedules", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000, help="API requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent API requests")
+    parser.add_argument("--vector-backend", choices=("chroma", "mmap"), default="chroma")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated generation time per LLM call")
+    parser.add_argument("--thresholds", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "benchmark_thresholds.json"))
+    parser.add_argument("--baseline", default=os.path.join(BASE_DIR, "benchmark_baseline.json"),
+                        help="Report of an earlier run on this machine to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's report to --baseline")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any metric regressed against the baseline")
+    return parser.parse_args()
+
+args = parse_args()
+
+# Everything the services persist goes to a throwaway directory
+WORK_DIR = tempfile.mkdtemp(prefix="medbench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/bench.db"
+os.environ["EMAIL_OUTBOX_PATH"] = ""
+os.environ["FDA_CACHE_PATH"] = ""
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["DRUG_INDEX_PATH"] = os.path.join(WORK_DIR, "drug_index.json")
+os.environ["CHUNK_STORE_PATH"] = os.path.join(WORK_DIR, "chunk_store.sqlite3")
+os.environ["VECTOR_BACKEND"] = args.vector_backend
+
+from scripts.bench_fakes import FakeChatModel, HashingEmbeddings, synthetic_labels, synthetic_questions
+from scripts.bench_dosage_parser import SAMPLE_TEXTS
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+def make_rag_service():
+    from backend.app.services.rag_service import RAGService
+    return RAGService(persist_directory=os.path.join(WORK_DIR, "vectors"), embeddings=HashingEmbeddings(),
+                      llm=FakeChatModel(latency=args.llm_latency_ms / 1000))
+
+def bench_ingest(rag) -> dict:
+    from backend.app.services.rag_service import build_label_documents
+
+    labels = synthetic_labels(args.labels)
+    chunks = 0
+    start = time.perf_counter()
+    for label in labels:
+        chunks += rag.upsert_documents(build_label_documents(label, label.brand_name, rag.text_splitter))
+    elapsed = time.perf_counter() - start
+
+    # Same labels again: every section hash matches, nothing is embedded
+    start = time.perf_counter()
+    for label in labels:
+        rag.upsert_documents(build_label_documents(label, label.brand_name, rag.text_splitter))
+    unchanged = time.perf_counter() - start
+
+    return {
+        "ingest_labels_per_sec": round(len(labels) / elapsed, 1),
+        "ingest_chunks_per_sec": round(chunks / elapsed, 1),
+        "reingest_unchanged_labels_per_sec": round(len(labels) / unchanged, 1),
+    }
+
+def bench_query(rag) -> dict:
+    questions = synthetic_questions(synthetic_labels(args.labels), args.questions)
+    rag.warm_up()
+
+    cold = []
+    for question in questions:
+        start = time.perf_counter()
+        rag.query(question)
+        cold.append(time.perf_counter() - start)
+    misses = rag.answer_cache.misses
+
+    cached = []
+    for question in questions:
+        start = time.perf_counter()
+        rag.query(question)
+        cached.append(time.perf_counter() - start)
+
+    return {
+        "query_p50_ms": ms(percentile(cold, 50)),
+        "query_p99_ms": ms(percentile(cold, 99)),
+        "query_cache_misses": misses,
+        "query_cached_p50_ms": ms(percentile(cached, 50)),
+        "query_cached_p99_ms": ms(percentile(cached, 99)),
+    }
+
+def bench_schedule() -> dict:
+    from backend.app.services.reminder_service import ReminderService
+    rng = random.Random(3)
+    # Each text recurs under several drug names, as across a real prescription list
+    items = [(f"drug{rng.randint(0, 50)}", rng.choice(SAMPLE_TEXTS)) for _ in range(args.schedules)]
+    llm = FakeChatModel(latency=args.llm_latency_ms / 1000, json_schedule=True)
+
+    service = ReminderService(llm=llm)
+    start = time.perf_counter()
+    for drug_name, text in items:
+        service.generate_schedule(drug_name, text)
+    elapsed = time.perf_counter() - start
+
+    batch_service = ReminderService(llm=llm)
+
+    async def run_batches():
+        for i in range(0, len(items), 20):
+            async for _result in batch_service.agenerate_schedules(items[i:i + 20]):
+                pass
+
+    start = time.perf_counter()
+    asyncio.run(run_batches())
+    batch_elapsed = time.perf_counter() - start
+
+    return {
+        "schedule_per_sec": round(len(items) / elapsed, 1),
+        "schedule_batch_per_sec": round(len(items) / batch_elapsed, 1),
+        "schedule_llm_calls": service.llm_calls,
+    }
+
+def seed_database(n_users: int):
+    from backend.app.core.database import Base, SessionLocal, engine
+    from backend.app.models.sql_models import Reminder, User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.bulk_insert_mappings(User, [{"id": i + 1, "username": f"bench{i + 1}", "role": "patient"}
+                                   for i in range(n_users)])
+    db.bulk_insert_mappings(Reminder, [{"id": i + 1, "user_id": i + 1, "drug_name": "drug", "times": ["08:00"]}
+                                       for i in range(n_users)])
+    db.commit()
+    db.close()
+
+def bench_api() -> dict:
+    import httpx
+    from fastapi import FastAPI
+    from backend.app.api import endpoints
+
+    n_users = 200
+    seed_database(n_users)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    rng = random.Random(5)
+    today = datetime.date.today()
+    latencies = {"adherence_post": [], "adherence_get": [], "reminders_get": []}
+
+    async def run():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            async def one():
+                user = rng.randint(1, n_users)
+                kind = rng.choice(list(latencies))
+                async with semaphore:
+                    start = time.perf_counter()
+                    if kind == "adherence_post":
+                        day = today - datetime.timedelta(days=rng.randint(0, 29))
+                        response = await client.post("/adherence", json={
+                            "reminder_id": user, "date": day.isoformat(), "status": rng.choice(["taken", "missed"])
+                        })
+                    elif kind == "adherence_get":
+                        response = await client.get(f"/adherence/{user}")
+                    else:
+                        response = await client.get(f"/reminders/{user}")
+                    response.raise_for_status()
+                    latencies[kind].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(args.requests)))
+            return time.perf_counter() - start
+
+    async def run_and_dispose():
+        from backend.app.core.database import dispose_async_engine
+        try:
+            return await run()
+        finally:
+            await dispose_async_engine()
+
+    elapsed = asyncio.run(run_and_dispose())
+    metrics = {"api_requests_per_sec": round(args.requests / elapsed, 1)}
+    for kind, values in latencies.items():
+        metrics[f"api_{kind}_p50_ms"] = ms(percentile(values, 50))
+        metrics[f"api_{kind}_p99_ms"] = ms(percentile(values, 99))
+    return metrics
+
+def load_json(path: str):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def check_thresholds(metrics: dict, thresholds: dict, baseline: dict) -> list:
+    """
+    Metrics worse than the baseline's by more than their tolerance: below
+    baseline * (1 - tolerance) when higher is better, above baseline * (1 + tolerance)
+    when lower is better.
+    """
+    regressions = []
+    for name, rule in thresholds.items():
+        value, base = metrics.get(name), baseline["metrics"].get(name)
+        if value is None or base is None:
+            continue
+        if rule["better"] == "higher":
+            limit = base * (1 - rule["tolerance"])
+            regressed = value < limit
+        else:
+            limit = base * (1 + rule["tolerance"])
+            regressed = value > limit
+        if regressed:
+            regressions.append({"metric": name, "value": value, "baseline": base, "limit": round(limit, 3)})
+    return regressions
+
+def comparable(report: dict, baseline: dict) -> list:
+    """Why the baseline can't be compared with this run ([] if it can)."""
+    reasons = []
+    if baseline.get("cpus") != report["cpus"] or baseline.get("platform") != report["platform"]:
+        reasons.append("recorded on another machine")
+    if baseline.get("params") != report["params"]:
+        reasons.append("recorded with other parameters")
+    return reasons
+
+def main():
+    suites = args.only or list(SUITES)
+    metrics = {}
+    timings = {}
+
+    rag = make_rag_service() if {"ingest", "query"} & set(suites) else None
+    for suite in suites:
+        start = time.perf_counter()
+        if suite == "ingest":
+            metrics.update(bench_ingest(rag))
+        elif suite == "query":
+            if "ingest" not in suites:
+                bench_ingest(rag) # something to retrieve from
+            metrics.update(bench_query(rag))
+        elif suite == "schedule":
+            metrics.update(bench_schedule())
+        elif suite == "api":
+            metrics.update(bench_api())
+        timings[suite] = round(time.perf_counter() - start, 2)
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items()
+                   if k not in ("output", "thresholds", "baseline", "save_baseline", "check")},
+        "suite_seconds": timings,
+        "metrics": metrics,
+    }
+    baseline = None if args.save_baseline else load_json(args.baseline)
+    if baseline is None:
+        report["baseline"] = None
+        report["regressions"] = []
+    else:
+        reasons = comparable(report, baseline)
+        report["baseline"] = {"path": args.baseline, "timestamp": baseline.get("timestamp"), "skipped": reasons}
+        report["regressions"] = [] if reasons else check_thresholds(metrics, load_json(args.thresholds) or {},
+                                                                    baseline)
+    text = json.dumps(report, indent=2)
+    print(text)
+    for path in filter(None, (args.output, args.baseline if args.save_baseline else None)):
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    if args.check and report["regressions"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
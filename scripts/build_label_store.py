@@ -0,0 +1,51 @@
+import sys
+import os
+import time
+import argparse
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.app.services.label_store import LABEL_STORE_PATH, LabelStore
+from scripts.ingest_offline import iter_results, iter_sources, load_data_files
+
+# Builds (or updates) the local label store from the openFDA bulk files in
+# data/, without embedding anything. With it in place FDAClient answers name
+# lookups locally; set FDA_OFFLINE=1 to never call the API.
+
+COMMIT_EVERY = 5000 # labels per transaction
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Load openFDA bulk label files into the local label store.")
+    parser.add_argument("--data-dir", default=os.path.join(base_dir, 'data'))
+    parser.add_argument("--store", default=LABEL_STORE_PATH or "./label_store.sqlite3")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_dir):
+        print(f"Data directory not found: {args.data_dir}")
+        return
+
+    store = LabelStore(args.store)
+    start = time.perf_counter()
+    seen = added = 0
+    try:
+        for file_name in load_data_files(args.data_dir):
+            for source_name, opener in iter_sources(os.path.join(args.data_dir, file_name)):
+                print(f"  - Reading {source_name}...")
+                with opener() as f:
+                    for item in iter_results(f):
+                        added += store.add([item])
+                        seen += 1
+                        if seen % COMMIT_EVERY == 0:
+                            store.commit()
+                            print(f"    {seen} labels ({seen / (time.perf_counter() - start):.0f} labels/sec)")
+        store.commit()
+        print(f"{seen} labels read, {added} new versions stored in {time.perf_counter() - start:.1f}s; "
+              f"{args.store} holds {store.count()} labels ({store.versions()} versions)")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,370 @@
 import sys
 import os
 import json
-import asyncio
+import time
+import bisect
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Setup path to import backend modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from backend.app.services.rag_service import RAGService
-from backend.app.models.schemas import DrugInfo
+from backend.app.services.rag_service import RAGService, build_label_documents, make_text_splitter
+from backend.app.services.fda_client import label_to_drug_info
+from backend.app.services.label_store import LABEL_STORE_PATH, LabelStore
 
+import re
 import zipfile
 import io
 
+READ_SIZE = 1024 * 1024 # 1MB of text per read while streaming
+LABELS_PER_TASK = 32 # Labels handed to a worker in one go (amortizes IPC)
+DEFAULT_BATCH_SIZE = 512 # Chunks per embedding / Chroma write
+CHECKPOINT_FILE = "ingest_checkpoint.json"
+
+_PART = re.compile(r"^(.+\.(?:json|zip))\.(\d{3})$") # split_files.py output: name.zip.001, .002, ...
+
 def load_data_files(data_dir):
-    files = [f for f in os.listdir(data_dir) if f.endswith('.json') or f.endswith('.zip')]
-    return files
+    """
+    Data files to ingest. Parts written by split_files.py are listed once,
+    under the name of the file they were split from (unless that file is
+    still present itself); iter_sources reads them in place.
+    """
+    files = set()
+    for f in os.listdir(data_dir):
+        part = _PART.match(f)
+        if part:
+            files.add(part.group(1))
+        elif f.endswith('.json') or f.endswith('.zip'):
+            files.add(f)
+    return sorted(files)
 
-def process_file(rag_service: RAGService, file_path: str):
-    print(f"Processing {file_path}...")
-    
+# --- Split files ---
+
+def open_parts(parts):
+    return io.BufferedReader(MultiPartFile(parts), buffer_size=READ_SIZE)
+
+def split_parts(file_path):
+    """The ordered parts (file_path.001, .002, ...) of a split file; [] if there are none."""
+    parts = []
+    while os.path.exists(f"{file_path}.{len(parts) + 1:03d}"):
+        parts.append(f"{file_path}.{len(parts) + 1:03d}")
+    return parts
+
+class MultiPartFile(io.RawIOBase):
+    """
+    Read-only, seekable view of the concatenation of several files, so zipfile
+    (which seeks to the central directory at the end, then back to each member)
+    can read a split archive without reassembling it on disk. Reads that cross
+    a part boundary are filled from the next part.
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.offsets = [0] # start of each part in the combined stream
+        for path in self.paths:
+            self.offsets.append(self.offsets[-1] + os.path.getsize(path))
+        self.size = self.offsets[-1]
+        self.pos = 0
+        self._files = {}
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.pos = offset
+        return self.pos
+
+    def _part(self, index):
+        if index not in self._files:
+            self._files[index] = open(self.paths[index], 'rb')
+        return self._files[index]
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view) and self.pos < self.size:
+            index = bisect.bisect_right(self.offsets, self.pos) - 1
+            f = self._part(index)
+            f.seek(self.pos - self.offsets[index])
+            end = min(len(view), filled + self.offsets[index + 1] - self.pos) # stop at the end of this part
+            n = f.readinto(view[filled:end])
+            if not n:
+                break
+            filled += n
+            self.pos += n
+        return filled
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+# --- Streaming JSON reader ---
+# openFDA bulk files look like {"meta": {...}, "results": [ {...}, {...}, ... ]}.
+# json.load would materialize the whole (multi-hundred-MB) file, so instead we walk
+# the top-level object and decode one element of "results" at a time.
+
+class _JSONStream:
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what we've consumed so the buffer never grows past one element + one read
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON stream")
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next complete JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may still be incomplete
+                if end == len(self.buf) and not self.eof and self.buf[self.pos] not in '{["':
+                    raise ValueError("Need more data")
+                self.pos = end
+                return obj
+            except ValueError:
+                if not self._fill():
+                    raise
+
+    def array_items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+def iter_results(f):
+    """
+    Yields label records from a text stream one by one, without loading the whole file.
+    Handles the bulk format ({"results": [...]}), a bare list, or a single label object.
+    """
+    stream = _JSONStream(f)
+    first = stream.peek()
+
+    if first == "[":
+        yield from stream.array_items()
+        return
+
+    if first != "{":
+        raise ValueError("Unsupported JSON layout")
+
+    stream.expect("{")
+    single = {}
+    while stream.peek() != "}":
+        key = stream.value()
+        stream.expect(":")
+        if key == "results" and stream.peek() == "[":
+            yield from stream.array_items()
+            return
+        single[key] = stream.value()
+        if stream.peek() == ",":
+            stream.pos += 1
+
+    # No "results" array: treat the object itself as one label
+    yield single
+
+def iter_sources(file_path: str):
+    """
+    Yields (source_name, opener) for every JSON document in a data file.
+    A file that only exists as split parts is read from the parts directly.
+    """
+    parts = [] if os.path.exists(file_path) else split_parts(file_path)
     if file_path.endswith('.zip'):
+        source = open_parts(parts) if parts else file_path
         try:
-            with zipfile.ZipFile(file_path, 'r') as z:
+            with zipfile.ZipFile(source, 'r') as z:
                 for filename in z.namelist():
                     if filename.endswith('.json'):
-                        print(f"  - Extracting {filename} from zip...")
-                        with z.open(filename) as f:
-                            data = json.load(f)
-                            ingest_data(rag_service, data, f"{file_path}::{filename}")
-        except Exception as e:
-            print(f"Error reading zip {file_path}: {e}")
-            
+                        yield f"{file_path}::{filename}", lambda name=filename: io.TextIOWrapper(z.open(name), encoding='utf-8')
+        finally:
+            if parts:
+                source.close() # zipfile leaves a file object it was given open
     elif file_path.endswith('.json'):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                ingest_data(rag_service, data, file_path)
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
+        if parts:
+            yield file_path, lambda: io.TextIOWrapper(open_parts(parts), encoding='utf-8')
+        else:
+            yield file_path, lambda: open(file_path, 'r', encoding='utf-8')
+
+# --- Chunking (runs in worker processes) ---
+
+_worker_splitter = None
+
+def chunk_labels(items):
+    """
+    Worker task: turns a list of raw label records into one document list per label.
+    """
+    global _worker_splitter
+    if _worker_splitter is None:
+        _worker_splitter = make_text_splitter()
+
+    out = []
+    for item in items:
+        drug_info = label_to_drug_info(item)
+
+        # If no brand name, try to use generic, else skip
+        name = drug_info.brand_name or drug_info.generic_name
+        if not name:
+            out.append([])
+            continue
+
+        out.append(build_label_documents(drug_info, name, _worker_splitter))
+    return out
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_chunked(results, executor, max_in_flight):
+    """
+    Chunks labels in the pool while preserving input order.
+    Only max_in_flight tasks are outstanding at once so memory stays bounded.
+    """
+    pending = deque()
+    for items in _batched(results, LABELS_PER_TASK):
+        if executor is None:
+            yield from chunk_labels(items)
+            continue
+        pending.append(executor.submit(chunk_labels, items))
+        if len(pending) >= max_in_flight:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+# --- Checkpoints ---
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+# --- Ingestion ---
+
+def ingest_stream(rag_service: RAGService, results, source_name: str, executor=None,
+                  batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, checkpoint_path=None, max_in_flight=8,
+                  label_store=None):
+    """
+    Chunks a stream of labels and writes them to the vector store in large batches.
+    Progress is checkpointed after every batch so an interrupted run can resume.
+    With a label_store, the raw labels are also kept there for local lookups.
+    """
+    checkpoint = checkpoint if checkpoint is not None else {}
+    progress = checkpoint.setdefault(source_name, {"labels": 0, "done": False})
+    if progress["done"]:
+        print(f"  - Skipping {source_name} (already ingested)")
+        return 0
+
+    skip = progress["labels"]
+    if skip:
+        print(f"  - Resuming {source_name} after {skip} labels")
+
+    def remaining():
+        for idx, item in enumerate(results):
+            if label_store is not None:
+                label_store.add([item]) # idempotent, so labels before a resume point are kept too
+            if idx >= skip:
+                yield item
+
+    pending_docs = []
+    labels_seen = skip
+    count = 0
+    start = time.perf_counter()
+
+    def flush():
+        if label_store is not None:
+            label_store.commit()
+        if pending_docs:
+            rag_service.upsert_documents(pending_docs)
+            pending_docs.clear()
+            rag_service.drug_index.save_if_dirty()
+        progress["labels"] = labels_seen
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    for docs in iter_chunked(remaining(), executor, max_in_flight):
+        labels_seen += 1
+        if docs:
+            pending_docs.extend(docs)
+            count += 1
+        # Flush on label boundaries so the checkpoint never splits a label
+        if len(pending_docs) >= batch_size:
+            flush()
+            elapsed = time.perf_counter() - start
+            print(f"    {labels_seen} labels ({count / elapsed:.1f} labels/sec)")
+
+    flush()
+    progress["done"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    print(f"Successfully digested {count} drugs from {source_name} ({rate:.1f} labels/sec)")
+    stats = rag_service.ingest_stats
+    if stats["chunks"]:
+        print(f"  Chunks: {stats['chunks']} new or changed, {stats['embedded']} embedded, "
+              f"{stats['duplicates']} exact and {stats['near_duplicates']} near-duplicates shared "
+              f"({stats['chunks'] / max(stats['embedded'], 1):.2f}x fewer embeddings)")
+    return count
 
 def ingest_data(rag_service: RAGService, data: any, source_name: str):
     # Handle OpenFDA bulk download format or single OpenFDA result format
@@ -48,82 +375,84 @@ def ingest_data(rag_service: RAGService, data: any, source_name: str):
         results = data
     else:
         results = [data]
-        
-    count = 0
-    for item in results:
-        # Check if it has openfda key (standard structure)
-        openfda = item.get("openfda", {})
-        brand_name = openfda.get("brand_name", [None])[0]
-        generic_name = openfda.get("generic_name", [None])[0]
-        
-        # If no brand name, try to use generic, else skip
-        name = brand_name or generic_name
-        if not name:
-            continue
 
-        # Extract fields helper
-        def get_text(key):
-            val = item.get(key)
-            if isinstance(val, list):
-                return "\n".join(val)
-            return val
-
-        drug_info = DrugInfo(
-            brand_name=brand_name,
-            generic_name=generic_name,
-            purpose=get_text("indications_and_usage"),
-            warnings=get_text("warnings"),
-            dosage_instructions=get_text("dosage_and_administration"),
-            adverse_reactions=get_text("adverse_reactions")
-        )
-        
-        # Manually trigger the splitting and adding logic from RAGService
-        
-        documents = []
-        sections = {
-            "Indications & Usage": drug_info.purpose,
-            "Warnings": drug_info.warnings,
-            "Dosage & Administration": drug_info.dosage_instructions,
-            "Adverse Reactions": drug_info.adverse_reactions
-        }
-        
-        base_metadata = {
-            "drug_name": name,
-            "generic_name": drug_info.generic_name
-        }
-
-        for section_name, content in sections.items():
-            if content:
-                full_content = f"Drug: {base_metadata['drug_name']}\nSection: {section_name}\nContent: {content}"
-                docs = rag_service.text_splitter.create_documents([full_content], metadatas=[{**base_metadata, "section": section_name}])
-                documents.extend(docs)
-
-        if documents:
-            rag_service.vectorstore.add_documents(documents)
-            count += 1
-            
-    print(f"Successfully digested {count} drugs from {source_name}")
+    return ingest_stream(rag_service, results, source_name)
+
+def process_file(rag_service: RAGService, file_path: str, executor=None, batch_size=DEFAULT_BATCH_SIZE,
+                 checkpoint=None, checkpoint_path=None, max_in_flight=8, label_store=None) -> bool:
+    """
+    Ingests every JSON document in a data file. Returns False if the file can't be
+    read (not a zip, malformed JSON); its checkpoint then stays at the last batch
+    written. Embedding and vector store errors propagate: they stop the run.
+    """
+    print(f"Processing {file_path}...")
+
+    try:
+        for source_name, opener in iter_sources(file_path):
+            print(f"  - Streaming {source_name}...")
+            with opener() as f:
+                ingest_stream(rag_service, iter_results(f), source_name, executor=executor,
+                              batch_size=batch_size, checkpoint=checkpoint,
+                              checkpoint_path=checkpoint_path, max_in_flight=max_in_flight,
+                              label_store=label_store)
+    except (zipfile.BadZipFile, ValueError) as e: # UnicodeDecodeError and JSON errors are ValueErrors
+        print(f"Error reading {file_path}: {e}")
+        return False
+    return True
 
 def main():
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    data_dir = os.path.join(base_dir, 'data')
-    
+
+    parser = argparse.ArgumentParser(description="Ingest openFDA bulk label files into the vector store.")
+    parser.add_argument("--data-dir", default=os.path.join(base_dir, 'data'))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Chunking worker processes (0 = chunk in the main process)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Chunks per embedding / vector store write")
+    parser.add_argument("--checkpoint", default=None,
+                        help=f"Checkpoint file (default: <data-dir>/{CHECKPOINT_FILE})")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--label-store", default=LABEL_STORE_PATH,
+                        help="Also keep the labels in this local label store (\"\" = don't)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
     if not os.path.exists(data_dir):
         print(f"Data directory not found: {data_dir}")
         return
 
     print(f"Looking for data in {data_dir}")
     files = load_data_files(data_dir)
-    
+
     if not files:
         print("No JSON or ZIP files found.")
         return
 
+    checkpoint_path = args.checkpoint or os.path.join(data_dir, CHECKPOINT_FILE)
+    checkpoint = {} if args.restart else load_checkpoint(checkpoint_path)
+
     rag_service = RAGService()
-    
-    for file_name in files:
-        process_file(rag_service, os.path.join(data_dir, file_name))
-        
+    label_store = LabelStore(args.label_store) if args.label_store else None
+
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 0 else None
+    unreadable = []
+    try:
+        for file_name in files:
+            if not process_file(rag_service, os.path.join(data_dir, file_name), executor=executor,
+                                batch_size=args.batch_size, checkpoint=checkpoint,
+                                checkpoint_path=checkpoint_path, max_in_flight=max(2, args.workers * 2),
+                                label_store=label_store):
+                unreadable.append(file_name)
+    finally:
+        if executor:
+            executor.shutdown()
+        if label_store is not None:
+            label_store.commit()
+            label_store.close()
+
+    if unreadable:
+        print(f"Ingestion incomplete: could not read {', '.join(unreadable)}")
+        sys.exit(1)
     print("Ingestion complete.")
 
 if __name__ == "__main__":
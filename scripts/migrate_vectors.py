@@ -0,0 +1,86 @@
+import sys
+import os
+import gzip
+import json
+import sqlite3
+import time
+import argparse
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.app.services.chunk_store import CHUNK_STORE_FILE
+from backend.app.services.vector_store import (DEFAULT_PATHS, MmapVectorStore, collection_size, iter_records,
+                                               make_vectorstore, write_records)
+
+# Moves the drug_labels collection between vector store backends without
+# re-embedding anything:
+#   export  STORE FILE   writes every chunk (id, document, metadata, embedding) as JSON lines
+#   import  FILE STORE   upserts an export into a store
+#   copy    STORE STORE  both at once
+# STORE is BACKEND[:PATH], e.g. chroma:./chroma_db or mmap:./vector_index
+# (PATH defaults to the backend's usual location). FILE may end in .gz.
+# copy also takes the chunk store (which labels reference each chunk) along;
+# an export holds only the chunks.
+
+def parse_store(spec: str):
+    backend, _, path = spec.partition(":")
+    return backend, path or DEFAULT_PATHS.get(backend)
+
+def open_store(spec: str, quantization: str):
+    backend, path = parse_store(spec)
+    if backend == "mmap":
+        return MmapVectorStore(path, quantization=quantization)
+    return make_vectorstore(None, path, backend=backend)
+
+def copy_chunk_store(source_dir: str, target_dir: str) -> bool:
+    """Copies the source store's chunk store next to the target's, unless it has one."""
+    source = os.path.join(source_dir, CHUNK_STORE_FILE)
+    target = os.path.join(target_dir, CHUNK_STORE_FILE)
+    if not os.path.exists(source) or os.path.exists(target):
+        return False
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    return True
+
+def open_file(path: str, mode: str):
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import the drug_labels vector collection.")
+    parser.add_argument("command", choices=("export", "import", "copy"))
+    parser.add_argument("source", help="STORE (export, copy) or FILE (import)")
+    parser.add_argument("target", help="FILE (export) or STORE (import, copy)")
+    parser.add_argument("--quantization", choices=("none", "int8"), default="none",
+                        help="For a new mmap index: store vectors as float32 or int8")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "export":
+        store = open_store(args.source, args.quantization)
+        count = 0
+        with open_file(args.target, "w") as f:
+            for record in iter_records(store, args.batch_size):
+                f.write(json.dumps(record) + "\n")
+                count += 1
+    else:
+        target = open_store(args.target, args.quantization)
+        if args.command == "import":
+            with open_file(args.source, "r") as f:
+                count = write_records(target, (json.loads(line) for line in f if line.strip()), args.batch_size)
+        else:
+            count = write_records(target, iter_records(open_store(args.source, args.quantization), args.batch_size),
+                                  args.batch_size)
+            if copy_chunk_store(parse_store(args.source)[1], parse_store(args.target)[1]):
+                print("Copied the chunk store")
+        print(f"Target now holds {collection_size(target)} chunks")
+
+    print(f"{args.command}: {count} chunks in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
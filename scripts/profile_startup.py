@@ -0,0 +1,69 @@
+import sys
+import os
+import time
+import asyncio
+import argparse
+import subprocess
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Where startup time goes: the slowest imports of `backend.main` (from
+# `python -X importtime`), then the app lifespan phases and per-service
+# build/warm-up times, as served by GET /health/startup.
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import-time and startup profile of the API.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--no-lifespan", action="store_true", help="Only profile imports")
+    parser.add_argument("--wait-warmup", type=float, default=120.0, help="Seconds to wait for background warm-up")
+    return parser.parse_args()
+
+def import_profile(top: int):
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import backend.main"],
+                          cwd=root, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+        return
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    top_level = [row for row in rows if not row[2].startswith("  ")]
+    print(f"Interpreter + `import backend.main`: {wall * 1000:.0f} ms wall, "
+          f"{sum(row[0] for row in top_level) / 1000:.0f} ms in imports")
+    print("\nSlowest imports (cumulative ms, self ms):")
+    for cumulative, own, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} {own / 1000:8.1f}  {name.strip()}")
+
+async def lifespan_profile(wait_warmup: float):
+    from backend.main import app
+    from backend.app.core.services import SERVICE_WARMUP, registry
+
+    async with app.router.lifespan_context(app):
+        deadline = time.perf_counter() + wait_warmup
+        while SERVICE_WARMUP and "warm_up" not in registry.phases and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        print(f"\nStartup phases (ms): {registry.phases}")
+        if app.state.startup_errors:
+            print(f"Startup errors: {app.state.startup_errors}")
+        print("Services:")
+        for name, status in registry.status().items():
+            print(f"  {name:<14} {status}")
+
+def main():
+    args = parse_args()
+    import_profile(args.top)
+    if not args.no_lifespan:
+        asyncio.run(lifespan_profile(args.wait_warmup))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import sys
+import os
+import time
+import random
+import argparse
+import datetime
+
+# Setup path to import backend modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.app.core.database import Base
+from backend.app.models.sql_models import User, Reminder, Adherence
+from backend.app.services.adherence_service import upsert_adherence
+from backend.app.services.dispatch_service import DoseDispatcher, SimulatedClock, get_timezone, parse_times
+
+# Simulated-clock harness for DoseDispatcher: runs a population of reminders
+# through a few days against an in-memory SQLite DB, restarts the dispatcher
+# halfway (rebuilding from the DB), and checks that exactly the days without a
+# "taken" record end up marked "missed".
+
+TIMEZONES = ["UTC", "Asia/Kolkata", "America/New_York", "Europe/Berlin", "Australia/Sydney", "Pacific/Auckland"]
+SCHEDULES = [["08:00"], ["08:00", "20:00"], ["08:00", "14:00", "20:00"], ["21:00"], ["06:30", "12:00", "18:00", "23:45"]]
+UTC = datetime.timezone.utc
+
+def make_db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, autoflush=False)
+
+def seed(Session, n_reminders: int, n_users: int, start: datetime.datetime, rng: random.Random):
+    db = Session()
+    db.bulk_insert_mappings(User, [
+        {"id": i + 1, "username": f"patient{i + 1}", "role": "patient", "timezone": TIMEZONES[i % len(TIMEZONES)]}
+        for i in range(n_users)
+    ])
+    reminders = []
+    for i in range(n_reminders):
+        created = start - datetime.timedelta(minutes=rng.randint(0, 36 * 60))
+        reminders.append({
+            "id": i + 1,
+            "user_id": rng.randint(1, n_users),
+            "drug_name": f"drug{i % 500}",
+            "dosage": "1 tablet",
+            "times": rng.choice(SCHEDULES),
+            "created_at": created.replace(tzinfo=None),
+            # A third of the courses end tomorrow, the rest are open-ended
+            "ends_on": (start + datetime.timedelta(days=1)).date() if i % 3 == 0 else None,
+        })
+    db.bulk_insert_mappings(Reminder, reminders)
+    db.commit()
+    db.close()
+    return reminders
+
+def expected_missed(reminders, timezones, taken, start, end, grace):
+    """Independent model of which (reminder, day) pairs must be marked missed by `end`."""
+    expected = set()
+    for r in reminders:
+        times = parse_times(r["times"])
+        tz = get_timezone(timezones[r["user_id"]])
+        created = r["created_at"].replace(tzinfo=UTC)
+        first_day = created.astimezone(tz).date()
+        if datetime.datetime.combine(first_day, times[0], tzinfo=tz) < created:
+            first_day += datetime.timedelta(days=1)
+        # The dispatcher catches up on the day before it (re)started, never further back
+        day = max(first_day, start.astimezone(tz).date() - datetime.timedelta(days=1))
+        while r["ends_on"] is None or day <= r["ends_on"]:
+            check = datetime.datetime.combine(day, times[-1], tzinfo=tz) + grace
+            if check > end:
+                break
+            if (r["id"], day) not in taken:
+                expected.add((r["id"], day))
+            day += datetime.timedelta(days=1)
+    return expected
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated-clock run of the reminder dispatcher.")
+    parser.add_argument("--reminders", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--days", type=float, default=2)
+    parser.add_argument("--step-minutes", type=int, default=5, help="Simulated clock tick")
+    parser.add_argument("--take-rate", type=float, default=0.8, help="Chance a due dose gets recorded as taken")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = datetime.datetime(2025, 3, 29, 0, 0, tzinfo=UTC) # spans the EU DST switch
+    end = start + datetime.timedelta(days=args.days)
+    grace = datetime.timedelta(minutes=60)
+    step = datetime.timedelta(minutes=args.step_minutes)
+
+    Session = make_db()
+    reminders = seed(Session, args.reminders, args.users, start, rng)
+    timezones = {i + 1: TIMEZONES[i % len(TIMEZONES)] for i in range(args.users)}
+
+    clock = SimulatedClock(start)
+    taken = set()
+    taken_rows = {}
+    dispatched_after_remove = []
+    removed_id = None
+
+    def on_due(dose):
+        if dose.reminder_id == removed_id:
+            dispatched_after_remove.append(dose)
+        # The patient takes it (or not); one record per reminder per day
+        if rng.random() < args.take_rate:
+            taken.add((dose.reminder_id, dose.local_date))
+            taken_rows[(dose.reminder_id, dose.local_date)] = {
+                "reminder_id": dose.reminder_id, "date": dose.local_date, "status": "taken"
+            }
+
+    def write_taken():
+        if taken_rows:
+            db = Session()
+            upsert_adherence(db, list(taken_rows.values()))
+            db.commit()
+            db.close()
+            taken_rows.clear()
+
+    def new_dispatcher():
+        dispatcher = DoseDispatcher(Session, clock=clock, on_due=on_due, grace=grace)
+        db = Session()
+        t0 = time.perf_counter()
+        dispatcher.load(db)
+        db.close()
+        print(f"  load: {len(dispatcher)} reminders in {time.perf_counter() - t0:.2f}s")
+        return dispatcher
+
+    print(f"Simulating {args.reminders} reminders / {args.users} users for {args.days} days")
+    dispatcher = new_dispatcher()
+    restart_at = start + (end - start) / 2
+    restarted = False
+    events = 0
+    busy = 0.0
+    while clock.now() < end:
+        now = clock.advance(step)
+        t0 = time.perf_counter()
+        events += dispatcher.run_until(now)
+        busy += time.perf_counter() - t0
+        # Patients record doses before the dispatcher's missed marks land
+        write_taken()
+        dispatcher.flush()
+
+        if removed_id is None and now >= start + datetime.timedelta(hours=6):
+            # Incremental updates: stop one reminder, add a new one
+            removed_id = reminders[0]["id"]
+            dispatcher.remove(removed_id)
+            db = Session()
+            new = Reminder(id=len(reminders) + 1, user_id=1, drug_name="added", dosage="5 mg",
+                           times=["09:00"], created_at=now.replace(tzinfo=None), ends_on=None)
+            db.add(new)
+            db.commit()
+            dispatcher.add_reminder(new, timezone=timezones[1], now=now)
+            reminders.append({"id": new.id, "user_id": 1, "times": ["09:00"],
+                              "created_at": new.created_at, "ends_on": None})
+            db.close()
+
+        if not restarted and now >= restart_at:
+            print(f"Restarting at {now:%Y-%m-%d %H:%M} UTC")
+            restarted = True
+            dispatcher = new_dispatcher()
+            dispatcher.remove(removed_id)
+
+    print(f"Processed {events} events in {busy:.2f}s ({busy / max(events, 1) * 1e6:.1f} us/event)")
+
+    db = Session()
+    missed = set(db.query(Adherence.reminder_id, Adherence.date).filter(Adherence.status == "missed").all())
+    taken_count = db.query(func.count(Adherence.id)).filter(Adherence.status == "taken").scalar()
+    db.close()
+
+    # Removed reminders stop firing; their earlier days still count
+    expected = expected_missed([r for r in reminders if r["id"] != removed_id], timezones, taken, start, end, grace)
+    missed_other = {m for m in missed if m[0] != removed_id}
+
+    ok = True
+    if missed_other != expected:
+        ok = False
+        print(f"FAIL missed: {len(missed_other - expected)} unexpected, {len(expected - missed_other)} not marked")
+    if taken_count != len(taken):
+        ok = False
+        print(f"FAIL taken records overwritten: {taken_count} in DB, {len(taken)} recorded")
+    if dispatched_after_remove:
+        ok = False
+        print(f"FAIL removed reminder fired {len(dispatched_after_remove)} times")
+    print(f"Missed days marked: {len(missed)}, taken: {taken_count}")
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
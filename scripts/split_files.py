@@ -2,9 +2,9 @@ import os
 
 CHUNK_SIZE = 95 * 1024 * 1024 # 95MB
 
-def split_file(filepath):
+def split_file(filepath, chunk_size=CHUNK_SIZE):
     filesize = os.path.getsize(filepath)
-    if filesize <= CHUNK_SIZE:
+    if filesize <= chunk_size:
         print(f"Skipping {filepath} (small enough)")
         return
 
@@ -13,7 +13,7 @@ def split_file(filepath):
     with open(filepath, 'rb') as f:
         part_num = 1
         while True:
-            chunk = f.read(CHUNK_SIZE)
+            chunk = f.read(chunk_size)
             if not chunk:
                 break
             
@@ -0,0 +1,103 @@
+import os
+import sys
+import hashlib
+import tempfile
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+# Everything the services persist goes to a throwaway directory (or stays in memory)
+TEST_DIR = tempfile.mkdtemp(prefix="medcare-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DIR}/test.db" # a file, so the sync and async engines share it
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["FDA_CACHE_PATH"] = ""
+os.environ["DRUG_INDEX_PATH"] = ""
+os.environ["CHUNK_STORE_PATH"] = ""
+os.environ["EMAIL_OUTBOX_PATH"] = ""
+os.environ["LABEL_STORE_PATH"] = ""
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+class CountingEmbeddings(Embeddings):
+    """Feature-hashed bag of words (no Ollama), counting the documents embedded."""
+
+    def __init__(self, dim: int = 64, **_kwargs):
+        self.dim = dim
+        self.documents_embedded = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.documents_embedded += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbeddings()
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch, embeddings):
+    """A RAGService on a fresh vector store, embedding with `embeddings` instead of Ollama."""
+    from backend.app.services import rag_service
+    monkeypatch.setattr(rag_service, "OllamaEmbeddings", lambda **kwargs: embeddings)
+    return rag_service.RAGService(persist_directory=str(tmp_path / "vectors"))
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def database(tmp_path):
+    """
+    A fresh SQLite file with the app's schema, upgraded as at startup: returns
+    (sync sessionmaker, async sessionmaker). A file rather than sqlite:// with
+    StaticPool, so the sync and async engines see the same database.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import NullPool
+    from backend.app.core.database import Base
+    from backend.migrate_indexes import upgrade_schema
+
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    # NullPool: no aiosqlite connection outlives the event loop of the test that opened it
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1), poolclass=NullPool)
+    yield (sessionmaker(bind=engine, autoflush=False),
+           async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False))
+    engine.dispose()
+
+@pytest.fixture
+async def client(database):
+    """An httpx client calling the ASGI app (no lifespan) with its sessions on `database`."""
+    import httpx
+    from backend.main import app
+    from backend.app.core.database import get_db, get_async_db
+    Session, AsyncSession = database
+
+    def db():
+        with Session() as session:
+            yield session
+
+    async def async_db():
+        async with AsyncSession() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = db
+    app.dependency_overrides[get_async_db] = async_db
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test/api/v1") as c:
+        yield c
+    app.dependency_overrides.clear()
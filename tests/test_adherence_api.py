@@ -0,0 +1,116 @@
+import datetime
+
+import pytest
+from sqlalchemy import event, select
+
+from backend.app.models.sql_models import Adherence, Reminder, User
+from backend.app.services import adherence_service
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def reminders(database):
+    Session, _ = database
+    with Session() as db:
+        user = User(username="pat", role="patient", password_hash="x")
+        db.add(user)
+        db.flush()
+        rows = [Reminder(user_id=user.id, drug_name=f"drug {i}", dosage="1 tablet", frequency="daily",
+                         times=["08:00"], duration="Unlimited") for i in range(3)]
+        db.add_all(rows)
+        db.commit()
+        return [r.id for r in rows]
+
+def stored(database):
+    Session, _ = database
+    with Session() as db:
+        return {(a.reminder_id, a.date.isoformat()): a.status for a in db.execute(select(Adherence)).scalars()}
+
+def days(n):
+    start = datetime.date(2026, 3, 1)
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(n)]
+
+async def test_batch_is_written_in_chunked_upserts(client, database, reminders, monkeypatch):
+    monkeypatch.setitem(adherence_service.BATCH_ROWS, "sqlite", 4)
+    records = [{"reminder_id": r, "date": d, "status": "taken"} for r in reminders for d in days(3)]
+
+    inserts = []
+    engine = database[1].kw["bind"].sync_engine
+
+    def listener(conn, cursor, statement, *args):
+        if statement.startswith("INSERT"):
+            inserts.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = await client.post("/adherence/batch", json={"records": records})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 200
+    assert response.json()["written"] == 9
+    assert len(inserts) == 3 # 4 + 4 + 1 rows
+    assert all("ON CONFLICT" in statement for statement in inserts)
+    assert len(stored(database)) == 9
+
+    # A second batch updates the existing records in place
+    records = [dict(record, status="missed") for record in records]
+    assert (await client.post("/adherence/batch", json={"records": records})).json()["written"] == 9
+    assert set(stored(database).values()) == {"missed"}
+
+async def test_read_then_write_fallback(client, database, reminders, monkeypatch):
+    monkeypatch.delitem(adherence_service.INSERTS, "sqlite")
+    first, second = days(2)
+    await client.post("/adherence/batch", json={"records": [
+        {"reminder_id": reminders[0], "date": first, "status": "taken"},
+    ]})
+    response = await client.post("/adherence/batch", json={"records": [
+        {"reminder_id": reminders[0], "date": first, "status": "missed"},
+        {"reminder_id": reminders[0], "date": second, "status": "partial"},
+    ]})
+
+    assert response.json()["written"] == 2
+    assert stored(database) == {(reminders[0], first): "missed", (reminders[0], second): "partial"}
+
+async def test_last_record_for_a_reminder_and_date_wins(client, database, reminders):
+    day = days(1)[0]
+    response = await client.post("/adherence/batch", json={"records": [
+        {"reminder_id": reminders[0], "date": day, "status": "missed"},
+        {"reminder_id": reminders[0], "date": day, "status": "taken"},
+    ]})
+
+    body = response.json()
+    assert body["written"] == 1
+    assert body["results"][0]["success"] is False
+    assert "Superseded" in body["results"][0]["error"]
+    assert body["results"][1]["success"] is True
+    assert stored(database) == {(reminders[0], day): "taken"}
+
+async def test_invalid_items_fail_individually(client, database, reminders):
+    day = days(1)[0]
+    response = await client.post("/adherence/batch", json={"records": [
+        {"reminder_id": reminders[0], "date": "03/01/2026", "status": "taken"},
+        {"reminder_id": reminders[0], "date": day, "status": "sort of"},
+        {"reminder_id": 9999, "date": day, "status": "taken"},
+        {"reminder_id": reminders[1], "date": day, "status": "taken"},
+    ]})
+
+    body = response.json()
+    assert (body["written"], body["failed"]) == (1, 3)
+    assert [r["error"] for r in body["results"]] == [
+        "date must be YYYY-MM-DD",
+        "status must be one of taken, full, missed, partial",
+        "Unknown reminder_id",
+        None,
+    ]
+    assert stored(database) == {(reminders[1], day): "taken"}
+
+async def test_single_record_is_validated_like_a_batch_item(client, database, reminders):
+    day = days(1)[0]
+    bad_date = await client.post("/adherence", json={"reminder_id": reminders[0], "date": "tomorrow", "status": "taken"})
+    bad_status = await client.post("/adherence", json={"reminder_id": reminders[0], "date": day, "status": "sort of"})
+    unknown = await client.post("/adherence", json={"reminder_id": 9999, "date": day, "status": "taken"})
+    ok = await client.post("/adherence", json={"reminder_id": reminders[0], "date": day, "status": "taken"})
+
+    assert (bad_date.status_code, bad_status.status_code, unknown.status_code, ok.status_code) == (400, 400, 404, 200)
+    assert stored(database) == {(reminders[0], day): "taken"}
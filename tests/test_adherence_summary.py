@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+
+from backend.app.models.sql_models import Adherence, Reminder, User
+
+pytestmark = pytest.mark.anyio
+
+START = datetime.date(2026, 3, 2) # a Monday
+# Per day of the two weeks from START: (morning pill, evening pill)
+STATUSES = [("taken", "missed"), ("full", "taken"), ("missed", "partial"), ("taken", "taken"), ("taken", None),
+            ("partial", "missed"), ("taken", "taken")] * 2
+
+@pytest.fixture
+def patient(database):
+    """A patient with two reminders and STATUSES recorded, plus one record outside the window and another user's."""
+    Session, _ = database
+    with Session() as db:
+        user, other = User(username="pat", role="patient"), User(username="sam", role="patient")
+        db.add_all([user, other])
+        db.flush()
+        morning, evening, others = (Reminder(user_id=u.id, drug_name=name, times=["08:00"])
+                                    for u, name in ((user, "Metformin"), (user, "Lisinopril"), (other, "Aspirin")))
+        db.add_all([morning, evening, others])
+        db.flush()
+        for offset, statuses in enumerate(STATUSES):
+            day = START + datetime.timedelta(days=offset)
+            for reminder, status in zip((morning, evening), statuses):
+                if status:
+                    db.add(Adherence(reminder_id=reminder.id, date=day, status=status))
+            db.add(Adherence(reminder_id=others.id, date=day, status="missed"))
+        db.add(Adherence(reminder_id=morning.id, date=START - datetime.timedelta(days=1), status="missed"))
+        db.commit()
+        return user.id, morning.id, evening.id
+
+def window(days=14):
+    return {"start": START.isoformat(), "end": (START + datetime.timedelta(days=days - 1)).isoformat()}
+
+async def test_summary_counts_in_the_window(client, patient):
+    user_id, morning, evening = patient
+
+    body = (await client.get(f"/adherence/{user_id}/summary", params=window())).json()
+
+    # 'taken' and 'full' both count as taken
+    assert body["overall"] == {"taken": 16, "missed": 6, "partial": 4, "total": 26, "rate": round(16 / 26, 4)}
+    assert [(r["reminder_id"], r["taken"], r["total"]) for r in body["by_reminder"]] == [(morning, 10, 14),
+                                                                                          (evening, 6, 12)]
+    assert [r["period"] for r in body["by_period"]] == [(START + datetime.timedelta(days=i)).isoformat()
+                                                        for i in range(14)]
+    assert body["by_period"][4] == {"period": "2026-03-06", "taken": 1, "missed": 0, "partial": 0, "total": 1,
+                                    "rate": 1.0}
+
+async def test_summary_buckets_by_week_and_month(client, patient):
+    user_id, _, _ = patient
+
+    weeks = (await client.get(f"/adherence/{user_id}/summary", params={**window(), "granularity": "week"})).json()
+    months = (await client.get(f"/adherence/{user_id}/summary",
+                               params={"start": "2026-02-01", "end": "2026-03-31", "granularity": "month"})).json()
+
+    assert [(r["period"], r["total"]) for r in weeks["by_period"]] == [("2026-03-02", 13), ("2026-03-09", 13)]
+    assert [(r["period"], r["missed"]) for r in months["by_period"]] == [("2026-03-01", 7)] # Mar 1 is a Sunday
+    assert months["overall"]["total"] == 27
+
+async def test_summary_rejects_an_inverted_window(client, patient):
+    response = await client.get(f"/adherence/{patient[0]}/summary", params={"start": "2026-03-10", "end": "2026-03-01"})
+    assert response.status_code == 400
+
+async def test_history_pages_cover_the_window_once_newest_first(client, patient):
+    user_id, _, _ = patient
+    seen, cursor = [], None
+    while True:
+        params = {**window(), "limit": 5, **({"cursor": cursor} if cursor else {})}
+        page = (await client.get(f"/adherence/{user_id}/history", params=params)).json()
+        assert len(page["items"]) <= 5
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    keys = [(r["date"], r["id"]) for r in seen]
+    assert len(keys) == 26 and len(set(keys)) == 26
+    assert keys == sorted(keys, reverse=True)
+    assert seen[-1]["date"] == START.isoformat()
+
+async def test_history_rejects_a_malformed_cursor(client, patient):
+    response = await client.get(f"/adherence/{patient[0]}/history", params={"cursor": "yesterday"})
+    assert response.status_code == 400
@@ -0,0 +1,66 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from backend.app.models.schemas import DrugInfo
+from backend.app.services import answer_cache, chunk_store
+from backend.app.services.rag_service import RAGService, build_label_documents
+
+ADVIL_WARNINGS = "Stomach bleeding warning: this product contains an NSAID, which may cause severe stomach bleeding."
+TYLENOL_WARNINGS = "Liver warning: this product contains acetaminophen. Severe liver damage may occur."
+
+def label(brand, generic, warnings, version="1"):
+    return DrugInfo(brand_name=brand, generic_name=generic, set_id=f"set-{brand.lower()}", version=version,
+                    warnings=warnings, dosage_instructions=f"Adults: take 1 {brand} tablet every 6 hours.")
+
+@pytest.fixture
+def service(tmp_path, embeddings, monkeypatch):
+    # On disk, so a second service sees the first one's writes as another process would
+    monkeypatch.setattr(chunk_store, "CHUNK_STORE_PATH", str(tmp_path / "chunks.sqlite3"))
+
+    def make():
+        # Each model answer says which call produced it
+        llm = FakeListChatModel(responses=[f"answer {i}" for i in range(1, 20)])
+        return RAGService(persist_directory=str(tmp_path / "vectors"), embeddings=embeddings, llm=llm)
+
+    services = [make()]
+    for info in (label("Advil", "ibuprofen", ADVIL_WARNINGS), label("Tylenol", "acetaminophen", TYLENOL_WARNINGS)):
+        services[0].upsert_documents(build_label_documents(info, info.brand_name, services[0].text_splitter))
+    yield services[0], make
+    for rag in services:
+        rag.close()
+
+def ingest(rag, info):
+    return rag.upsert_documents(build_label_documents(info, info.brand_name, rag.text_splitter))
+
+def test_repeated_questions_are_answered_from_the_cache(service):
+    rag, _ = service
+    assert rag.query("What are the warnings for Advil?") == "answer 1"
+    assert rag.query("what are the warnings for advil") == "answer 1"
+    assert rag.answer_cache.hits == 1
+
+def test_reingesting_a_changed_label_evicts_only_its_answers(service):
+    rag, _ = service
+    assert rag.query("What are the warnings for Advil?") == "answer 1"
+    rag.answer_cache.put("What are the warnings for Zyrtec?", "cached", drugs=["Zyrtec", "cetirizine"])
+
+    # An unchanged label keeps every answer
+    assert ingest(rag, label("Advil", "ibuprofen", ADVIL_WARNINGS)) == 0
+    assert len(rag.answer_cache) == 2
+
+    assert ingest(rag, label("Advil", "ibuprofen", ADVIL_WARNINGS + " Heart attack and stroke warning.", "2")) > 0
+    assert rag.query("What are the warnings for Advil?") == "answer 2"
+    assert rag.query("What are the warnings for Zyrtec?") == "cached"
+
+def test_ingest_by_another_process_clears_the_cache(service, monkeypatch):
+    rag, make = service
+    monkeypatch.setattr(answer_cache, "INDEX_REFRESH_SECONDS", 0)
+    assert rag.query("What are the warnings for Tylenol?") == "answer 1"
+
+    other = make()
+    try:
+        ingest(other, label("Tylenol", "acetaminophen", TYLENOL_WARNINGS + " Do not use with alcohol.", "2"))
+    finally:
+        other.close()
+
+    # Which drugs the other process touched isn't known here, so everything goes
+    assert rag.query("What are the warnings for Tylenol?") == "answer 2"
@@ -0,0 +1,94 @@
+from backend.app.models.schemas import DrugInfo
+from backend.app.services.chunk_store import ChunkStore, minhash, quantities, similarity
+from backend.app.services.rag_service import build_label_documents, make_text_splitter
+
+TEXT = ("Adults and children 12 years and over: take 2 tablets every 4 to 6 hours while symptoms last. "
+        "Do not take more than 12 tablets in 24 hours unless directed by a doctor. Children under 12 "
+        "years: ask a doctor before use. Swallow whole with water and do not crush or chew the tablets.")
+# Last word changed: a near-duplicate
+REWORDED = TEXT.replace("chew the tablets.", "chew the caplets.")
+# Same words, another dose: must not be shared
+OTHER_DOSE = TEXT.replace("take 2 tablets", "take 4 tablets")
+
+def _store(*texts):
+    store = ChunkStore("")
+    signatures = [(f"chunk{i}", "ibuprofen", "Dosage & Administration", minhash(text), quantities(text))
+                  for i, text in enumerate(texts)]
+    rows = [(f"chunk{i}", f"label{i}", "Dosage & Administration", f"hash{i}", "Advil", "ibuprofen")
+            for i in range(len(texts))]
+    store.replace_sections([], rows, signatures)
+    store.commit()
+    return store
+
+def test_quantities_keep_numbers_with_their_units():
+    assert quantities("Take 200 mg every 4 hours, up to 1.5 g") == "200mg 4hours 1.5g"
+
+def test_minhash_estimates_similarity():
+    assert similarity(minhash(TEXT), minhash(TEXT)) == 1.0
+    assert similarity(minhash(TEXT), minhash(REWORDED)) >= 0.8
+    assert similarity(minhash(TEXT), minhash("Keep out of reach of children.")) < 0.2
+
+def test_near_duplicate_with_the_same_quantities_is_found():
+    store = _store(TEXT)
+    found = store.find_near_duplicate("ibuprofen", "Dosage & Administration", minhash(REWORDED), quantities(REWORDED))
+    assert found == "chunk0"
+
+def test_near_duplicate_with_another_dose_is_not_shared():
+    store = _store(TEXT)
+    assert store.find_near_duplicate("ibuprofen", "Dosage & Administration",
+                                     minhash(OTHER_DOSE), quantities(OTHER_DOSE)) is None
+
+def test_near_duplicates_stay_within_scope_and_section():
+    store = _store(TEXT)
+    assert store.find_near_duplicate("naproxen", "Dosage & Administration", minhash(TEXT), quantities(TEXT)) is None
+    assert store.find_near_duplicate("ibuprofen", "Warnings", minhash(TEXT), quantities(TEXT)) is None
+
+def test_replacing_the_last_reference_orphans_the_chunk():
+    store = _store(TEXT)
+    orphans = store.replace_sections([("label0", "Dosage & Administration")], [])
+    store.commit()
+    assert orphans == ["chunk0"]
+    assert store.known(["chunk0"]) == set()
+    # Its signature went with it
+    assert store.find_near_duplicate("ibuprofen", "Dosage & Administration", minhash(TEXT), quantities(TEXT)) is None
+
+def test_rollback_drops_uncommitted_references():
+    store = ChunkStore("")
+    store.replace_sections([], [("chunk0", "label0", "Warnings", "hash0", "Advil", "ibuprofen")])
+    store.rollback()
+    assert store.counts() == {"chunks": 0, "references": 0}
+
+# --- Across labels, through RAGService ---
+
+WARNINGS = "Stomach bleeding warning: this product contains an NSAID, which may cause severe stomach bleeding."
+
+def label(brand, generic, set_id):
+    return DrugInfo(brand_name=brand, generic_name=generic, set_id=set_id, version="1",
+                    warnings=WARNINGS, dosage_instructions=TEXT)
+
+def test_chunk_ids_are_shared_within_a_generic_only():
+    splitter = make_text_splitter()
+    advil = {doc.id for doc in build_label_documents(label("Advil", "ibuprofen", "set-advil"), "Advil", splitter)}
+    store_brand = {doc.id for doc in build_label_documents(label("Shopbrand", "ibuprofen", "set-shop"), "Shopbrand",
+                                                           splitter)}
+    naproxen = {doc.id for doc in build_label_documents(label("Aleve", "naproxen", "set-aleve"), "Aleve", splitter)}
+    assert advil == store_brand
+    assert not advil & naproxen
+
+def test_store_brands_of_a_generic_share_its_chunks(rag, embeddings):
+    docs = build_label_documents(label("Advil", "ibuprofen", "set-advil"), "Advil", rag.text_splitter)
+    rag.upsert_documents(docs)
+    embedded = embeddings.documents_embedded
+    shop = build_label_documents(label("Shopbrand", "ibuprofen", "set-shop"), "Shopbrand", rag.text_splitter)
+    assert rag.upsert_documents(shop) == 0
+    assert embeddings.documents_embedded == embedded
+    assert rag.chunk_store.counts() == {"chunks": len(docs), "references": 2 * len(docs)}
+
+def test_a_near_duplicate_label_references_the_stored_chunk(rag):
+    rag.upsert_documents(build_label_documents(label("Advil", "ibuprofen", "set-advil"), "Advil", rag.text_splitter))
+    shop = label("Shopbrand", "ibuprofen", "set-shop")
+    shop.dosage_instructions = REWORDED
+    assert rag.upsert_documents(build_label_documents(shop, "Shopbrand", rag.text_splitter)) == 0
+    other_dose = label("Otherbrand", "ibuprofen", "set-other")
+    other_dose.dosage_instructions = OTHER_DOSE
+    assert rag.upsert_documents(build_label_documents(other_dose, "Otherbrand", rag.text_splitter)) == 1
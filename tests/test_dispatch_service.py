@@ -0,0 +1,135 @@
+import datetime
+
+import pytest
+from sqlalchemy import select
+
+from backend.app.models.sql_models import Adherence, Reminder, User
+from backend.app.services.dispatch_service import DoseDispatcher, SimulatedClock
+
+UTC = datetime.timezone.utc
+START = datetime.datetime(2026, 3, 10, 0, 0, tzinfo=UTC) # after the US switch to DST (March 8)
+HOUR = datetime.timedelta(hours=1)
+DAY = datetime.timedelta(days=1)
+
+@pytest.fixture
+def clock():
+    return SimulatedClock(START)
+
+@pytest.fixture
+def fired():
+    return []
+
+@pytest.fixture
+def dispatcher(clock, fired):
+    return DoseDispatcher(clock=clock, on_due=fired.append)
+
+def run(dispatcher, clock, delta):
+    return dispatcher.run_until(clock.advance(delta))
+
+def test_doses_fire_in_utc_order_across_timezones(dispatcher, clock, fired):
+    dispatcher.add(1, 1, "A", "1 tablet", ["20:00"], timezone="America/New_York") # 00:00 UTC on the 11th
+    dispatcher.add(2, 2, "B", "1 tablet", ["08:00"], timezone="Asia/Kolkata") # 02:30 UTC
+    dispatcher.add(3, 3, "C", "1 tablet", ["08:00", "06:00"], timezone="UTC")
+    dispatcher.add(4, 4, "D", "1 tablet", ["08:00"], timezone="America/New_York") # 12:00 UTC
+
+    run(dispatcher, clock, DAY)
+
+    assert [(d.drug_name, d.due_at.strftime("%H:%M"), d.local_time.strftime("%H:%M")) for d in fired] == [
+        ("B", "02:30", "08:00"),
+        ("C", "06:00", "06:00"),
+        ("C", "08:00", "08:00"),
+        ("D", "12:00", "08:00"),
+        ("A", "00:00", "20:00"),
+    ]
+    assert fired[-1].local_date == datetime.date(2026, 3, 10)
+    assert fired[-1].due_at == datetime.datetime(2026, 3, 11, 0, 0, tzinfo=UTC)
+
+def test_add_reschedule_and_remove(dispatcher, clock, fired):
+    dispatcher.add(1, 1, "A", "1 tablet", ["08:00"])
+    dispatcher.add(2, 1, "B", "1 tablet", ["09:00"])
+    assert dispatcher.next_due() == START + 8 * HOUR
+
+    dispatcher.add(1, 1, "A", "2 tablets", ["10:00"]) # reschedules: the 08:00 entry goes stale
+    dispatcher.remove(2)
+    assert dispatcher.next_due() == START + 10 * HOUR
+
+    run(dispatcher, clock, 12 * HOUR)
+    assert [(d.drug_name, d.dosage, d.local_time.hour) for d in fired] == [("A", "2 tablets", 10)]
+    assert len(dispatcher) == 1
+
+def test_reminder_expires_after_its_last_day(dispatcher, clock, fired):
+    assert not dispatcher.add(1, 1, "A", "1 tablet", ["08:00"], ends_on=datetime.date(2026, 3, 8))
+    assert not dispatcher.add(2, 1, "B", "1 tablet", ["not a time"])
+    assert dispatcher.add(3, 1, "C", "1 tablet", ["08:00"], ends_on=datetime.date(2026, 3, 11))
+
+    run(dispatcher, clock, 4 * DAY)
+
+    assert [d.local_date.day for d in fired] == [10, 11]
+    assert len(dispatcher) == 0
+    assert dispatcher.next_due() is None
+
+@pytest.fixture
+def patient(database):
+    Session, _ = database
+    with Session() as db:
+        user = User(username="pat@example.com", role="patient", password_hash="x", timezone="Asia/Kolkata")
+        db.add(user)
+        db.commit()
+        return user.id
+
+def add_reminder(Session, user_id, times, created_at=START - HOUR, ends_on=None):
+    with Session() as db:
+        reminder = Reminder(user_id=user_id, drug_name="Amoxicillin", dosage="500 mg", frequency="daily",
+                            times=times, duration="Unlimited", created_at=created_at.replace(tzinfo=None),
+                            ends_on=ends_on)
+        db.add(reminder)
+        db.commit()
+        return reminder.id
+
+def adherence(Session):
+    with Session() as db:
+        return {(a.reminder_id, a.date.day): a.status for a in db.execute(select(Adherence)).scalars()}
+
+def test_missed_marked_after_the_grace_window(database, patient, clock, fired):
+    Session, _ = database
+    reminder_id = add_reminder(Session, patient, ["08:00", "20:00"])
+    dispatcher = DoseDispatcher(Session, clock, on_due=fired.append, grace=HOUR)
+    with Session() as db:
+        assert dispatcher.load(db) == 1
+        db.add(Adherence(reminder_id=reminder_id, date=datetime.date(2026, 3, 10), status="taken"))
+        db.commit()
+
+    # 20:00 in Kolkata is 14:30 UTC: the grace window ends at 15:30
+    run(dispatcher, clock, 15 * HOUR + 29 * datetime.timedelta(minutes=1))
+    assert dispatcher.flush() == 0
+    run(dispatcher, clock, 2 * datetime.timedelta(minutes=1))
+    assert dispatcher.flush() == 1 # the 10th: its "taken" record is kept
+    run(dispatcher, clock, DAY)
+    assert dispatcher.flush() == 1
+
+    assert adherence(Session) == {(reminder_id, 10): "taken", (reminder_id, 11): "missed"}
+    assert len(fired) == 4
+
+def test_schedule_is_rebuilt_from_the_db_after_a_restart(database, patient, clock, fired):
+    Session, _ = database
+    active = add_reminder(Session, patient, ["08:00"])
+    add_reminder(Session, patient, ["09:00"], ends_on=datetime.date(2026, 3, 1))
+
+    first = DoseDispatcher(Session, clock, on_due=fired.append, lease=60)
+    assert first.renew_lease()
+    assert len(first) == 1
+
+    # The leader dies; a new process takes the lease once it has expired
+    second = DoseDispatcher(Session, clock, on_due=fired.append, lease=60)
+    assert not second.renew_lease()
+    clock.advance(datetime.timedelta(seconds=61))
+    assert second.renew_lease()
+    assert len(second) == 1
+    assert second.next_due() == first.next_due()
+
+    # Reminders created after the load (by any process) are picked up by poll()
+    later = add_reminder(Session, patient, ["10:00"], created_at=clock.now())
+    assert second.poll() == 1
+    run(second, clock, DAY)
+    assert [d.reminder_id for d in fired] == [active, later]
+    assert fired[0].recipient == "pat@example.com"
@@ -0,0 +1,34 @@
+import pytest
+
+from backend.app.services.dosage_parser import DOSAGE_PARSER_MIN_CONFIDENCE, parse_dosage
+
+@pytest.mark.parametrize("text, times", [
+    ("Take 500 mg twice daily with meals.", ["08:00", "20:00"]),
+    ("One tablet once a day.", ["08:00"]),
+    ("take 1 tablet 3 times daily", ["08:00", "14:00", "20:00"]),
+    ("take 1 capsule 2 times daily with food", ["08:00", "20:00"]),
+    ("take 1 tablet 4x per day", ["08:00", "12:00", "16:00", "20:00"]),
+    ("take 2 tablets daily", ["08:00"]),
+])
+def test_fixed_schedules_take_the_fast_path(text, times):
+    schedule, confidence = parse_dosage("testdrug", text)
+    assert confidence >= DOSAGE_PARSER_MIN_CONFIDENCE
+    assert schedule["times"] == times
+    assert schedule["drug"] == "testdrug"
+
+@pytest.mark.parametrize("text", [
+    "apply to the affected area 3 or 4 times daily",
+    "take 1 tablet 2 to 3 times a day",
+    "take 2 tablets by mouth. do not exceed 4 doses daily.",
+    "1 tablet daily for 3 days then 2 tablets daily.",
+    "Take 1 tablet every 4 to 6 hours as needed for pain.",
+    "Dosing should be individualized based on renal function.",
+])
+def test_ranges_limits_and_tapers_go_to_the_llm(text):
+    _schedule, confidence = parse_dosage("testdrug", text)
+    assert confidence < DOSAGE_PARSER_MIN_CONFIDENCE
+
+def test_more_doses_than_default_times_are_spread_over_the_day():
+    schedule, _confidence = parse_dosage("testdrug", "take 1 tablet 6 times daily")
+    assert len(schedule["times"]) == 6
+    assert schedule["times"] == sorted(set(schedule["times"]))
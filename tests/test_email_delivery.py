@@ -0,0 +1,144 @@
+import socket
+import time
+
+import pytest
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+from backend.app.services.email_delivery import DEAD, PENDING, SENDING, SENT, EmailDeliveryWorker, EmailOutbox
+
+class Recorder:
+    """aiosmtpd handler: refuses temp@ (451) and bad@ (550) recipients, records the rest."""
+
+    def __init__(self):
+        self.received = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("temp@"):
+            return "451 4.3.0 Try again later"
+        if address.startswith("bad@"):
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def smtp():
+    handler = Recorder()
+    controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = EmailOutbox(str(tmp_path / "outbox.sqlite3"))
+    yield box
+    box.close()
+
+def make_worker(outbox, smtp, **kwargs):
+    options = dict(host=smtp.hostname, port=smtp.port, user=None, password=None, starttls=False,
+                   workers=1, mock=False, timeout=5)
+    options.update(kwargs)
+    return EmailDeliveryWorker(outbox, **options)
+
+def drain(worker):
+    """One worker pass over everything due now."""
+    worker._send_batch(worker._connections[0], worker.outbox.claim(worker.batch_size))
+
+def status(outbox, message_id):
+    return outbox._conn.execute("SELECT status, attempts, next_attempt_at, last_error FROM outbox WHERE id = ?",
+                                (message_id,)).fetchone()
+
+def make_due(outbox):
+    """Skips the backoff wait."""
+    outbox._conn.execute("UPDATE outbox SET next_attempt_at = 0")
+    outbox._conn.commit()
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_batch_is_sent_over_one_connection(outbox, smtp):
+    worker = make_worker(outbox, smtp)
+    worker.enqueue_many([{"to": f"p{i}@example.com", "subject": "Reminder", "body": "Take it"} for i in range(5)])
+    worker.start()
+    try:
+        wait_for(lambda: outbox.counts()[SENT] == 5)
+    finally:
+        worker.stop()
+
+    assert sorted(smtp.handler.received) == sorted(f"p{i}@example.com" for i in range(5))
+    assert worker.metrics()["connections_opened"] == 1
+
+def test_temporary_failures_back_off_then_dead_letter(outbox, smtp):
+    worker = make_worker(outbox, smtp, backoff=10, max_attempts=3)
+    message_id = worker.enqueue("temp@example.com", "Reminder", "Take it")
+
+    before = time.time()
+    drain(worker)
+    state, attempts, next_attempt_at, error = status(outbox, message_id)
+    assert (state, attempts) == (PENDING, 1)
+    assert before + 5 <= next_attempt_at <= time.time() + 10 # backoff * 2**0, with 50-100% jitter
+    assert "451" in error
+
+    # Not due yet: nothing is claimed
+    assert outbox.claim(10) == []
+
+    make_due(outbox)
+    drain(worker)
+    state, attempts, next_attempt_at, _ = status(outbox, message_id)
+    assert (state, attempts) == (PENDING, 2)
+    assert next_attempt_at >= time.time() + 10 # backoff * 2**1, with jitter
+
+    make_due(outbox)
+    drain(worker)
+    assert status(outbox, message_id)[:2] == (DEAD, 3)
+    assert (worker.retried, worker.dead_lettered) == (2, 1)
+    assert outbox.dead_letters()[0]["to"] == "temp@example.com"
+
+def test_permanent_failures_are_dead_lettered_at_once(outbox, smtp):
+    worker = make_worker(outbox, smtp, max_attempts=5)
+    bad = worker.enqueue("bad@example.com", "Reminder", "Take it")
+    good = worker.enqueue("good@example.com", "Reminder", "Take it")
+
+    drain(worker)
+
+    assert status(outbox, bad)[:2] == (DEAD, 1)
+    assert "550" in status(outbox, bad)[3]
+    assert status(outbox, good)[:2] == (SENT, 1)
+    assert smtp.handler.received == ["good@example.com"]
+
+def test_expired_lease_is_reclaimed_by_another_process(tmp_path, smtp):
+    path = str(tmp_path / "shared.sqlite3")
+    crashed, survivor = EmailOutbox(path, lease=0.2), EmailOutbox(path, lease=60)
+    try:
+        message_id = crashed.enqueue("p@example.com", "Reminder", "Take it")
+        claimed = crashed.claim(10)
+        assert [m["id"] for m in claimed] == [message_id]
+
+        # Held under the first process's lease; then it expires
+        assert survivor.claim(10) == []
+        time.sleep(0.3)
+        drain(make_worker(survivor, smtp))
+        assert status(survivor, message_id)[0] == SENT
+        assert smtp.handler.received == ["p@example.com"]
+
+        # The first process coming back late can no longer touch the row
+        crashed.mark_failed(claimed[0], "late", None)
+        crashed.release(claimed)
+        assert status(survivor, message_id)[0] == SENT
+        assert survivor.counts()[SENDING] == 0
+    finally:
+        crashed.close()
+        survivor.close()
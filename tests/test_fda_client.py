@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from backend.app.services import fda_client
+from backend.app.services.fda_client import FDAClient, ResponseCache
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Apr 2026 00:00:00 GMT"
+
+def label(name):
+    return {"set_id": f"set-{name}", "version": "1",
+            "openfda": {"brand_name": [name], "generic_name": [f"{name} generic"]},
+            "indications_and_usage": [f"{name} relieves pain."]}
+
+class StandIn:
+    """
+    openFDA on an ephemeral local port. `failures` are status codes answered
+    before the real response; names in `missing` get a 404. Validators are sent
+    with every label, and a request carrying them is answered 304.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.failures = []
+        self.missing = set()
+        self.delay = delay
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.requests.append(dict(self.headers))
+                    stand_in.in_flight += 1
+                    stand_in.max_in_flight = max(stand_in.max_in_flight, stand_in.in_flight)
+                    failure = stand_in.failures.pop(0) if stand_in.failures else None
+                try:
+                    time.sleep(stand_in.delay)
+                    name = parse_qs(urlparse(self.path).query)["search"][0].split('"')[1]
+                    if failure:
+                        self.reply(failure, {"error": {}}, {"Retry-After": "0"})
+                    elif self.headers.get("If-None-Match") == ETAG:
+                        self.reply(304)
+                    elif name in stand_in.missing:
+                        self.reply(404, {"error": {"code": "NOT_FOUND"}})
+                    else:
+                        self.reply(200, {"meta": {}, "results": [label(name)]},
+                                   {"ETag": ETAG, "Last-Modified": LAST_MODIFIED})
+                finally:
+                    with stand_in._lock:
+                        stand_in.in_flight -= 1
+
+            def reply(self, status, payload=None, headers=None):
+                body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/drug/label.json"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def api():
+    stand_in = StandIn()
+    yield stand_in
+    stand_in.close()
+
+def make_client(api, **kwargs):
+    options = dict(cache=ResponseCache(":memory:"), max_retries=3, backoff=0, timeout=5)
+    options.update(kwargs)
+    return FDAClient(base_url=api.url, **options)
+
+@pytest.mark.parametrize("failures", [[429], [503, 502], [500, 504, 429]])
+def test_retries_rate_limits_and_server_errors(api, failures):
+    api.failures = list(failures)
+    client = make_client(api)
+
+    result = client.search_drug("Advil")
+
+    assert result.results[0].brand_name == "Advil"
+    assert len(api.requests) == len(failures) + 1
+
+def test_gives_up_after_max_retries(api):
+    api.failures = [503] * 5
+    client = make_client(api, max_retries=2)
+
+    assert client.search_drug("Advil") is None
+    assert len(api.requests) == 3
+
+def test_fresh_answers_come_from_the_cache(api, monkeypatch):
+    api.missing.add("Nothing")
+    client = make_client(api)
+
+    for _ in range(3):
+        assert client.search_drug("Advil").results[0].brand_name == "Advil"
+        assert client.search_drug("Nothing") is None
+    assert len(api.requests) == 2
+
+    # Once past the TTL the entry is fetched again; "not found" has its own, shorter TTL
+    monkeypatch.setattr(fda_client, "FDA_NEGATIVE_CACHE_TTL", 0)
+    assert client.search_drug("Advil") is not None
+    assert client.search_drug("Nothing") is None
+    assert len(api.requests) == 3
+
+def test_stale_entries_are_revalidated(api, monkeypatch):
+    client = make_client(api)
+    assert client.search_drug("Advil") is not None
+    assert "If-None-Match" not in api.requests[0]
+
+    monkeypatch.setattr(fda_client, "FDA_CACHE_TTL", 0)
+    result = client.search_drug("Advil")
+
+    # Answered 304 with the validators stored from the first response
+    assert result.results[0].brand_name == "Advil"
+    assert api.requests[1]["If-None-Match"] == ETAG
+    assert api.requests[1]["If-Modified-Since"] == LAST_MODIFIED
+    key = client._cache_key(client._params("Advil", 1))
+    assert time.time() - client.cache.get(key)["fetched_at"] < 1 # touched, so fresh again
+
+    monkeypatch.setattr(fda_client, "FDA_CACHE_TTL", 3600)
+    client.search_drug("Advil")
+    assert len(api.requests) == 2
+
+def test_stale_entry_is_served_when_the_api_is_down(api, monkeypatch):
+    client = make_client(api, max_retries=0)
+    client.search_drug("Advil")
+    monkeypatch.setattr(fda_client, "FDA_CACHE_TTL", 0)
+    api.failures = [503]
+
+    assert client.search_drug("Advil").results[0].brand_name == "Advil"
+
+def test_batch_lookup_bounds_concurrency():
+    api = StandIn(delay=0.05)
+    try:
+        client = make_client(api, max_concurrency=3)
+        names = [f"Drug{i}" for i in range(12)]
+
+        results = client.search_drugs(names + names[:4])
+
+        assert list(results) == names
+        assert all(results[name].results[0].brand_name == name for name in names)
+        assert len(api.requests) == 12 # duplicates are looked up once
+        assert api.max_in_flight == 3
+    finally:
+        api.close()
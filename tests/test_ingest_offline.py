@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from scripts.ingest_offline import load_checkpoint, process_file
+
+def write_labels(path, count):
+    labels = [{"set_id": f"set-{i}", "version": "1", "openfda": {"brand_name": [f"Drug{i}"]},
+               "warnings": [f"Drug{i} may cause drowsiness. Do not drive after taking it."]} for i in range(count)]
+    path.write_text(json.dumps({"meta": {}, "results": labels}), encoding="utf-8")
+
+def test_labels_are_checkpointed_once_written(rag, tmp_path):
+    data, checkpoint_path = tmp_path / "labels.json", str(tmp_path / "checkpoint.json")
+    write_labels(data, 5)
+
+    assert process_file(rag, str(data), batch_size=2, checkpoint={}, checkpoint_path=checkpoint_path)
+
+    assert load_checkpoint(checkpoint_path)[str(data)] == {"labels": 5, "done": True}
+    assert len(rag.vectorstore.get(include=[])["ids"]) == 5
+
+def test_a_failed_write_stops_the_run_without_advancing_the_checkpoint(rag, tmp_path, monkeypatch):
+    data, checkpoint_path = tmp_path / "labels.json", str(tmp_path / "checkpoint.json")
+    write_labels(data, 5)
+    writes = []
+
+    def upsert(docs):
+        if writes:
+            raise ConnectionError("embedding server went away")
+        writes.append(len(docs))
+
+    monkeypatch.setattr(rag, "upsert_documents", upsert)
+    with pytest.raises(ConnectionError):
+        process_file(rag, str(data), batch_size=2, checkpoint={}, checkpoint_path=checkpoint_path)
+
+    # Only the batch that was written is recorded, so a rerun resumes from there
+    assert load_checkpoint(checkpoint_path)[str(data)] == {"labels": 2, "done": False}
+
+def test_an_unreadable_file_is_reported(rag, tmp_path):
+    data = tmp_path / "labels.json"
+    data.write_text('{"results": [{"set_id": "set-1"}, {oops', encoding="utf-8")
+    checkpoint = {}
+
+    assert not process_file(rag, str(data), checkpoint=checkpoint, checkpoint_path=str(tmp_path / "checkpoint.json"))
+    assert checkpoint[str(data)]["done"] is False
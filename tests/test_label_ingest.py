@@ -0,0 +1,39 @@
+from backend.app.models.schemas import DrugInfo
+from backend.app.services.rag_service import build_label_documents, make_text_splitter
+
+WARNINGS = ("Stomach bleeding warning: this product contains an NSAID, which may cause severe stomach "
+            "bleeding. Ask a doctor before use if you have had stomach problems.")
+DOSAGE = "Adults: take 1 tablet every 4 to 6 hours while symptoms persist. Do not take more than 6 tablets in 24 hours."
+
+def label(**fields):
+    return DrugInfo(brand_name="Advil", generic_name="ibuprofen", set_id="set-advil", version="1",
+                    **{"warnings": WARNINGS, "dosage_instructions": DOSAGE, **fields})
+
+def stored_ids(rag):
+    return set(rag.vectorstore.get(include=[])["ids"])
+
+def test_chunk_ids_are_deterministic():
+    first = build_label_documents(label(), "Advil", make_text_splitter())
+    second = build_label_documents(label(), "Advil", make_text_splitter())
+    assert [doc.id for doc in first] == [doc.id for doc in second]
+    assert len({doc.id for doc in first}) == len(first)
+
+def test_reingesting_an_unchanged_label_embeds_nothing(rag, embeddings):
+    docs = build_label_documents(label(), "Advil", rag.text_splitter)
+    assert rag.upsert_documents(docs) == len(docs)
+    embedded = embeddings.documents_embedded
+    assert rag.upsert_documents(build_label_documents(label(), "Advil", rag.text_splitter)) == 0
+    assert embeddings.documents_embedded == embedded
+    assert stored_ids(rag) == {doc.id for doc in docs}
+
+def test_a_changed_section_replaces_only_its_chunks(rag):
+    rag.upsert_documents(build_label_documents(label(), "Advil", rag.text_splitter))
+    before = stored_ids(rag)
+    new_dosage = "Adults: take 2 tablets every 8 hours. Do not take more than 6 tablets in 24 hours."
+    updated = build_label_documents(label(dosage_instructions=new_dosage), "Advil", rag.text_splitter)
+    new_ids = {doc.id for doc in updated if doc.metadata["section"] == "Dosage & Administration"}
+
+    assert rag.upsert_documents(updated) == len(new_ids)
+    assert stored_ids(rag) == {doc.id for doc in updated}
+    # The warnings chunks were kept as they were
+    assert {doc.id for doc in updated if doc.metadata["section"] == "Warnings"} <= before
@@ -0,0 +1,58 @@
+import pytest
+
+from backend.app.services.fda_client import FDAClient, ResponseCache
+from backend.app.services.label_store import LabelStore
+
+def record(set_id, version, brand, generic, warnings="", effective_time="20240101"):
+    return {"set_id": set_id, "version": str(version), "effective_time": effective_time,
+            "openfda": {"brand_name": [brand], "generic_name": [generic]},
+            "warnings": [warnings], "dosage_and_administration": [f"Take {brand} as directed."]}
+
+@pytest.fixture
+def store():
+    store = LabelStore("")
+    store.add([
+        record("advil", 1, "Advil", "IBUPROFEN", "Stomach bleeding warning."),
+        record("advil", 3, "Advil", "IBUPROFEN", "Stomach bleeding warning. Heart attack and stroke warning."),
+        record("advil", 2, "Advil", "IBUPROFEN", "An older version, stored after the newest."),
+        record("advil-pm", 1, "Advil PM", "Ibuprofen and Diphenhydramine", "Do not drive. Drowsiness may occur."),
+        record("tylenol", 1, "Tylenol Extra-Strength", "Acetaminophen", "Liver warning: severe liver damage."),
+    ])
+    store.commit()
+    yield store
+    store.close()
+
+def test_stores_every_version_and_serves_the_latest(store):
+    assert (store.count(), store.versions()) == (3, 5)
+    assert store.add([record("advil", 3, "Advil", "IBUPROFEN")]) == 0 # versions are immutable
+
+    [label] = store.find("advil")
+    assert (label.set_id, label.version) == ("advil", "3")
+    assert "Heart attack" in label.warnings
+
+@pytest.mark.parametrize("name, set_ids", [
+    ("ADVIL", ["advil"]), # exact, case-insensitive
+    ("ibuprofen", ["advil"]), # generic name
+    ("tylenol extra strength", ["tylenol"]), # punctuation ignored
+    ("Advil PM", ["advil-pm"]),
+    ("Extra Strength", ["tylenol"]), # no exact name: phrase inside a name
+    ("diphenhydramine", ["advil-pm"]),
+    ("strength extra", []), # a phrase, not a bag of words
+    ("liver", []), # section text is not a name
+    ("", []),
+])
+def test_find_by_name(store, name, set_ids):
+    assert [label.set_id for label in store.find(name, limit=5)] == set_ids
+
+def test_full_text_search_over_sections(store):
+    assert [label.set_id for label in store.search_text("liver damage")] == ["tylenol"]
+    assert [label.set_id for label in store.search_text("Stroke")] == ["advil"]
+    assert store.search_text("older version") == [] # only the latest versions are searched
+    assert {label.set_id for label in store.search_text("warning")} == {"advil", "tylenol"}
+
+def test_client_answers_from_the_store_without_the_api(store):
+    client = FDAClient(base_url="http://127.0.0.1:1/unused", cache=ResponseCache(":memory:"),
+                       label_store=store, offline=True)
+
+    assert client.search_drug("Advil").results[0].brand_name == "Advil"
+    assert client.search_drug("Nothing like it") is None
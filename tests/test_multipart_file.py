@@ -0,0 +1,55 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from scripts.ingest_offline import MultiPartFile, iter_sources, iter_results, open_parts, split_parts
+
+def _write_parts(tmp_path, data: bytes, sizes):
+    """data split into parts of the given sizes (the rest goes into a last part), as split_files.py names them."""
+    paths, start = [], 0
+    for i, size in enumerate(list(sizes) + [len(data)], start=1):
+        path = tmp_path / f"labels.zip.{i:03d}"
+        path.write_bytes(data[start:start + size])
+        paths.append(str(path))
+        start += size
+        if start >= len(data):
+            break
+    return paths
+
+def test_reads_and_seeks_across_parts(tmp_path):
+    data = bytes(range(256)) * 4
+    with MultiPartFile(_write_parts(tmp_path, data, [100, 1, 300])) as f:
+        assert f.read(150) == data[:150] # crosses the first two parts
+        f.seek(99)
+        assert f.read(3) == data[99:102] # the last byte of a part, a one-byte part, the next part
+        f.seek(-10, io.SEEK_END)
+        assert f.read() == data[-10:]
+        assert f.read(5) == b""
+        f.seek(50)
+        f.seek(400, io.SEEK_CUR)
+        assert f.tell() == 450
+        assert f.read(10) == data[450:460]
+        with pytest.raises(ValueError):
+            f.seek(-1)
+
+def test_zipfile_reads_a_split_archive_in_place(tmp_path):
+    labels = {"results": [{"openfda": {"brand_name": [f"Drug{i}"]}, "set_id": f"set-{i}"} for i in range(50)]}
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("labels.json", json.dumps(labels))
+    data = buffer.getvalue()
+    # Parts smaller than the central directory, so zipfile's seeks cross several of them
+    paths = _write_parts(tmp_path, data, [len(data) // 3, len(data) // 3])
+    assert split_parts(str(tmp_path / "labels.zip")) == paths
+
+    with zipfile.ZipFile(open_parts(paths)) as archive:
+        assert json.loads(archive.read("labels.json")) == labels
+
+    # Read while iterating: the archive closes when the generator finishes
+    read = {}
+    for name, opener in iter_sources(str(tmp_path / "labels.zip")):
+        with opener() as f:
+            read[name] = [item["set_id"] for item in iter_results(f)]
+    assert read == {f"{tmp_path / 'labels.zip'}::labels.json": [f"set-{i}" for i in range(50)]}
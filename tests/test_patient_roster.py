@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+from backend.app.api import endpoints
+from backend.app.models.sql_models import Adherence, Reminder, User
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime.datetime(2026, 3, 10, 12, 0, tzinfo=datetime.timezone.utc)
+MAR = lambda day: datetime.date(2026, 3, day)
+
+class FrozenDatetime(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW.astimezone(tz)
+
+@pytest.fixture
+def patients(database, monkeypatch):
+    """
+    At NOW it is already March 11 in Kiritimati (UTC+14), still March 10 in
+    Pago Pago (UTC-11) and in UTC, the default for users without a timezone.
+    Each patient has a twice-daily reminder with records on both days.
+    """
+    monkeypatch.setattr(endpoints, "datetime", FrozenDatetime)
+    monkeypatch.setattr(endpoints, "get_timezone", lambda name: endpoints.ZoneInfo(name or "UTC"))
+    Session, _ = database
+    ids = {}
+    with Session() as db:
+        for name, tz, statuses in (("kiri", "Pacific/Kiritimati", {10: "missed", 11: "taken"}),
+                                   ("pago", "Pacific/Pago_Pago", {10: "missed", 11: "taken"}),
+                                   ("utc", None, {10: "partial"})):
+            user = User(username=name, role="patient", timezone=tz)
+            db.add(user)
+            db.flush()
+            reminder = Reminder(user_id=user.id, drug_name="Metformin", times=["08:00", "20:00"],
+                                created_at=datetime.datetime(2026, 3, 1))
+            db.add(reminder)
+            db.flush()
+            db.add_all(Adherence(reminder_id=reminder.id, date=MAR(day), status=s) for day, s in statuses.items())
+            ids[name] = user.id
+        # Ended before March 11: no longer counted for the patient whose today that is
+        db.add(Reminder(user_id=ids["kiri"], drug_name="Amoxicillin", times=["09:00"],
+                        created_at=datetime.datetime(2026, 3, 1), ends_on=MAR(10)))
+        db.add(User(username="carer", role="caregiver"))
+        db.commit()
+    return ids
+
+def rows_by_name(body):
+    return {row["username"]: row for row in body["items"]}
+
+async def test_today_is_each_patients_own_date(client, patients):
+    rows = rows_by_name((await client.get("/caregiver/patients")).json())
+
+    assert set(rows) == {"kiri", "pago", "utc"}
+    assert {k: rows["kiri"][k] for k in ("active_reminders", "expected_doses_today", "taken_doses_today",
+                                         "missed_today", "last_missed")} == \
+        {"active_reminders": 1, "expected_doses_today": 2, "taken_doses_today": 2, "missed_today": 0,
+         "last_missed": "2026-03-10"}
+    assert (rows["pago"]["taken_doses_today"], rows["pago"]["missed_today"]) == (0, 2)
+    assert rows["pago"]["expected_doses_today"] == 2
+    assert (rows["utc"]["taken_doses_today"], rows["utc"]["missed_today"], rows["utc"]["last_missed"]) == (0, 0, None)
+
+async def test_an_explicit_day_applies_to_everyone(client, patients):
+    rows = rows_by_name((await client.get("/caregiver/patients", params={"day": "2026-03-10"})).json())
+
+    assert rows["kiri"]["active_reminders"] == 2
+    assert rows["kiri"]["expected_doses_today"] == 3
+    assert rows["kiri"]["missed_today"] == 2
+    assert rows["pago"]["missed_today"] == 2
+
+async def test_roster_is_keyset_paginated(client, patients):
+    first = (await client.get("/caregiver/patients", params={"limit": 2})).json()
+    second = (await client.get("/caregiver/patients", params={"limit": 2, "after_id": first["next_cursor"]})).json()
+
+    assert [row["id"] for row in first["items"] + second["items"]] == sorted(patients.values())
+    assert first["next_cursor"] == first["items"][-1]["id"]
+    assert second["next_cursor"] is None
@@ -0,0 +1,28 @@
+import pytest
+
+from backend.app.core.security import HashingBusy, PasswordHasher, verify_password
+
+pytestmark = pytest.mark.anyio
+
+async def test_hashes_in_the_pool_created_at_start():
+    hasher = PasswordHasher(workers=1)
+    assert hasher._pool is None # nothing is created on import or first use
+    hasher.start()
+    try:
+        hasher.warm()
+        hashed = await hasher.hash("s3cret")
+        assert verify_password("s3cret", hashed)
+        assert (await hasher.verify_and_update("s3cret", hashed))[0]
+    finally:
+        hasher.shutdown()
+
+async def test_unstarted_hasher_uses_the_threadpool():
+    hasher = PasswordHasher(workers=1)
+    assert verify_password("s3cret", await hasher.hash("s3cret"))
+    assert hasher._pool is None
+
+async def test_rejects_beyond_max_pending():
+    hasher = PasswordHasher(workers=0, max_pending=0)
+    with pytest.raises(HashingBusy):
+        await hasher.hash("s3cret")
+    assert hasher.stats()["rejected"] == 1
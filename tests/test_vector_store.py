@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from backend.app.services.vector_store import MmapVectorStore, iter_records, write_records
+
+TEXTS = {
+    "advil-warn": ("Stomach bleeding warning for ibuprofen", {"drug": "Advil", "section": "warnings"}),
+    "advil-dose": ("Take 1 tablet every 4 to 6 hours", {"drug": "Advil", "section": "dosage"}),
+    "tylenol-warn": ("Liver warning for acetaminophen", {"drug": "Tylenol", "section": "warnings"}),
+    "tylenol-dose": ("Take 2 caplets every 6 hours", {"drug": "Tylenol", "section": "dosage"}),
+    "zyrtec-dose": ("Take 1 tablet daily for allergies", {"drug": "Zyrtec", "section": "dosage"}),
+}
+
+@pytest.fixture(params=["none", "int8"])
+def store(request, tmp_path, embeddings):
+    store = MmapVectorStore(str(tmp_path / "index"), embeddings, quantization=request.param)
+    ids = list(TEXTS)
+    store.add_texts([TEXTS[i][0] for i in ids], [TEXTS[i][1] for i in ids], ids=ids)
+    yield store
+    store.close()
+
+def tolerance(store):
+    return 1 / 127 if store.quantization == "int8" else 1e-6
+
+def test_round_trips_documents_metadata_and_embeddings(store, embeddings):
+    page = store.get(ids=["tylenol-dose", "advil-warn", "missing"], include=["documents", "metadatas", "embeddings"])
+
+    assert page["ids"] == ["tylenol-dose", "advil-warn"]
+    assert page["documents"] == [TEXTS["tylenol-dose"][0], TEXTS["advil-warn"][0]]
+    assert page["metadatas"] == [TEXTS["tylenol-dose"][1], TEXTS["advil-warn"][1]]
+    expected = np.array(embeddings.embed_documents([TEXTS["tylenol-dose"][0], TEXTS["advil-warn"][0]]))
+    assert np.abs(page["embeddings"] - expected).max() <= tolerance(store)
+    assert store.count() == 5
+
+def test_nearest_neighbour_is_the_document_itself(store):
+    for doc_id, (text, _meta) in TEXTS.items():
+        doc, distance = store.similarity_search_with_score(text, k=1)[0]
+        assert doc.id == doc_id
+        assert doc.page_content == text
+        assert distance == pytest.approx(0.0, abs=2 * tolerance(store))
+
+def test_upsert_replaces_and_delete_frees_rows(store):
+    store.add_texts(["Take 1 tablet every 8 hours"], [{"drug": "Advil", "section": "dosage"}], ids=["advil-dose"])
+    assert store.count() == 5
+    assert store.get(ids=["advil-dose"])["documents"] == ["Take 1 tablet every 8 hours"]
+
+    store.delete(["advil-warn", "zyrtec-dose", "missing"])
+    assert store.count() == 3
+    assert set(store.get(include=[])["ids"]) == {"advil-dose", "tylenol-warn", "tylenol-dose"}
+    assert "advil-warn" not in [d.id for d in store.similarity_search(TEXTS["advil-warn"][0], k=5)]
+
+    # Freed rows are reused rather than growing the index
+    store.add_texts(["Claritin: take 1 tablet daily"], [{"drug": "Claritin", "section": "dosage"}], ids=["claritin"])
+    assert store.count() == 4
+    assert store._size == 5
+    assert store.similarity_search("Claritin: take 1 tablet daily", k=1)[0].id == "claritin"
+
+@pytest.mark.parametrize("where, expected", [
+    ({"drug": "Advil"}, {"advil-warn", "advil-dose"}),
+    ({"section": {"$ne": "dosage"}}, {"advil-warn", "tylenol-warn"}),
+    ({"drug": {"$in": ["Tylenol", "Zyrtec", "Nope"]}}, {"tylenol-warn", "tylenol-dose", "zyrtec-dose"}),
+    ({"drug": {"$nin": ["Advil", "Tylenol"]}}, {"zyrtec-dose"}),
+    ({"$and": [{"drug": "Tylenol"}, {"section": "dosage"}]}, {"tylenol-dose"}),
+    ({"$or": [{"drug": "Zyrtec"}, {"section": "warnings"}]}, {"advil-warn", "tylenol-warn", "zyrtec-dose"}),
+    ({"drug": "Nope"}, set()),
+])
+def test_filters_in_get_and_search(store, where, expected):
+    assert set(store.get(where=where, include=[])["ids"]) == expected
+    hits = store.similarity_search("Take 1 tablet", k=5, filter=where)
+    assert {doc.id for doc in hits} == expected
+
+def test_filters_follow_updates(store):
+    assert store.get(where={"drug": "Claritin"}, include=[])["ids"] == []
+    store.add_texts(["Take 1 tablet daily for allergies"], [{"drug": "Claritin", "section": "dosage"}],
+                    ids=["zyrtec-dose"])
+    assert store.get(where={"drug": "Claritin"}, include=[])["ids"] == ["zyrtec-dose"]
+    assert store.get(where={"drug": "Zyrtec"}, include=[])["ids"] == []
+
+def test_another_process_sees_committed_writes(store, embeddings):
+    other = MmapVectorStore(store.path, embeddings)
+    try:
+        assert other.count() == 5
+        assert other.quantization == store.quantization
+        other.delete(["tylenol-warn"])
+        other.add_texts(["Aleve: take 1 caplet every 12 hours"], [{"drug": "Aleve"}], ids=["aleve"])
+        assert store.count() == 5
+        assert store.similarity_search("Aleve: take 1 caplet every 12 hours", k=1)[0].id == "aleve"
+        assert "tylenol-warn" not in store.get(include=[])["ids"]
+    finally:
+        other.close()
+
+def test_export_import_between_quantizations(store, tmp_path, embeddings):
+    target = MmapVectorStore(str(tmp_path / "copy"), embeddings, quantization="int8")
+    try:
+        assert write_records(target, iter_records(store, page_size=2), batch_size=2) == 5
+        source = store.get(include=["documents", "metadatas", "embeddings"])
+        copied = target.get(ids=source["ids"], include=["documents", "metadatas", "embeddings"])
+        assert copied["documents"] == source["documents"]
+        assert copied["metadatas"] == source["metadatas"]
+        assert np.abs(copied["embeddings"] - source["embeddings"]).max() <= 2 / 127
+    finally:
+        target.close()
+
+def test_rejects_another_dimension(store):
+    with pytest.raises(ValueError):
+        store.upsert(["x"], [[1.0, 0.0, 0.0]], ["x"], [None])
+    assert store.count() == 5